@@ -0,0 +1,51 @@
+# src/batch.py
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Procesa un lote de partidos (carpeta o glob) con los parámetros de main.py.
+
+Ejemplos (desde src/):
+    python batch.py ../data
+    python batch.py "../data/2024-*/*.mp4" --out ../data/results --workers 4
+
+Las salidas usan el esquema de main.py (modules.batch_runner.output_paths).
+Si el lote se corta, volver a correr el mismo comando saltea los videos ya
+terminados (según el ledger JSONL) y reprocesa los que quedaron a medias.
+"""
+
+import argparse
+import sys
+
+from modules.batch_runner import run_batch
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Procesa un lote de videos de partidos.")
+    ap.add_argument("source", help="carpeta con videos o patrón glob (entre comillas)")
+    ap.add_argument("--out", help="carpeta de resultados (por defecto 'results' junto a cada video)")
+    ap.add_argument("--workers", type=int, help="procesos (por defecto según núcleos y memoria)")
+    ap.add_argument("--ledger", help="ledger JSONL (por defecto batch_ledger.jsonl)")
+    ap.add_argument("--skip-failed", action="store_true", help="no reintentar los videos que fallaron")
+    ap.add_argument("--queue-size", type=int, default=8, help="frames por cola del pipeline")
+    args = ap.parse_args(argv)
+
+    summary = run_batch(
+        args.source,
+        results_folder=args.out,
+        workers=args.workers,
+        ledger_path=args.ledger,
+        retry_failed=not args.skip_failed,
+        queue_size=args.queue_size,
+    )
+    print(
+        f"{summary['processed']} procesados, {summary['skipped']} salteados, "
+        f"{len(summary['failed'])} fallidos de {summary['videos']} videos "
+        f"({summary['workers']} procesos, {summary['seconds']:.1f} s)"
+    )
+    print(f"Throughput: {summary['fps']:.1f} frames/s, {summary['videos_per_hour']:.1f} videos/hora")
+    print(f"Ledger: {summary['ledger']}")
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,284 @@
+# src/benchmark.py
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmarks sobre videos sintéticos deterministas (modules.synthetic_video).
+
+Ejemplos (desde src/):
+    python benchmark.py --resolutions 720p,1080p --frames 150 --out bench.json
+    python benchmark.py --out bench_new.json --baseline bench.json --tolerance 0.15
+
+Cada caso corre en un proceso nuevo, así el pico de memoria (RSS) es el del
+caso y no el de los anteriores. Con --baseline se comparan fps, latencia p90 y
+memoria contra un JSON previo y se sale con código 1 si hay regresiones.
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import cv2
+import numpy as np
+
+import modules.process_video as pv
+from modules.process_by_threshold import process_video_by_threshold, ThresholdSegmenter
+from modules.substract_artificial_background import compute_median_background, save_median_background
+from modules.filter_components import filter_components
+from modules.filter_roundness import filter_by_roundness
+from modules.colorize_overlay import overlay_by_mask
+from modules.synthetic_video import RESOLUTIONS, make_court_video
+from modules.stage_timer import StageTimer
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Parámetros de segmentación usados en todos los casos (los de main.py)
+TRAIL = dict(algo="mog2", history=2000, varth=500.0, shadows=False, thresh=250,
+             kernel=3, fade=0.3, bin_level=32)
+MIN_SIZE, MAX_SIZE = 20, 50000
+OVERLAY = dict(color=(0, 0, 255), alpha=0.6, soften=3)
+
+
+def _peak_rss_mb() -> float | None:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa KiB; macOS, bytes
+    return peak / (1024.0 * 1024.0) if sys.platform == "darwin" else peak / 1024.0
+
+
+def _latency(samples: list[float]) -> dict | None:
+    if not samples:
+        return None
+    ms = np.asarray(samples) * 1000.0
+    return dict(
+        mean=float(ms.mean()), p50=float(np.percentile(ms, 50)),
+        p90=float(np.percentile(ms, 90)), p99=float(np.percentile(ms, 99)), max=float(ms.max()),
+    )
+
+
+def _frames(video: str):
+    cap = cv2.VideoCapture(video)
+    try:
+        while True:
+            ok, frame = cap.read()
+            if not ok:
+                return
+            yield frame
+    finally:
+        cap.release()
+
+
+def _background(video: str, workdir: str) -> str:
+    path = os.path.join(workdir, os.path.basename(video) + ".bg.png")
+    if not os.path.exists(path):
+        save_median_background(video, path, sample_size=50, seed=42)
+    return path
+
+
+# —— Casos: cada uno devuelve (frames, segundos, latencias por frame en s) y,
+# opcionalmente, el resumen por etapa de modules.stage_timer ——
+
+def case_process_video(video, workdir):
+    pv.MIN_SIZE, pv.MAX_SIZE = MIN_SIZE, MAX_SIZE
+    out = os.path.join(workdir, "out_trail.mp4")
+    n = int(cv2.VideoCapture(video).get(cv2.CAP_PROP_FRAME_COUNT))
+    timer = StageTimer(keep_samples=False)
+    t0 = time.perf_counter()
+    pv.process_video(video, out, **TRAIL, timer=timer)
+    return n, time.perf_counter() - t0, [], timer.summary()["stages"]
+
+
+def case_process_video_by_threshold(video, workdir):
+    bg = _background(video, workdir)
+    out = os.path.join(workdir, "out_otsu.mp4")
+    n = int(cv2.VideoCapture(video).get(cv2.CAP_PROP_FRAME_COUNT))
+    timer = StageTimer(keep_samples=False)
+    t0 = time.perf_counter()
+    process_video_by_threshold(video, bg, out, morph_kernel=3, blur_ksize=3, timer=timer)
+    return n, time.perf_counter() - t0, [], timer.summary()["stages"]
+
+
+def case_compute_median_background(video, workdir):
+    t0 = time.perf_counter()
+    compute_median_background(video, sample_size=50, seed=42)
+    return 50, time.perf_counter() - t0, []
+
+
+def _time_per_frame(video, fn):
+    samples = []
+    t0 = time.perf_counter()
+    for frame in _frames(video):
+        samples.append(fn(frame))
+    return len(samples), time.perf_counter() - t0, samples
+
+
+def case_trail_segmenter(video, workdir):
+    seg = pv.TrailSegmenter(**TRAIL, min_size=MIN_SIZE, max_size=MAX_SIZE)
+
+    def step(frame):
+        t = time.perf_counter()
+        seg.apply(frame)
+        return time.perf_counter() - t
+    return _time_per_frame(video, step)
+
+
+def case_threshold_segmenter(video, workdir):
+    bg = _background(video, workdir)
+    h, w = cv2.imread(bg).shape[:2]
+    seg = ThresholdSegmenter(bg, w, h, morph_kernel=3, blur_ksize=3)
+
+    def step(frame):
+        t = time.perf_counter()
+        seg.apply(frame)
+        return time.perf_counter() - t
+    return _time_per_frame(video, step)
+
+
+def _mask_case(video, fn):
+    # Las máscaras salen de la estela sin filtros (no se cronometra)
+    seg = pv.TrailSegmenter(**TRAIL)
+
+    def step(frame):
+        mask = seg.apply(frame)
+        t = time.perf_counter()
+        fn(frame, mask)
+        return time.perf_counter() - t
+    return _time_per_frame(video, step)
+
+
+def case_filter_components(video, workdir):
+    return _mask_case(video, lambda frame, mask: filter_components(mask, MIN_SIZE, MAX_SIZE))
+
+
+def case_filter_by_roundness(video, workdir):
+    return _mask_case(video, lambda frame, mask: filter_by_roundness(mask, 0.3, None))
+
+
+def case_overlay_by_mask(video, workdir):
+    return _mask_case(video, lambda frame, mask: overlay_by_mask(frame, mask, **OVERLAY))
+
+
+CASES = {
+    "process_video": case_process_video,
+    "process_video_by_threshold": case_process_video_by_threshold,
+    "compute_median_background": case_compute_median_background,
+    "trail_segmenter": case_trail_segmenter,
+    "threshold_segmenter": case_threshold_segmenter,
+    "filter_components": case_filter_components,
+    "filter_by_roundness": case_filter_by_roundness,
+    "overlay_by_mask": case_overlay_by_mask,
+}
+
+
+def _run_case(name: str, video: str, workdir: str) -> dict:
+    # Corre en un proceso nuevo (ver main)
+    frames, seconds, samples, *stages = CASES[name](video, workdir)
+    # En los casos por etapa, los fps son los de la etapa (sin decodificar ni preparar)
+    busy = float(sum(samples)) if samples else seconds
+    return dict(
+        frames=int(frames),
+        seconds=float(seconds),
+        fps=float(frames / busy) if busy > 0 else None,
+        latency_ms=_latency(samples),
+        peak_rss_mb=_peak_rss_mb(),
+        stages=stages[0] if stages else None,
+    )
+
+
+def compare(results: dict, baseline: dict, tolerance: float, mem_tolerance: float) -> list[str]:
+    """Lista de regresiones de 'results' respecto de 'baseline' (mismo formato JSON)."""
+    regressions = []
+    for key, new in results["results"].items():
+        old = baseline.get("results", {}).get(key)
+        if old is None:
+            continue
+        if old.get("fps") and new.get("fps") and new["fps"] < old["fps"] * (1.0 - tolerance):
+            regressions.append(f"{key}: fps {old['fps']:.1f} → {new['fps']:.1f}")
+        lo, ln = old.get("latency_ms"), new.get("latency_ms")
+        if lo and ln and ln["p90"] > lo["p90"] * (1.0 + tolerance):
+            regressions.append(f"{key}: p90 {lo['p90']:.2f} ms → {ln['p90']:.2f} ms")
+        mo, mn = old.get("peak_rss_mb"), new.get("peak_rss_mb")
+        if mo and mn and mn > mo * (1.0 + mem_tolerance):
+            regressions.append(f"{key}: RSS {mo:.0f} MB → {mn:.0f} MB")
+    return regressions
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Benchmarks sobre videos sintéticos de cancha.")
+    ap.add_argument("--resolutions", default="720p,1080p,4k",
+                    help=f"lista separada por comas de {sorted(RESOLUTIONS)}")
+    ap.add_argument("--cases", default=",".join(CASES), help="casos a correr (separados por comas)")
+    ap.add_argument("--frames", type=int, default=150, help="frames de cada video sintético")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--workdir", default=os.path.join(tempfile.gettempdir(), "padel_bench"),
+                    help="carpeta de videos sintéticos y salidas (se reutiliza entre corridas)")
+    ap.add_argument("--out", default="bench.json", help="JSON de resultados")
+    ap.add_argument("--baseline", help="JSON previo contra el que comparar")
+    ap.add_argument("--tolerance", type=float, default=0.15, help="caída de fps / suba de p90 tolerada")
+    ap.add_argument("--mem-tolerance", type=float, default=0.25, help="suba de RSS tolerada")
+    args = ap.parse_args(argv)
+
+    cases = [c.strip() for c in args.cases.split(",") if c.strip()]
+    unknown = [c for c in cases if c not in CASES]
+    if unknown:
+        ap.error(f"casos desconocidos: {unknown}")
+    resolutions = [r.strip().lower() for r in args.resolutions.split(",") if r.strip()]
+    unknown = [r for r in resolutions if r not in RESOLUTIONS]
+    if unknown:
+        ap.error(f"resoluciones desconocidas: {unknown}")
+
+    os.makedirs(args.workdir, exist_ok=True)
+    results = dict(
+        meta=dict(
+            timestamp=time.strftime("%Y-%m-%dT%H:%M:%S"),
+            python=platform.python_version(), numpy=np.__version__, opencv=cv2.__version__,
+            platform=platform.platform(), cpu_count=os.cpu_count(),
+            frames=args.frames, seed=args.seed,
+        ),
+        results={},
+    )
+
+    ctx = get_context("spawn")
+    for res in resolutions:
+        width, height = RESOLUTIONS[res]
+        video = os.path.join(args.workdir, f"court_{res}_{args.frames}f_s{args.seed}.mp4")
+        print(f"[{res}] generando {video} ...", flush=True)
+        make_court_video(video, width, height, frames=args.frames, seed=args.seed)
+        for name in cases:
+            with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+                r = pool.submit(_run_case, name, video, args.workdir).result()
+            r.update(case=name, resolution=res)
+            results["results"][f"{name}@{res}"] = r
+            lat = r["latency_ms"]
+            print(f"  {name:28s} {r['fps'] or 0:8.1f} fps"
+                  + (f"  p50 {lat['p50']:7.2f} ms  p90 {lat['p90']:7.2f} ms" if lat else "")
+                  + (f"  RSS {r['peak_rss_mb']:.0f} MB" if r["peak_rss_mb"] else ""), flush=True)
+
+    with open(args.out, "w", encoding="utf-8") as fh:
+        json.dump(results, fh, indent=2)
+    print(f"Resultados en {args.out}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as fh:
+            baseline = json.load(fh)
+        regressions = compare(results, baseline, args.tolerance, args.mem_tolerance)
+        if regressions:
+            print("Regresiones respecto de la línea base:")
+            for r in regressions:
+                print(f"  - {r}")
+            return 1
+        print("Sin regresiones respecto de la línea base.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,9 +3,11 @@
 from .apply_morph import apply_morph
 from .build_bg_subtractor import build_bg_subtractor
 from .filter_components import filter_components
+from .analyze_blobs import analyze_blobs
 
 __all__ = [
     "apply_morph",
     "build_bg_subtractor",
-    "remove_small_components",
+    "filter_components",
+    "analyze_blobs",
 ]
@@ -0,0 +1,128 @@
+# modules/analyze_blobs.py
+import cv2
+import numpy as np
+from typing import Optional
+
+from .filter_components import keep_components
+
+# Tabla de features por blob (una fila por componente conservado)
+BLOB_DTYPE = np.dtype([
+    ("label", np.int32),
+    ("area", np.int32),         # píxeles del componente
+    ("x", np.int32),            # bounding box
+    ("y", np.int32),
+    ("w", np.int32),
+    ("h", np.int32),
+    ("cx", np.float32),         # centroide
+    ("cy", np.float32),
+    ("circularity", np.float32),  # 4*pi*area/perimetro^2 del contorno externo; NaN si no se midió
+])
+
+
+def _outer_contour(labels: np.ndarray, label: int, x: int, y: int, w: int, h: int):
+    # Sólo se recorre el bounding box del componente, no la imagen entera
+    crop = (labels[y:y + h, x:x + w] == label).astype(np.uint8)
+    contours, _ = cv2.findContours(crop, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE, offset=(x, y))
+    if not contours:
+        return None
+    return max(contours, key=cv2.contourArea) if len(contours) > 1 else contours[0]
+
+
+def component_circularity(labels: np.ndarray, stats: np.ndarray, label: int):
+    """
+    (circularidad, contorno) del componente 'label' de connectedComponentsWithStats:
+    4*pi*area/perimetro^2 de su contorno externo, trazado dentro de su bounding box.
+    La circularidad es NaN (y el contorno None) si no se puede medir.
+    """
+    x, y, w, h = (int(v) for v in stats[label, :4])
+    cnt = _outer_contour(labels, int(label), x, y, w, h)
+    area = cv2.contourArea(cnt) if cnt is not None else 0.0
+    per = cv2.arcLength(cnt, True) if cnt is not None else 0.0
+    if area > 0 and per > 0:
+        return 4.0 * np.pi * area / (per * per), cnt
+    return np.nan, None
+
+
+def analyze_blobs(
+    mask: np.ndarray,
+    min_size: int = 0,
+    max_size: int = 0,
+    min_circularity: Optional[float] = None,
+    max_circularity: Optional[float] = None,
+    measure_circularity: bool = False,
+    out: Optional[np.ndarray] = None,
+    labels: Optional[np.ndarray] = None,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Etiqueta la máscara una sola vez y filtra por área y circularidad.
+
+    Equivale a filter_components seguido de filter_by_roundness, pero:
+      - area, bbox y centroide salen de connectedComponentsWithStats;
+      - el perímetro sólo se traza para los componentes que pasan el filtro de
+        área (y dentro de su bounding box);
+      - sin filtro de circularidad, los componentes conservados se pintan en
+        una sola pasada (LUT sobre las etiquetas).
+
+    Parámetros:
+      - mask: binaria 0/255 (uint8).
+      - min_size / max_size: área mínima (<=1 desactiva) / máxima (<=0 desactiva).
+      - min_circularity / max_circularity: None desactiva cada límite.
+      - measure_circularity: medir la circularidad aunque no se filtre por ella.
+      - out / labels: buffers opcionales (uint8 / int32, del tamaño de 'mask')
+        para la máscara de salida y las etiquetas; 'out' puede ser la propia 'mask'.
+
+    Retorna:
+      - (máscara filtrada 0/255, tabla de blobs con dtype BLOB_DTYPE).
+    """
+    _, labels, stats, centroids = cv2.connectedComponentsWithStats(mask, labels=labels, connectivity=8)
+
+    keep = keep_components(stats, centroids, min_size=min_size, max_size=max_size)
+
+    filter_round = (min_circularity is not None) or (max_circularity is not None)
+    circularity = np.full(len(stats), np.nan, dtype=np.float32)
+    contours = {}
+
+    if filter_round or measure_circularity:
+        for i in np.flatnonzero(keep):
+            circ, cnt = component_circularity(labels, stats, int(i))
+            if cnt is not None:
+                circularity[i] = circ
+                contours[int(i)] = cnt
+
+        if filter_round:
+            with np.errstate(invalid="ignore"):
+                ok = ~np.isnan(circularity)
+                if min_circularity is not None:
+                    ok &= circularity >= min_circularity
+                if max_circularity is not None:
+                    ok &= circularity <= max_circularity
+            keep &= ok
+
+    kept = np.flatnonzero(keep)
+
+    if filter_round:
+        # Mismo criterio de pintado que filter_by_roundness (contorno externo relleno).
+        # Cada contorno va en su propia llamada: en una sola, los polígonos superpuestos
+        # se anulan y un componente dentro del hueco de otro quedaría como hueco.
+        if out is None:
+            out = np.zeros_like(mask)
+        else:
+            out.fill(0)
+        for i in kept:
+            cv2.drawContours(out, [contours[int(i)]], -1, 255, thickness=cv2.FILLED)
+    else:
+        lut = np.where(keep, 255, 0).astype(np.uint8)
+        out = np.take(lut, labels, out=out)
+
+    blobs = np.empty(len(kept), dtype=BLOB_DTYPE)
+    blobs["label"] = kept
+    blobs["area"] = stats[kept, cv2.CC_STAT_AREA]
+    blobs["x"] = stats[kept, cv2.CC_STAT_LEFT]
+    blobs["y"] = stats[kept, cv2.CC_STAT_TOP]
+    blobs["w"] = stats[kept, cv2.CC_STAT_WIDTH]
+    blobs["h"] = stats[kept, cv2.CC_STAT_HEIGHT]
+    blobs["cx"] = centroids[kept, 0]
+    blobs["cy"] = centroids[kept, 1]
+    blobs["circularity"] = circularity[kept]
+
+    return out, blobs
@@ -1,10 +1,22 @@
 import cv2
 import numpy as np
+from functools import lru_cache
 
-def apply_morph(mask: np.ndarray, ksize: int) -> np.ndarray:
+
+@lru_cache(maxsize=None)
+def _ellipse(ksize: int) -> np.ndarray:
+    return cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (ksize, ksize))
+
+
+def apply_morph(mask: np.ndarray, ksize: int, dst: np.ndarray | None = None, tmp: np.ndarray | None = None) -> np.ndarray:
+    """
+    Apertura + cierre con un kernel elíptico de 'ksize' (<=1 desactiva).
+    'dst' / 'tmp' son buffers opcionales del tamaño de 'mask' para no reservar
+    memoria en cada frame ('dst' puede ser la propia 'mask').
+    """
     if ksize <= 1:
         return mask
-    k = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (ksize, ksize))
-    mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, k, iterations=1)
-    mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, k, iterations=1)
-    return mask
\ No newline at end of file
+    k = _ellipse(int(ksize))
+    tmp = cv2.morphologyEx(mask, cv2.MORPH_OPEN, k, dst=tmp, iterations=1)
+    mask = cv2.morphologyEx(tmp, cv2.MORPH_CLOSE, k, dst=dst, iterations=1)
+    return mask
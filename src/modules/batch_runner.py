@@ -0,0 +1,316 @@
+# modules/batch_runner.py
+import glob
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Optional
+
+import cv2
+from tqdm import tqdm
+
+from . import process_video as pv
+from .substract_artificial_background import save_median_background
+from .run_pipeline import run_pipeline
+
+VIDEO_EXTENSIONS = (".mp4", ".mov", ".avi", ".mkv", ".m4v")
+OUTPUT_SUFFIXES = ("_mask", "_overlay", "_mask_otsu", "_overlay_otsu")  # ver output_paths
+
+# —— Parámetros de main.py (modificar según se desee) ——
+TRAIL_PARAMS = dict(
+    algo="mog2",          # o "knn"
+    history=2000,
+    varth=500.0,
+    shadows=False,
+    thresh=250,
+    kernel=3,             # 1 = desactiva morfología
+    fade=0.3,
+    bin_level=32,
+    min_circularity=None,  # None para desactivar
+    max_circularity=None,
+)
+TRAIL_OVERLAY = dict(
+    color=(0, 0, 255),    # BGR: rojo
+    alpha=0.6,
+    soften=3,
+    colormap=None,        # para heatmap: cv2.COLORMAP_TURBO
+)
+OTSU_PARAMS = dict(
+    morph_kernel=3,
+    blur_ksize=3,
+)
+OTSU_OVERLAY = dict(
+    color=(0, 255, 0),    # ejemplo: verde
+    alpha=0.6,
+    soften=3,
+    colormap=None,
+)
+BACKGROUND_SAMPLES = 100
+MIN_SIZE = 0  # pv.MIN_SIZE
+MAX_SIZE = 0  # pv.MAX_SIZE
+
+
+def output_paths(input_path: str, results_folder: Optional[str] = None) -> dict[str, str]:
+    """
+    Rutas de salida de un video con el esquema de main.py:
+    <results>/<nombre>_mask<ext>, _overlay, _background.png, _mask_otsu y _overlay_otsu.
+    Por defecto <results> es la carpeta 'results' junto al video.
+    """
+    name, ext = os.path.splitext(os.path.basename(input_path))
+    if results_folder is None:
+        results_folder = os.path.join(os.path.dirname(input_path), "results")
+    return dict(
+        results=results_folder,
+        mask=os.path.join(results_folder, f"{name}_mask{ext}"),
+        overlay=os.path.join(results_folder, f"{name}_overlay{ext}"),
+        background=os.path.join(results_folder, f"{name}_background.png"),
+        otsu_mask=os.path.join(results_folder, f"{name}_mask_otsu{ext}"),
+        otsu_overlay=os.path.join(results_folder, f"{name}_overlay_otsu{ext}"),
+    )
+
+
+def process_match(
+    input_path: str,
+    results_folder: Optional[str] = None,
+    pipelined: bool = True,
+    queue_size: int = 8,
+    progress: bool = True,
+) -> int:
+    """
+    Procesa un partido como main(): fondo por mediana y, en una sola
+    decodificación, las ramas MOG2 + estela y fondo artificial + Otsu (máscara
+    B/N y overlay de cada una). Devuelve la cantidad de frames procesados.
+    """
+    paths = output_paths(input_path, results_folder)
+    os.makedirs(paths["results"], exist_ok=True)
+
+    # === 0) Fondo artificial por mediana ===
+    save_median_background(
+        input_path=input_path,
+        output_png_path=paths["background"],
+        sample_size=BACKGROUND_SAMPLES,
+        seed=42,
+    )
+
+    # Parámetros globales de filtrado por área
+    pv.MIN_SIZE = MIN_SIZE
+    pv.MAX_SIZE = MAX_SIZE
+
+    # === 1) MOG2/KNN + estela y 2) fondo artificial + Otsu, una sola decodificación ===
+    return run_pipeline(
+        input_path=input_path,
+        branches=[
+            dict(
+                kind="trail",
+                params=TRAIL_PARAMS,
+                mask_path=paths["mask"],
+                overlay_path=paths["overlay"],
+                overlay=TRAIL_OVERLAY,
+            ),
+            dict(
+                kind="threshold",
+                params=dict(OTSU_PARAMS, background_image_path=paths["background"]),
+                mask_path=paths["otsu_mask"],
+                overlay_path=paths["otsu_overlay"],
+                overlay=OTSU_OVERLAY,
+            ),
+        ],
+        pipelined=pipelined,
+        queue_size=queue_size,
+        progress=progress,
+    )
+
+
+def discover_videos(source: str, extensions: tuple[str, ...] = VIDEO_EXTENSIONS) -> list[str]:
+    """
+    Videos de 'source': una carpeta (sin recorrer subcarpetas) o un patrón glob
+    (admite '**' recursivo). Rutas absolutas, ordenadas. Se descartan las
+    salidas de corridas anteriores (nombres con los sufijos de output_paths).
+    """
+    if os.path.isdir(source):
+        candidates = [os.path.join(source, f) for f in os.listdir(source)]
+    else:
+        candidates = glob.glob(source, recursive=True)
+    videos = [
+        os.path.abspath(p) for p in candidates
+        if os.path.isfile(p) and os.path.splitext(p)[1].lower() in extensions
+        and not os.path.splitext(p)[0].endswith(OUTPUT_SUFFIXES)
+    ]
+    return sorted(set(videos))
+
+
+def _video_key(path: str) -> str:
+    st = os.stat(path)
+    return f"{st.st_size}:{int(st.st_mtime)}"
+
+
+def _available_memory() -> Optional[int]:
+    # Memoria disponible (bytes); None si el sistema no la informa
+    try:
+        with open("/proc/meminfo", "r", encoding="ascii") as fh:
+            for line in fh:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def estimate_job_memory(input_path: str, queue_size: int = 8) -> int:
+    """
+    Pico de memoria estimado (bytes) de process_match sobre un video: el stack
+    de la mediana (BACKGROUND_SAMPLES frames), el modelo MOG2 (~100 B/píxel),
+    las colas de frames del pipeline y los buffers de las ramas.
+    """
+    cap = cv2.VideoCapture(input_path)
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)) if cap.isOpened() else 0
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)) if cap.isOpened() else 0
+    cap.release()
+    px = width * height if width > 0 and height > 0 else 1920 * 1080  # sin datos: 1080p
+    median = BACKGROUND_SAMPLES * px * 3 * 2
+    pipeline = px * (100 + 40) + px * 3 * (5 * int(queue_size) + 8)
+    return max(median, pipeline) + 256 * 1024 ** 2
+
+
+def plan_workers(videos: list[str], workers: Optional[int] = None, queue_size: int = 8) -> int:
+    """
+    Procesos para el lote: 'workers' si se indica; si no, el mínimo entre los
+    núcleos, la cantidad de videos y lo que entra en la memoria disponible
+    (con la estimación del video más grande).
+    """
+    if not videos:
+        return 0
+    if workers is not None and workers > 0:
+        return min(int(workers), len(videos))
+    n = min(os.cpu_count() or 1, len(videos))
+    available = _available_memory()
+    if available is not None:
+        per_job = max(estimate_job_memory(v, queue_size) for v in videos)
+        n = min(n, max(1, int(available * 0.8) // per_job))
+    return max(1, n)
+
+
+class JobLedger:
+    """
+    Registro local de trabajos en JSONL (una línea por evento, sólo agregado).
+
+    Cada evento tiene video, key (tamaño:mtime), status ("started", "done" o
+    "failed") y datos extra. Vale el último evento de cada video: un "done" con
+    la misma key se saltea; un "started" sin cierre (corte o interrupción) o un
+    "failed" se vuelven a procesar. Cada línea se fuerza a disco al escribirla.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.jobs: dict[str, dict[str, Any]] = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as fh:
+                text = fh.read()
+            for line in text.splitlines():
+                try:
+                    event = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # línea cortada por un corte a mitad de escritura
+                self.jobs[event["video"]] = event
+            if text and not text.endswith("\n"):
+                with open(path, "a", encoding="utf-8") as fh:
+                    fh.write("\n")  # los eventos nuevos empiezan en su propia línea
+
+    def is_done(self, video: str) -> bool:
+        event = self.jobs.get(video)
+        return event is not None and event["status"] == "done" and event.get("key") == _video_key(video)
+
+    def record(self, video: str, status: str, **extra) -> None:
+        event = dict(video=video, key=_video_key(video), status=status,
+                     time=time.strftime("%Y-%m-%dT%H:%M:%S"), **extra)
+        self.jobs[video] = event
+        with open(self.path, "a", encoding="utf-8") as fh:
+            fh.write(json.dumps(event) + "\n")
+            fh.flush()
+            os.fsync(fh.fileno())
+
+
+def _run_job(video: str, results_folder: Optional[str], pipelined: bool, queue_size: int) -> tuple[int, float]:
+    t0 = time.perf_counter()
+    # Sin barra de progreso por video: el lote muestra la suya
+    frames = process_match(video, results_folder, pipelined=pipelined, queue_size=queue_size, progress=False)
+    return frames, time.perf_counter() - t0
+
+
+def run_batch(
+    source: str,
+    results_folder: Optional[str] = None,
+    workers: Optional[int] = None,
+    ledger_path: Optional[str] = None,
+    retry_failed: bool = True,
+    pipelined: bool = True,
+    queue_size: int = 8,
+) -> dict[str, Any]:
+    """
+    Procesa con process_match todos los videos de 'source' (carpeta o glob) en
+    un pool de procesos dimensionado por núcleos y memoria (plan_workers).
+
+    Las salidas siguen el esquema de main.py (output_paths); con
+    'results_folder' van todas a esa carpeta. El ledger (por defecto
+    batch_ledger.jsonl en la carpeta de resultados, o junto a los videos)
+    permite reanudar: los videos terminados se saltean y los que quedaron a
+    medias se procesan de nuevo. Con retry_failed=False también se saltean
+    los que fallaron.
+
+    Devuelve un resumen con los videos procesados, salteados y fallidos y el
+    throughput total (frames/s y videos/hora).
+    """
+    videos = discover_videos(source)
+    if ledger_path is None:
+        base = results_folder or (os.path.dirname(videos[0]) if videos else ".")
+        ledger_path = os.path.join(base, "batch_ledger.jsonl")
+    os.makedirs(os.path.dirname(os.path.abspath(ledger_path)), exist_ok=True)
+    ledger = JobLedger(ledger_path)
+
+    skipped = [v for v in videos if ledger.is_done(v)
+               or (not retry_failed and ledger.jobs.get(v, {}).get("status") == "failed")]
+    pending = [v for v in videos if v not in skipped]
+    n_workers = plan_workers(pending, workers, queue_size)
+
+    done, failed = [], []
+    total_frames = 0
+    t0 = time.perf_counter()
+    if pending:
+        with ProcessPoolExecutor(max_workers=n_workers) as pool, \
+             tqdm(total=len(pending), desc=f"Lote ({n_workers} procesos)", unit="video") as pbar:
+            futures = {}
+            for v in pending:
+                ledger.record(v, "started")
+                futures[pool.submit(_run_job, v, results_folder, pipelined, queue_size)] = v
+            for fut in as_completed(futures):
+                v = futures[fut]
+                try:
+                    frames, seconds = fut.result()
+                except Exception as e:  # el lote sigue con los demás videos
+                    ledger.record(v, "failed", error=f"{type(e).__name__}: {e}")
+                    failed.append(v)
+                    tqdm.write(f"Falló {os.path.basename(v)}: {e}")
+                else:
+                    ledger.record(v, "done", frames=frames, seconds=round(seconds, 3),
+                                  fps=round(frames / seconds, 2) if seconds > 0 else None)
+                    done.append(v)
+                    total_frames += frames
+                pbar.update(1)
+    wall = time.perf_counter() - t0
+
+    summary = dict(
+        videos=len(videos),
+        processed=len(done),
+        skipped=len(skipped),
+        failed=failed,
+        workers=n_workers,
+        frames=total_frames,
+        seconds=wall,
+        fps=total_frames / wall if wall > 0 and total_frames else 0.0,
+        videos_per_hour=len(done) * 3600.0 / wall if wall > 0 and done else 0.0,
+        ledger=ledger_path,
+    )
+    return summary
@@ -0,0 +1,147 @@
+# modules/blob_table.py
+import os
+import warnings
+from typing import Literal, Optional
+
+import numpy as np
+
+# Una fila por blob conservado (coordenadas en píxeles del frame completo)
+DETECTION_DTYPE = np.dtype([
+    ("frame", np.int64),
+    ("time", np.float64),         # segundos desde el inicio (frame / fps)
+    ("cx", np.float32),           # centroide
+    ("cy", np.float32),
+    ("x", np.int32),              # bounding box
+    ("y", np.int32),
+    ("w", np.int32),
+    ("h", np.int32),
+    ("area", np.int32),
+    ("circularity", np.float32),  # NaN si no se pudo medir
+])
+
+_CSV_FMT = ["%d", "%.6f", "%.3f", "%.3f", "%d", "%d", "%d", "%d", "%d", "%.5f"]
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Para escribir/leer Parquet hace falta pyarrow (pip install pyarrow).") from None
+    return pa, pq
+
+
+def _resolve_format(path: str, fmt: str) -> str:
+    if fmt == "auto":
+        return "parquet" if os.path.splitext(path)[1].lower() in (".parquet", ".pq") else "csv"
+    if fmt not in ("csv", "parquet"):
+        raise ValueError(f"Formato no soportado: {fmt}. Use 'auto', 'csv' o 'parquet'.")
+    return fmt
+
+
+class BlobTableWriter:
+    """
+    Escribe detecciones (tablas de blobs por frame) en un archivo columnar de
+    sólo agregado: CSV con cabecera o Parquet (un row group por lote, requiere
+    pyarrow). Con fmt="auto" el formato sale de la extensión de 'path'.
+
+    Las filas se acumulan en un buffer de 'batch_rows' y se vuelcan por lotes;
+    el archivo queda completo al llamar a release().
+    """
+
+    def __init__(
+        self,
+        path: str,
+        fps: float,
+        fmt: Literal["auto", "csv", "parquet"] = "auto",
+        batch_rows: int = 8192,
+    ):
+        self.path = path
+        self.fps = float(fps)
+        self.fmt = _resolve_format(path, fmt)
+        self.rows = 0
+        self._buf = np.empty(max(1, int(batch_rows)), dtype=DETECTION_DTYPE)
+        self._n = 0
+        if self.fmt == "parquet":
+            pa, pq = _import_pyarrow()
+            self._pa = pa
+            schema = pa.schema([(name, pa.from_numpy_dtype(DETECTION_DTYPE[name])) for name in DETECTION_DTYPE.names])
+            self._fh = pq.ParquetWriter(path, schema)
+        else:
+            self._fh = open(path, "w", encoding="utf-8", newline="")
+            self._fh.write(",".join(DETECTION_DTYPE.names) + "\n")
+
+    def write(self, frame_idx: int, blobs: Optional[np.ndarray]) -> None:
+        """Agrega los blobs (dtype BLOB_DTYPE de modules.analyze_blobs) del frame 'frame_idx'."""
+        if blobs is None or len(blobs) == 0:
+            return
+        k = len(blobs)
+        if self._n + k > len(self._buf):
+            self.flush()
+            if k > len(self._buf):
+                self._buf = np.empty(k, dtype=DETECTION_DTYPE)
+        rows = self._buf[self._n:self._n + k]
+        rows["frame"] = frame_idx
+        rows["time"] = frame_idx / self.fps if self.fps > 0 else np.nan
+        for name in ("cx", "cy", "x", "y", "w", "h", "area", "circularity"):
+            rows[name] = blobs[name]
+        self._n += k
+
+    def write_rows(self, rows: np.ndarray) -> None:
+        """Agrega filas que ya tienen DETECTION_DTYPE (p.ej. al unir tablas)."""
+        self.flush()
+        self._write_batch(np.asarray(rows, dtype=DETECTION_DTYPE))
+
+    def flush(self) -> None:
+        if self._n:
+            self._write_batch(self._buf[:self._n])
+            self._n = 0
+
+    def _write_batch(self, rows: np.ndarray) -> None:
+        if len(rows) == 0:
+            return
+        if self.fmt == "parquet":
+            pa = self._pa
+            self._fh.write_table(pa.table({name: pa.array(rows[name]) for name in DETECTION_DTYPE.names}))
+        else:
+            np.savetxt(self._fh, rows, fmt=_CSV_FMT, delimiter=",")
+        self.rows += len(rows)
+
+    def release(self) -> None:
+        if self._fh is None:
+            return
+        self.flush()
+        self._fh.close()
+        self._fh = None
+
+    close = release
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+def load_blob_table(path: str, fmt: Literal["auto", "csv", "parquet"] = "auto") -> np.ndarray:
+    """Lee una tabla de detecciones como array estructurado con DETECTION_DTYPE."""
+    fmt = _resolve_format(path, fmt)
+    if fmt == "parquet":
+        _, pq = _import_pyarrow()
+        table = pq.read_table(path)
+        out = np.empty(table.num_rows, dtype=DETECTION_DTYPE)
+        for name in DETECTION_DTYPE.names:
+            out[name] = table.column(name).to_numpy()
+        return out
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", UserWarning)  # tabla sin filas (sólo cabecera)
+        return np.loadtxt(path, dtype=DETECTION_DTYPE, delimiter=",", skiprows=1, ndmin=1)
+
+
+def concat_blob_tables(part_paths: list[str], output_path: str, fps: float,
+                       fmt: Literal["auto", "csv", "parquet"] = "auto") -> int:
+    """Une tablas de detecciones en 'output_path', en orden; devuelve la cantidad de filas."""
+    with BlobTableWriter(output_path, fps, fmt=fmt) as writer:
+        for p in part_paths:
+            writer.write_rows(load_blob_table(p, fmt=_resolve_format(output_path, fmt)))
+        return writer.rows
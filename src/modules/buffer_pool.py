@@ -0,0 +1,29 @@
+# modules/buffer_pool.py
+import numpy as np
+
+
+class BufferPool:
+    """
+    Buffers con nombre que se reservan una vez por corrida y se reutilizan en
+    cada frame como destino ('dst' / 'out') de las llamadas a OpenCV y NumPy.
+
+    get() devuelve siempre el mismo array para un nombre mientras no cambien
+    la forma ni el tipo; si cambian, se reserva uno nuevo.
+    """
+
+    def __init__(self):
+        self._bufs: dict[str, np.ndarray] = {}
+
+    def get(self, name: str, shape: tuple[int, ...], dtype=np.uint8, zero: bool = False) -> np.ndarray:
+        """Buffer 'name' de forma 'shape'; con zero=True se crea en cero (sólo al reservarlo)."""
+        shape = tuple(int(s) for s in shape)
+        buf = self._bufs.get(name)
+        if buf is None or buf.shape != shape or buf.dtype != np.dtype(dtype):
+            buf = np.zeros(shape, dtype=dtype) if zero else np.empty(shape, dtype=dtype)
+            self._bufs[name] = buf
+        return buf
+
+    @property
+    def nbytes(self) -> int:
+        """Memoria total reservada por el pool."""
+        return sum(b.nbytes for b in self._bufs.values())
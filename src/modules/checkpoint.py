@@ -0,0 +1,144 @@
+# modules/checkpoint.py
+import fnmatch
+import hashlib
+import json
+import os
+import shutil
+import warnings
+from typing import Any, Optional
+
+import numpy as np
+
+CHECKPOINT_VERSION = 2
+# Lo único que escribe un Checkpointer (trail_* es de checkpoints de la versión 1)
+_OWN_FILES = ("state.json", "state.json.tmp", "state_*.npz", "trail_*.npy", "seg_*")
+
+
+def fingerprint(params: dict[str, Any]) -> str:
+    """Firma de los parámetros de una corrida (un checkpoint sólo sirve con los mismos)."""
+    text = json.dumps(params, sort_keys=True, default=repr)
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:20]
+
+
+class Checkpointer:
+    """
+    Checkpoints de una corrida larga en la carpeta 'directory'.
+
+    Cada checkpoint cierra un segmento de salida ('seg_00000.mp4', '.masks',
+    tabla de detecciones...; rutas relativas a la carpeta) y guarda el estado
+    del segmentador ('state_00000.npz': estela, gate...) y un 'state.json'
+    con el próximo frame a procesar, los segmentos terminados y la firma del
+    video (ruta, tamaño, mtime) y de los parámetros. El estado se
+    escribe al final y de forma atómica: si el proceso muere a mitad de un
+    segmento, al reanudar ese segmento se descarta y se vuelve a escribir.
+
+    El modelo de fondo de OpenCV no se puede serializar: al reanudar se
+    reconstruye pasando los frames previos al checkpoint por el segmentador
+    (warm replay) y luego se restaura el estado guardado.
+
+    La carpeta puede ser compartida (p.ej. la de resultados): al descartar o
+    terminar sólo se borran los archivos propios del checkpoint.
+    """
+
+    def __init__(self, directory: str, input_path: str, params: dict[str, Any]):
+        self.directory = directory
+        st = os.stat(input_path)
+        self.video = dict(path=os.path.abspath(input_path), size=st.st_size, mtime_ns=st.st_mtime_ns)
+        self.params = fingerprint(params)
+        self.segments: list[dict[str, str]] = []
+        self.next_frame = 0
+        self._arrays = None
+        os.makedirs(directory, exist_ok=True)
+
+    @property
+    def _state_path(self) -> str:
+        return os.path.join(self.directory, "state.json")
+
+    def load(self) -> Optional[dict[str, np.ndarray]]:
+        """
+        Carga el último checkpoint válido: deja 'next_frame' y 'segments' y
+        devuelve el estado guardado del segmentador (None si no hay checkpoint). Un checkpoint
+        de otro video o con otros parámetros se descarta con un aviso.
+        """
+        if not os.path.exists(self._state_path):
+            return None
+        with open(self._state_path, "r", encoding="utf-8") as fh:
+            state = json.load(fh)
+        if (state.get("version") != CHECKPOINT_VERSION or state.get("video") != self.video
+                or state.get("params") != self.params):
+            warnings.warn(f"El checkpoint de {self.directory} es de otro video o de otros parámetros; se empieza de cero.")
+            self.clear()
+            return None
+        self.next_frame = int(state["next_frame"])
+        self.segments = state["segments"]
+        self._arrays = state["arrays"]
+        with np.load(os.path.join(self.directory, self._arrays)) as npz:
+            return {k: npz[k] for k in npz.files}
+
+    def segment_stem(self) -> str:
+        """Ruta sin extensión del próximo segmento ('seg_00000'); cada salida agrega la suya."""
+        return os.path.join(self.directory, f"seg_{len(self.segments):05d}")
+
+    def _relative(self, path: str) -> str:
+        # Relativas a la carpeta (se puede mover); os.devnull y rutas de afuera quedan absolutas
+        rel = os.path.relpath(path, self.directory)
+        return path if rel.startswith(os.pardir) else rel
+
+    def save(self, next_frame: int, arrays: dict[str, np.ndarray], segment: dict[str, str]) -> None:
+        """
+        Registra un segmento terminado (ya cerrado) y el estado del segmentador
+        tras 'next_frame' frames (arrays con nombre, p.ej. TrailSegmenter.get_state()).
+        """
+        k = len(self.segments)
+        arrays_name = f"state_{k:05d}.npz"
+        np.savez(os.path.join(self.directory, arrays_name), **arrays)
+        state = dict(
+            version=CHECKPOINT_VERSION, video=self.video, params=self.params,
+            next_frame=int(next_frame), arrays=arrays_name,
+            segments=self.segments + [{kind: self._relative(p) for kind, p in segment.items()}],
+        )
+        tmp = f"{self._state_path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(state, fh, indent=1)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp, self._state_path)
+        if self._arrays and self._arrays != arrays_name:
+            try:
+                os.remove(os.path.join(self.directory, self._arrays))
+            except OSError:
+                pass
+        self.segments, self.next_frame, self._arrays = state["segments"], state["next_frame"], arrays_name
+
+    def parts(self, kind: str) -> list[str]:
+        """Segmentos terminados de un tipo, en orden."""
+        return [os.path.join(self.directory, s[kind]) for s in self.segments if kind in s]
+
+    def _remove_own(self) -> None:
+        for name in os.listdir(self.directory):
+            if not any(fnmatch.fnmatchcase(name, pat) for pat in _OWN_FILES):
+                continue
+            path = os.path.join(self.directory, name)
+            if os.path.isdir(path):  # segmentos de secuencias PNG
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def clear(self) -> None:
+        """Descarta el checkpoint: borra sus archivos y deja el resto de la carpeta."""
+        self._remove_own()
+        self.segments, self.next_frame, self._arrays = [], 0, None
+
+    def finish(self) -> None:
+        """
+        Borra los archivos del checkpoint (la corrida terminó y las salidas
+        están unidas) y la carpeta si quedó vacía.
+        """
+        self._remove_own()
+        try:
+            os.rmdir(self.directory)
+        except OSError:
+            pass  # tiene otros archivos
@@ -1,8 +1,14 @@
 # modules/colorize_overlay.py
+import threading
+
 import cv2
 import numpy as np
 from typing import Optional
 
+_CACHE_SIZE = 8  # compositores distintos guardados por hilo
+_local = threading.local()
+
+
 def overlay_by_mask(
     frame_bgr: np.ndarray,
     mask: np.ndarray,
@@ -25,40 +31,165 @@ def overlay_by_mask(
 
     Retorna:
       - frame resaltado (uint8), misma forma que frame_bgr.
+
+    El OverlayCompositor se reutiliza entre llamadas con la misma forma y
+    parámetros (uno por hilo: sus buffers no se comparten).
+    """
+    color = tuple(int(c) for c in color)
+    key = (frame_bgr.shape[:2], color, float(alpha), int(soften or 0), colormap)
+    cache = getattr(_local, "compositors", None)
+    if cache is None:
+        cache = _local.compositors = {}
+    compositor = cache.get(key)
+    if compositor is None:
+        if len(cache) >= _CACHE_SIZE:
+            cache.clear()
+        compositor = cache[key] = OverlayCompositor(color=color, alpha=alpha, soften=soften, colormap=colormap)
+    return compositor.apply(frame_bgr, mask)
+
+
+def _merge_boxes(boxes: list[list[int]]) -> list[list[int]]:
+    # Une cajas que se tocan: así cada píxel se mezcla una sola vez
+    merged = True
+    while merged and len(boxes) > 1:
+        merged = False
+        out: list[list[int]] = []
+        for b in boxes:
+            for o in out:
+                if b[0] <= o[2] and o[0] <= b[2] and b[1] <= o[3] and o[1] <= b[3]:
+                    o[0], o[1] = min(o[0], b[0]), min(o[1], b[1])
+                    o[2], o[3] = max(o[2], b[2]), max(o[3], b[3])
+                    merged = True
+                    break
+            else:
+                out.append(list(b))
+        boxes = out
+    return boxes
+
+
+class OverlayCompositor:
     """
-    assert frame_bgr.dtype == np.uint8, "frame_bgr debe ser uint8"
-    h, w = frame_bgr.shape[:2]
-
-    # Asegurar máscara binaria 0/255 (1 canal)
-    if mask.ndim == 3:
-        mask = cv2.cvtColor(mask, cv2.COLOR_BGR2GRAY)
-    if mask.dtype != np.uint8:
-        mask = mask.astype(np.uint8)
-    # Normalizamos a 0/255
-    _, mask_bin = cv2.threshold(mask, 0, 255, cv2.THRESH_BINARY)
-
-    # Suavizado opcional de bordes
-    if soften and soften > 0:
-        # kernel impar
-        k = max(1, int(soften))
-        if k % 2 == 0:
+    Overlay por máscara que sólo trabaja dentro de las cajas con píxeles > 0.
+
+    Produce exactamente lo mismo que overlay_by_mask, pero:
+      - ubica la máscara con una grilla de baja resolución (teselas de 'tile' px)
+        y mezcla sólo dentro de esas cajas;
+      - el suavizado (soften) se calcula sólo alrededor de los bordes de la máscara;
+      - la capa de color sólido y la LUT del colormap se arman una vez y se reutilizan;
+      - escribe sobre 'out' (puede ser el mismo frame: in-place) sin construir
+        frames intermedios completos.
+    """
+
+    def __init__(
+        self,
+        color: tuple[int, int, int] = (0, 255, 255),
+        alpha: float = 0.6,
+        soften: int = 0,
+        colormap: Optional[int] = None,
+        tile: int = 16,
+    ):
+        self.color = tuple(int(c) for c in color)
+        self.alpha = float(np.clip(alpha, 0.0, 1.0))
+        k = max(1, int(soften)) if soften and soften > 0 else 0
+        if k and k % 2 == 0:
             k += 1
-        mask_bin = cv2.GaussianBlur(mask_bin, (k, k), 0)
+        self.ksize = k
+        self.radius = k // 2
+        self.colormap = colormap
+        # Con teselas de más de 22 px un único píxel (255/t² < 0.5) se redondearía a 0
+        self.tile = int(np.clip(tile, 1, 16))
+        self._solid = None  # capa de color del tamaño del frame (se recorta por caja)
+        self._grid_src = None  # máscara 0/255 con relleno hasta múltiplo de 'tile' (reutilizada)
+        self._lut = None
+        if colormap is not None:
+            ramp = np.arange(256, dtype=np.uint8).reshape(1, 256)
+            self._lut = cv2.applyColorMap(ramp, colormap)  # (1, 256, 3)
+
+    def boxes(self, mask_bin: np.ndarray) -> list[list[int]]:
+        """Cajas [x0, y0, x1, y1] que cubren los píxeles de una máscara 0/255, con margen para soften."""
+        h, w = mask_bin.shape[:2]
+        t = self.tile
+        gw, gh = -(-w // t), -(-h // t)
+        # Ocupación por tesela: INTER_AREA promedia; con la máscara en 0/255 basta
+        # un píxel encendido (>= 255/t²) para que la tesela no quede en 0
+        src = mask_bin
+        if (gw * t, gh * t) != (w, h):
+            padded = self._padded(h, w)
+            if not np.may_share_memory(padded, mask_bin):
+                padded[:h, :w] = mask_bin
+            src = padded
+        grid = cv2.resize(src, (gw, gh), interpolation=cv2.INTER_AREA)
+        if not grid.any():
+            return []
+        grid = (grid > 0).astype(np.uint8)
+        n, _, stats, _ = cv2.connectedComponentsWithStats(grid, connectivity=8)
+        r = self.radius
+        boxes = []
+        for gx, gy, gw_, gh_, _ in stats[1:n]:
+            boxes.append([
+                max(0, int(gx) * t - r),
+                max(0, int(gy) * t - r),
+                min(w, int(gx + gw_) * t + r),
+                min(h, int(gy + gh_) * t + r),
+            ])
+        return _merge_boxes(boxes)
+
+    def _padded(self, h: int, w: int) -> np.ndarray:
+        # Buffer en cero con relleno a múltiplo de 'tile'; sólo se reescribe [:h, :w]
+        t = self.tile
+        shape = (-(-h // t) * t, -(-w // t) * t)
+        if self._grid_src is None or self._grid_src.shape != shape:
+            self._grid_src = np.zeros(shape, dtype=np.uint8)
+        return self._grid_src
+
+    def apply(
+        self,
+        frame_bgr: np.ndarray,
+        mask: np.ndarray,
+        out: Optional[np.ndarray] = None,
+    ) -> np.ndarray:
+        """
+        Superpone el color/colormap sobre 'frame_bgr' donde 'mask' > 0.
+        'out' es el buffer de salida (del mismo tamaño); si es el propio
+        'frame_bgr' la mezcla es in-place. Si es None se devuelve una copia.
+        """
+        assert frame_bgr.dtype == np.uint8, "frame_bgr debe ser uint8"
+        h, w = frame_bgr.shape[:2]
+
+        # Asegurar máscara de 1 canal uint8
+        if mask.ndim == 3:
+            mask = cv2.cvtColor(mask, cv2.COLOR_BGR2GRAY)
+        if mask.dtype != np.uint8:
+            mask = mask.astype(np.uint8)
+        # Normalizamos a 0/255, directo sobre el buffer con relleno de boxes()
+        _, mask_bin = cv2.threshold(mask, 0, 255, cv2.THRESH_BINARY, dst=self._padded(h, w)[:h, :w])
+
+        if out is None:
+            out = frame_bgr.copy()
+        elif out is not frame_bgr:
+            np.copyto(out, frame_bgr)
+
+        if self.colormap is None and (self._solid is None or self._solid.shape[:2] != (h, w)):
+            self._solid = np.empty((h, w, 3), dtype=np.uint8)
+            self._solid[:] = np.array(self.color, dtype=np.uint8)
 
-    # Construir capa de color/colormap
-    if colormap is None:
-        overlay = np.zeros((h, w, 3), dtype=np.uint8)
-        overlay[:] = np.array(color, dtype=np.uint8)
-    else:
-        # Para colormap, usamos la máscara como intensidad (0-255)
-        overlay = cv2.applyColorMap(mask_bin, colormap)
+        r = self.radius
+        for x0, y0, x1, y1 in self.boxes(mask_bin):
+            # Contexto extra de 'r' píxeles para que el blur coincida con el de frame completo
+            ex0, ey0 = max(0, x0 - r), max(0, y0 - r)
+            ex1, ey1 = min(w, x1 + r), min(h, y1 + r)
+            m = mask_bin[ey0:ey1, ex0:ex1]
+            if self.ksize:
+                m = cv2.GaussianBlur(m, (self.ksize, self.ksize), 0)
+            m = m[y0 - ey0:y1 - ey0, x0 - ex0:x1 - ex0]
 
-    # Mezcla sólo en la región de la máscara
-    alpha = float(np.clip(alpha, 0.0, 1.0))
-    blended = cv2.addWeighted(frame_bgr, 1.0 - alpha, overlay, alpha, 0)
+            src = frame_bgr[y0:y1, x0:x1]
+            if self.colormap is None:
+                layer = self._solid[y0:y1, x0:x1]
+            else:
+                layer = cv2.LUT(cv2.cvtColor(m, cv2.COLOR_GRAY2BGR), self._lut)
 
-    # Convertir la máscara a 3 canales para hacer el “where”
-    mask_3c = cv2.cvtColor(mask_bin, cv2.COLOR_GRAY2BGR)
-    out = np.where(mask_3c > 0, blended, frame_bgr)
+            blended = cv2.addWeighted(src, 1.0 - self.alpha, layer, self.alpha, 0)
+            np.copyto(out[y0:y1, x0:x1], blended, where=(m > 0)[..., None])
 
-    return out
+        return out
@@ -1,23 +1,89 @@
 # modules/remove_small_components.py
 import cv2          # connectedComponentsWithStats, CC_STAT_AREA
 import numpy as np  # zeros_like
+from typing import Optional
 
-def filter_components(mask: np.ndarray, min_size: int = 0, max_size: int = 0) -> np.ndarray:
+
+def keep_components(
+    stats: np.ndarray,
+    centroids: np.ndarray,
+    min_size: int = 0,
+    max_size: int = 0,
+    min_bbox: Optional[tuple[int, int]] = None,
+    max_bbox: Optional[tuple[int, int]] = None,
+    min_aspect: Optional[float] = None,
+    max_aspect: Optional[float] = None,
+    centroid_region: Optional[tuple[int, int, int, int]] = None,
+) -> np.ndarray:
+    """
+    Decide qué componentes se conservan a partir de 'stats'/'centroids' de
+    connectedComponentsWithStats. Devuelve un array bool por etiqueta (0 = fondo, False).
+    """
+    area = stats[:, cv2.CC_STAT_AREA]
+    w = stats[:, cv2.CC_STAT_WIDTH]
+    h = stats[:, cv2.CC_STAT_HEIGHT]
+
+    keep = np.ones(len(stats), dtype=bool)
+    keep[0] = False  # 0 = fondo
+
+    if min_size > 1:
+        keep &= area >= min_size
+    if max_size > 0:
+        keep &= area <= max_size
+    if min_bbox is not None:
+        keep &= (w >= min_bbox[0]) & (h >= min_bbox[1])
+    if max_bbox is not None:
+        keep &= (w <= max_bbox[0]) & (h <= max_bbox[1])
+    if min_aspect is not None or max_aspect is not None:
+        aspect = w / np.maximum(h, 1)  # ancho / alto
+        if min_aspect is not None:
+            keep &= aspect >= min_aspect
+        if max_aspect is not None:
+            keep &= aspect <= max_aspect
+    if centroid_region is not None:
+        x0, y0, x1, y1 = centroid_region
+        cx, cy = centroids[:, 0], centroids[:, 1]
+        keep &= (cx >= x0) & (cx < x1) & (cy >= y0) & (cy < y1)
+
+    return keep
+
+
+def filter_components(
+    mask: np.ndarray,
+    min_size: int = 0,
+    max_size: int = 0,
+    *,
+    min_bbox: Optional[tuple[int, int]] = None,
+    max_bbox: Optional[tuple[int, int]] = None,
+    min_aspect: Optional[float] = None,
+    max_aspect: Optional[float] = None,
+    centroid_region: Optional[tuple[int, int, int, int]] = None,
+) -> np.ndarray:
     """
     Filtra componentes conectados en una máscara binaria según área mínima y/o máxima.
     - mask: binaria 0/255 (uint8)
     - min_size: área mínima (<=1 desactiva)
     - max_size: área máxima (<=0 desactiva)
+    - min_bbox / max_bbox: (ancho, alto) mínimo/máximo del bounding box
+    - min_aspect / max_aspect: relación ancho/alto del bounding box
+    - centroid_region: (x0, y0, x1, y1); se conservan los componentes cuyo centroide cae adentro
+
+    La decisión se toma una vez sobre 'stats' y se aplica con una tabla
+    etiqueta → valor en una sola pasada sobre 'labels' (O(píxeles)).
     """
-    if (min_size <= 1) and (max_size <= 0):
+    criteria = (min_bbox, max_bbox, min_aspect, max_aspect, centroid_region)
+    if (min_size <= 1) and (max_size <= 0) and all(c is None for c in criteria):
         return mask
 
-    num_labels, labels, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
-    cleaned = np.zeros_like(mask)
+    _, labels, stats, centroids = cv2.connectedComponentsWithStats(mask, connectivity=8)
 
-    for i in range(1, num_labels):  # 0 = fondo
-        area = stats[i, cv2.CC_STAT_AREA]
-        if (min_size <= 1 or area >= min_size) and (max_size <= 0 or area <= max_size):
-            cleaned[labels == i] = 255
+    keep = keep_components(
+        stats, centroids,
+        min_size=min_size, max_size=max_size,
+        min_bbox=min_bbox, max_bbox=max_bbox,
+        min_aspect=min_aspect, max_aspect=max_aspect,
+        centroid_region=centroid_region,
+    )
+    lut = np.where(keep, 255, 0).astype(np.uint8)
 
-    return cleaned
+    return lut[labels]
@@ -0,0 +1,285 @@
+# modules/frame_cache.py
+import hashlib
+import json
+import os
+import time
+import warnings
+
+import cv2
+import numpy as np
+from tqdm import tqdm
+
+CACHE_VERSION = 1
+TMP_STALE_SECONDS = 3600  # un .tmp sin escribir hace más que esto es de una corrida que murió
+DEFAULT_CACHE_DIR = os.environ.get(
+    "FRAME_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "frame_cache")
+)
+
+
+class CachedFrames:
+    """
+    Frames decodificados de un video, mapeados en memoria desde el cache.
+    'frames' es un array uint8 de sólo lectura (n, h, w, 3) o (n, h, w) en gris.
+    """
+
+    def __init__(self, data_path: str, header: dict):
+        self.path = data_path
+        self.video = header["video"]
+        self.fps = float(header["fps"])
+        self.width = int(header["width"])
+        self.height = int(header["height"])
+        self.gray = bool(header["gray"])
+        shape = (int(header["count"]), self.height, self.width) + (() if self.gray else (3,))
+        self.frames = np.memmap(data_path, dtype=np.uint8, mode="r", shape=shape)
+
+    def __len__(self) -> int:
+        return self.frames.shape[0]
+
+    def __getitem__(self, idx):
+        return self.frames[idx]
+
+
+class CachedCapture:
+    """
+    Sustituto de cv2.VideoCapture que lee de un CachedFrames.
+
+    Implementa lo que usa el pipeline: read/grab/retrieve, get/set de
+    posición (exacta) y de propiedades del video, isOpened y release.
+    read() devuelve una copia escribible (o escribe en 'image' si se pasa).
+    """
+
+    def __init__(self, cached: CachedFrames):
+        self.cached = cached
+        self._pos = 0  # próximo frame a leer
+
+    def isOpened(self) -> bool:
+        return self.cached is not None
+
+    def grab(self) -> bool:
+        if self._pos >= len(self.cached):
+            return False
+        self._pos += 1
+        return True
+
+    def retrieve(self, image: np.ndarray | None = None):
+        if self._pos == 0:
+            return False, None
+        src = self.cached.frames[self._pos - 1]
+        if image is None or image.shape != src.shape or image.dtype != src.dtype:
+            return True, np.array(src)
+        np.copyto(image, src)
+        return True, image
+
+    def read(self, image: np.ndarray | None = None):
+        if not self.grab():
+            return False, None
+        return self.retrieve(image)
+
+    def get(self, prop: int) -> float:
+        c = self.cached
+        if prop == cv2.CAP_PROP_FPS:
+            return c.fps
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return float(c.width)
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return float(c.height)
+        if prop == cv2.CAP_PROP_FRAME_COUNT:
+            return float(len(c))
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            return float(self._pos)
+        if prop == cv2.CAP_PROP_POS_MSEC:
+            return max(0, self._pos - 1) * 1000.0 / c.fps
+        return 0.0
+
+    def set(self, prop: int, value: float) -> bool:
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            self._pos = int(np.clip(int(value), 0, len(self.cached)))
+            return True
+        return False
+
+    def release(self) -> None:
+        self.cached = None
+
+
+class FrameCache:
+    """
+    Cache en disco local de videos decodificados, para repetir pasadas sobre el
+    mismo video (barridos de parámetros) sin volver a pasar por el códec.
+
+    Cada video se decodifica una vez a un archivo crudo uint8 ('<clave>.frames',
+    frames completos BGR o sólo gris) con una cabecera JSON ('<clave>.json')
+    con fps, forma y la firma del video (tamaño y mtime): si el video cambia,
+    la entrada vieja deja de usarse. El total del cache se limita a 'max_bytes'
+    desalojando las entradas usadas hace más tiempo (LRU entre videos); los
+    '.tmp' que dejan las corridas interrumpidas se borran al desalojar.
+
+    Con gray=True el segmentador por umbral da lo mismo que con el video (a
+    escala 1); MOG2/KNN y la mediana pasan a trabajar sobre gris.
+    """
+
+    def __init__(self, cache_dir: str | None = None, max_bytes: int = 16 * 1024 ** 3, gray: bool = False):
+        self.cache_dir = cache_dir or DEFAULT_CACHE_DIR
+        self.max_bytes = int(max_bytes)
+        self.gray = bool(gray)
+
+    def _key(self, video_path: str) -> str:
+        st = os.stat(video_path)
+        ident = f"{os.path.abspath(video_path)}|{st.st_size}|{st.st_mtime_ns}|{'gray' if self.gray else 'bgr'}"
+        return hashlib.sha1(ident.encode("utf-8")).hexdigest()[:20]
+
+    def _paths(self, key: str) -> tuple[str, str]:
+        base = os.path.join(self.cache_dir, key)
+        return f"{base}.frames", f"{base}.json"
+
+    def _entries(self) -> list[tuple[float, int, str]]:
+        """(último uso, bytes, clave) de cada entrada completa del cache."""
+        out = []
+        if not os.path.isdir(self.cache_dir):
+            return out
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".json"):
+                continue
+            key = name[:-5]
+            data_path, header_path = self._paths(key)
+            try:
+                out.append((os.stat(header_path).st_mtime, os.path.getsize(data_path), key))
+            except OSError:
+                continue
+        return out
+
+    def _remove_stale_tmp(self) -> None:
+        # Restos de construcciones interrumpidas (una activa escribe sin parar)
+        if not os.path.isdir(self.cache_dir):
+            return
+        now = time.time()
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".tmp"):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                if now - os.stat(path).st_mtime > TMP_STALE_SECONDS:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def _remove(self, key: str) -> None:
+        for p in self._paths(key):
+            try:
+                os.remove(p)
+            except OSError:
+                pass
+
+    def evict(self, needed_bytes: int = 0, keep: str | None = None) -> None:
+        """Desaloja entradas (la de uso más viejo primero) hasta que entren 'needed_bytes'."""
+        self._remove_stale_tmp()
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, key in entries:
+            if total + needed_bytes <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            self._remove(key)
+            total -= size
+
+    def clear(self) -> None:
+        for _, _, key in self._entries():
+            self._remove(key)
+        self._remove_stale_tmp()
+
+    def _load(self, key: str, video_path: str) -> CachedFrames | None:
+        data_path, header_path = self._paths(key)
+        try:
+            with open(header_path, "r", encoding="utf-8") as fh:
+                header = json.load(fh)
+            if header.get("version") != CACHE_VERSION:
+                return None
+            st = os.stat(video_path)
+            if (header.get("video") != os.path.abspath(video_path) or header.get("size") != st.st_size
+                    or header.get("mtime_ns") != st.st_mtime_ns):
+                return None  # cabecera de otra versión del video
+            cached = CachedFrames(data_path, header)
+        except (OSError, ValueError, KeyError):
+            return None
+        os.utime(header_path)  # marca de último uso para el LRU
+        return cached
+
+    def _build(self, video_path: str, key: str) -> CachedFrames | None:
+        cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            raise RuntimeError(f"No se pudo abrir el video: {video_path}")
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        fps = float(fps if fps and fps > 0 else 30.0)
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH) or 0)
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT) or 0)
+        approx = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+        frame_bytes = width * height * (1 if self.gray else 3)
+        if frame_bytes * approx > self.max_bytes:
+            cap.release()
+            warnings.warn(f"El video no entra en el cache de frames ({self.max_bytes} bytes); se decodifica directo.")
+            return None
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.evict(frame_bytes * approx, keep=key)
+        st = os.stat(video_path)
+
+        data_path, header_path = self._paths(key)
+        tmp = f"{data_path}.{os.getpid()}.tmp"
+        count = written = 0
+        try:
+            with open(tmp, "wb") as fh, tqdm(total=approx or None, desc="Cacheando frames", unit="frame") as pbar:
+                while True:
+                    ok, frame = cap.read()
+                    if not ok:
+                        break
+                    if self.gray:
+                        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+                    height, width = frame.shape[:2]
+                    if written + frame.nbytes > self.max_bytes:
+                        # Sin cantidad de frames (o con una que mentía) el límite se controla acá
+                        break
+                    fh.write(memoryview(np.ascontiguousarray(frame)))
+                    written += frame.nbytes
+                    count += 1
+                    pbar.update(1)
+        except BaseException:
+            os.remove(tmp)
+            raise
+        finally:
+            cap.release()
+        if ok:  # se cortó por 'max_bytes', no por el fin del video
+            os.remove(tmp)
+            warnings.warn(f"El video no entra en el cache de frames ({self.max_bytes} bytes); se decodifica directo.")
+            return None
+        if count == 0:
+            os.remove(tmp)
+            raise RuntimeError("El video no contiene frames válidos.")
+        self.evict(written, keep=key)
+
+        header = dict(
+            version=CACHE_VERSION, video=os.path.abspath(video_path), size=st.st_size, mtime_ns=st.st_mtime_ns,
+            fps=fps, width=width, height=height, count=count, gray=self.gray, created=time.time(),
+        )
+        # Datos primero, cabecera al final: una entrada sin cabecera no existe
+        os.replace(tmp, data_path)
+        tmp_header = f"{header_path}.{os.getpid()}.tmp"
+        with open(tmp_header, "w", encoding="utf-8") as fh:
+            json.dump(header, fh)
+        os.replace(tmp_header, header_path)
+        return CachedFrames(data_path, header)
+
+    def open(self, video_path: str, build: bool = True) -> CachedFrames | None:
+        """
+        Frames del video desde el cache; si no están y build=True, decodifica
+        el video una vez y los guarda. Devuelve None si no están en el cache
+        (build=False) o si el video no entra en 'max_bytes'.
+        """
+        key = self._key(video_path)
+        cached = self._load(key, video_path)
+        if cached is None and build:
+            cached = self._build(video_path, key)
+        return cached
+
+    def capture(self, video_path: str) -> CachedCapture | None:
+        """CachedCapture del video (lo cachea si hace falta) o None si no se pudo cachear."""
+        cached = self.open(video_path)
+        return CachedCapture(cached) if cached is not None else None
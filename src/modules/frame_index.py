@@ -0,0 +1,195 @@
+# modules/frame_index.py
+import os
+import shutil
+import subprocess
+
+import cv2
+import numpy as np
+
+INDEX_VERSION = 1
+INDEX_SUFFIX = ".frameidx.npz"
+
+
+def index_path(video_path: str) -> str:
+    """Ruta del índice sidecar: junto al video, con sufijo '.frameidx.npz'."""
+    return f"{video_path}{INDEX_SUFFIX}"
+
+
+def _video_signature(video_path: str) -> tuple[int, int]:
+    st = os.stat(video_path)
+    return int(st.st_size), int(st.st_mtime_ns)
+
+
+def _probe_keyframes_ms(video_path: str) -> np.ndarray | None:
+    """Timestamps (ms) de los keyframes vía ffprobe, o None si no está disponible."""
+    ffprobe = shutil.which("ffprobe")
+    if not ffprobe:
+        return None
+    proc = subprocess.run(
+        [ffprobe, "-v", "error", "-select_streams", "v:0", "-skip_frame", "nokey",
+         "-show_entries", "frame=pts_time", "-of", "csv=p=0", video_path],
+        capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        return None
+    times = []
+    for line in proc.stdout.splitlines():
+        line = line.strip().rstrip(",")
+        try:
+            times.append(float(line) * 1000.0)
+        except ValueError:
+            continue
+    return np.asarray(times, dtype=np.float64) if times else None
+
+
+class FrameIndex:
+    """
+    Índice frame → timestamp y puntos de seek ('anchors') de un video.
+
+    Los anchors son los keyframes reales si ffprobe está disponible; si no,
+    un frame cada 'anchor_step'. Un seek posiciona el decoder en el anchor
+    anterior, verifica dónde cayó por timestamp y avanza con grab() hasta el
+    frame pedido, así que es exacto aunque CAP_PROP_POS_FRAMES no lo sea.
+    """
+
+    def __init__(self, pts_ms: np.ndarray, anchors: np.ndarray, keyframes: bool):
+        self.pts_ms = np.asarray(pts_ms, dtype=np.float64)
+        self.anchors = np.asarray(anchors, dtype=np.int64)
+        self.keyframes = bool(keyframes)
+        # Sin timestamps crecientes no se puede verificar: se confía en POS_FRAMES
+        self.monotonic = bool(len(self.pts_ms) < 2 or np.all(np.diff(self.pts_ms) > 0))
+
+    def __len__(self) -> int:
+        return len(self.pts_ms)
+
+    def _current_frame(self, cap) -> int:
+        """Número del último frame decodificado por 'cap'."""
+        if self.monotonic:
+            t = cap.get(cv2.CAP_PROP_POS_MSEC)
+            j = int(np.searchsorted(self.pts_ms, t))
+            if j > 0 and (j == len(self.pts_ms) or t - self.pts_ms[j - 1] < self.pts_ms[j] - t):
+                j -= 1
+            return j
+        return int(cap.get(cv2.CAP_PROP_POS_FRAMES)) - 1
+
+    def seek(self, cap, frame_idx: int) -> None:
+        """Posiciona 'cap' para que el próximo read() devuelva 'frame_idx'."""
+        frame_idx = int(frame_idx)
+        if frame_idx <= 0:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            return
+        if frame_idx >= len(self):
+            raise IndexError(f"Frame fuera de rango: {frame_idx} (el video tiene {len(self)})")
+
+        target = frame_idx - 1  # último frame a consumir antes del read()
+        a = int(np.searchsorted(self.anchors, target, side="right")) - 1
+        while True:
+            anchor = int(self.anchors[a]) if a >= 0 else 0
+            cap.set(cv2.CAP_PROP_POS_FRAMES, anchor)
+            if not cap.grab():
+                raise RuntimeError(f"No se pudo decodificar el frame {anchor}.")
+            pos = self._current_frame(cap)
+            if pos <= target or anchor == 0:
+                break
+            a -= 1  # el decoder se pasó: reintentar desde el anchor anterior
+
+        if pos > target:
+            # Ni desde el inicio cae antes del objetivo: rebobinar del todo
+            cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            pos = -1
+        while pos < target:
+            if not cap.grab():
+                raise RuntimeError(f"No se pudo avanzar hasta el frame {frame_idx}.")
+            pos += 1
+
+    def skips_ahead(self, pos: int, frame_idx: int) -> bool:
+        """True si hay un anchor entre 'pos' y 'frame_idx': conviene seek() y no grab()."""
+        a = int(np.searchsorted(self.anchors, frame_idx - 1, side="right")) - 1
+        return a >= 0 and int(self.anchors[a]) > pos
+
+    def save(self, path: str, signature: tuple[int, int]) -> None:
+        # Escritura atómica: otro proceso puede estar leyendo el mismo sidecar
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as fh:
+            np.savez(
+                fh,
+                version=np.int64(INDEX_VERSION),
+                size=np.int64(signature[0]),
+                mtime_ns=np.int64(signature[1]),
+                pts_ms=self.pts_ms,
+                anchors=self.anchors,
+                keyframes=np.bool_(self.keyframes),
+            )
+        os.replace(tmp, path)
+
+
+def build_frame_index(video_path: str, anchor_step: int = 250) -> FrameIndex:
+    """Recorre el video con grab() registrando el timestamp de cada frame."""
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise RuntimeError(f"No se pudo abrir el video: {video_path}")
+    pts = []
+    try:
+        while cap.grab():
+            pts.append(cap.get(cv2.CAP_PROP_POS_MSEC))
+    finally:
+        cap.release()
+    if not pts:
+        raise RuntimeError("El video no contiene frames válidos.")
+    pts_ms = np.asarray(pts, dtype=np.float64)
+
+    anchors = None
+    key_ms = _probe_keyframes_ms(video_path)
+    if key_ms is not None:
+        # ffprobe no descuenta el start_time del stream; OpenCV sí
+        key_ms = key_ms - key_ms[0] + pts_ms[0]
+        anchors = np.unique(np.clip(np.searchsorted(pts_ms, key_ms - 0.5), 0, len(pts_ms) - 1))
+    keyframes = anchors is not None
+    if not keyframes:
+        anchors = np.arange(0, len(pts_ms), max(1, int(anchor_step)), dtype=np.int64)
+    return FrameIndex(pts_ms, anchors, keyframes)
+
+
+def open_frame_index(video_path: str, build: bool = True, anchor_step: int = 250) -> FrameIndex | None:
+    """
+    Carga el índice sidecar del video si sigue siendo válido (mismo tamaño y
+    mtime); si no existe o quedó viejo y build=True, lo construye y lo guarda.
+    Si el directorio no es escribible, el índice se usa sólo en memoria.
+    """
+    path = index_path(video_path)
+    signature = _video_signature(video_path)
+
+    if os.path.exists(path):
+        try:
+            with np.load(path) as data:
+                if (int(data["version"]) == INDEX_VERSION
+                        and (int(data["size"]), int(data["mtime_ns"])) == signature):
+                    return FrameIndex(data["pts_ms"], data["anchors"], bool(data["keyframes"]))
+        except (OSError, KeyError, ValueError):
+            pass  # índice corrupto o de otra versión: se reconstruye
+
+    if not build:
+        return None
+
+    index = build_frame_index(video_path, anchor_step=anchor_step)
+    try:
+        index.save(path, signature)
+    except OSError:
+        pass
+    return index
+
+
+def read_frame(video_path: str, frame_idx: int) -> np.ndarray:
+    """Lee un frame puntual (p.ej. para revisar un rally) usando el índice sidecar."""
+    index = open_frame_index(video_path)
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise RuntimeError(f"No se pudo abrir el video: {video_path}")
+    try:
+        index.seek(cap, frame_idx)
+        ok, frame = cap.read()
+    finally:
+        cap.release()
+    if not ok:
+        raise RuntimeError(f"No se pudo leer el frame {frame_idx}.")
+    return frame
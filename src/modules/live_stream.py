@@ -0,0 +1,218 @@
+# modules/live_stream.py
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Iterator, Literal, Optional, Union
+
+import cv2
+import numpy as np
+
+from . import process_video as _pv
+from .process_video import TrailSegmenter
+from .roi import build_roi
+from .stage_timer import StageTimer
+from .motion_gate import MotionGate
+
+Source = Union[str, int, cv2.VideoCapture]
+
+
+class StreamStats:
+    """
+    Contadores de un stream de iter_masks: frames leídos, procesados y
+    descartados por el buffer, y la latencia (s) del último frame procesado.
+    La distribución de latencias queda en el StageTimer (etapa "latency").
+    """
+
+    def __init__(self):
+        self.read = 0
+        self.processed = 0
+        self.dropped = 0
+        self.latency = 0.0
+
+    @property
+    def dropped_fraction(self) -> float:
+        return self.dropped / self.read if self.read else 0.0
+
+
+class _DropOldestReader:
+    """
+    Hilo lector sobre un buffer acotado: si el consumidor se atrasa, el frame
+    más viejo se descarta para que el próximo get() devuelva uno reciente.
+    Con 'fps' la lectura se espacia a ese ritmo (archivo como si fuera cámara).
+    """
+
+    def __init__(self, cap, size: int, stats: StreamStats, fps: Optional[float] = None):
+        self.cap = cap
+        self.buf: deque = deque(maxlen=max(1, int(size)))
+        self.stats = stats
+        self.fps = fps
+        self.cond = threading.Condition()
+        self.stop = threading.Event()
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.thread = threading.Thread(target=self._run, name="live-reader", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        idx = 0
+        t0 = time.perf_counter()
+        try:
+            while not self.stop.is_set():
+                if self.fps:
+                    wait = t0 + idx / self.fps - time.perf_counter()
+                    if wait > 0:
+                        time.sleep(wait)
+                ok, frame = self.cap.read()
+                if not ok:
+                    break
+                t = time.perf_counter()
+                with self.cond:
+                    if len(self.buf) == self.buf.maxlen:
+                        self.stats.dropped += 1
+                    self.buf.append((idx, t, frame))
+                    self.stats.read += 1
+                    self.cond.notify()
+                idx += 1
+        except BaseException as exc:  # se re-lanza en el consumidor
+            self.error = exc
+        finally:
+            with self.cond:
+                self.done = True
+                self.cond.notify()
+
+    def get(self):
+        """(índice, instante de captura, frame) más viejo del buffer, o None al terminar."""
+        with self.cond:
+            while not self.buf and not self.done:
+                self.cond.wait()
+            if self.buf:
+                return self.buf.popleft()
+        if self.error is not None:
+            raise self.error
+        return None
+
+    def close(self):
+        self.stop.set()
+        self.thread.join()
+
+
+def iter_masks(
+    source: Source,
+    algo: Literal["mog2","knn"] = "mog2",
+    history: int = 500,
+    varth: float = 16.0,
+    shadows: bool = False,
+    thresh: int = 25,
+    kernel: int = 3,
+    fade: float = 0.90,
+    bin_level: int = 32,
+    min_circularity: Optional[float] = None,
+    max_circularity: Optional[float] = None,
+    roi_polygon: Optional[list[tuple[int, int]]] = None,
+    roi_mask_path: Optional[str] = None,
+    scale: float = 1.0,
+    trail_mode: Literal["float","fixed"] = "float",
+    motion_gate: Optional[MotionGate] = None,
+    # —— Entrada en vivo ——
+    buffer_size: int = 2,              # frames en espera; al llenarse se descarta el más viejo
+    realtime: Optional[bool] = None,   # leer al ritmo de los fps (None: sólo si 'source' es un archivo)
+    api_preference: int = cv2.CAP_ANY, # backend de cv2.VideoCapture (p.ej. cv2.CAP_GSTREAMER)
+    timer: Optional[StageTimer] = None,
+    stats: Optional[StreamStats] = None,
+) -> Iterator[tuple[int, np.ndarray, np.ndarray, np.ndarray]]:
+    """
+    Segmentación en vivo con la lógica de process_video (MOG2/KNN + estela):
+    genera (frame_idx, frame, mask, blobs) apenas se procesa cada frame.
+
+    'source' es cualquier fuente de cv2.VideoCapture (archivo, URL/pipe,
+    pipeline de GStreamer, índice de dispositivo) o una captura ya abierta
+    (no se libera al terminar). Un hilo lector llena un buffer de
+    'buffer_size' frames; si el procesamiento se atrasa se descarta el frame
+    más viejo, así la latencia queda acotada. 'frame_idx' es el índice en la
+    fuente: los frames descartados aparecen como saltos.
+
+    'mask' es un buffer interno del segmentador (consumirla antes de pedir
+    el siguiente frame); 'frame' es propio de cada iteración. 'blobs' es la
+    tabla de componentes conservados (modules.analyze_blobs.BLOB_DTYPE), con
+    el área y la circularidad en coordenadas del frame.
+
+    Con 'timer' se miden las etapas del segmentador, "queue" (espera en el
+    buffer) y "latency" (de la captura a la entrega); los hooks del timer
+    reciben la latencia de cada frame. 'stats' (StreamStats) lleva los
+    frames leídos, procesados y descartados. MIN_SIZE/MAX_SIZE se toman de
+    modules.process_video, como en process_video.
+    """
+    opened = not isinstance(source, cv2.VideoCapture)
+    cap = cv2.VideoCapture(source, api_preference) if opened else source
+    if not cap.isOpened():
+        raise RuntimeError(f"No se pudo abrir la fuente de video: {source}")
+    stats = stats if stats is not None else StreamStats()
+    if realtime is None:
+        realtime = isinstance(source, str) and os.path.isfile(source)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    # Antes de arrancar el lector: la captura no se consulta desde dos hilos
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+
+    reader = _DropOldestReader(cap, buffer_size, stats, fps if realtime else None)
+    try:
+        item = reader.get()
+        if item is None:
+            return
+        # Muchos pipes, pipelines y dispositivos no informan el tamaño: se toma del primer frame
+        if width <= 0 or height <= 0:
+            height, width = item[2].shape[:2]
+        segmenter = TrailSegmenter(
+            algo=algo, history=history, varth=varth, shadows=shadows,
+            thresh=thresh, kernel=kernel, fade=fade, bin_level=bin_level,
+            min_size=_pv.MIN_SIZE, max_size=_pv.MAX_SIZE,
+            min_circularity=min_circularity, max_circularity=max_circularity,
+            roi=build_roi(width, height, polygon=roi_polygon, mask_path=roi_mask_path),
+            scale=scale,
+            trail_mode=trail_mode,
+            measure_blobs=True,
+            gate=motion_gate,
+        )
+        segmenter.timer = timer
+
+        while item is not None:
+            idx, captured, frame = item
+            if timer is not None:
+                timer.record("queue", time.perf_counter() - captured)
+                timer.reset_mark()
+            mask = segmenter.apply(frame)
+            stats.latency = time.perf_counter() - captured
+            stats.processed += 1
+            if timer is not None:
+                timer.record("latency", stats.latency)
+                timer.end_frame()
+            yield idx, frame, mask, segmenter.blobs
+            item = reader.get()
+    finally:
+        reader.close()
+        if opened:
+            cap.release()
+
+
+async def aiter_masks(source: Source, **kwargs) -> AsyncIterator[tuple[int, np.ndarray, np.ndarray, np.ndarray]]:
+    """
+    Variante asyncio de iter_masks (mismos argumentos): el procesamiento
+    corre en un hilo aparte y el event loop queda libre entre frames.
+    La máscara sigue siendo un buffer interno: consumirla antes del próximo await.
+    """
+    it = iter_masks(source, **kwargs)
+    loop = asyncio.get_running_loop()
+    # Un único hilo: next() y close() nunca corren a la vez sobre el generador
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="live-segment")
+    try:
+        while True:
+            item = await loop.run_in_executor(executor, next, it, None)
+            if item is None:
+                return
+            yield item
+    finally:
+        executor.submit(it.close)
+        executor.shutdown(wait=False)
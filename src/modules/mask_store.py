@@ -0,0 +1,215 @@
+# modules/mask_store.py
+import os
+import struct
+from typing import Iterator, Literal, Optional
+
+import numpy as np
+
+# Formato (little-endian):
+#   [cabecera de 64 bytes] [registros por frame...] [tabla]
+#   cabecera: magic, versión, ancho, alto, n° de frames, offset de la tabla, fps
+#   tabla: offsets uint64[n+1] (inicio de cada registro y fin del último)
+#          + códec uint8[n] de cada registro
+# Un registro es la máscara empaquetada con np.packbits (h*w bits) o su RLE:
+# largos uint32 de corridas alternadas 0/255 empezando por 0.
+MAGIC = b"MASKSTO1"
+VERSION = 1
+_HEADER = struct.Struct("<8sIIIQQd20x")
+
+CODEC_PACKBITS = 0
+CODEC_RLE = 1
+_CODECS = {"packbits": CODEC_PACKBITS, "rle": CODEC_RLE}
+
+
+def _encode_rle(flat: np.ndarray) -> np.ndarray:
+    n = flat.size
+    change = np.flatnonzero(flat[1:] != flat[:-1]) + 1
+    bounds = np.concatenate(([0], change, [n]))
+    runs = np.diff(bounds).astype(np.uint32)
+    if n and flat[0]:
+        runs = np.concatenate((np.zeros(1, dtype=np.uint32), runs))  # primera corrida de 0 vacía
+    return runs
+
+
+def _decode_rle(runs: np.ndarray, n: int) -> np.ndarray:
+    values = np.zeros(len(runs), dtype=np.uint8)
+    values[1::2] = 255
+    out = np.repeat(values, runs)
+    if out.size != n:
+        raise ValueError("Registro RLE corrupto: la cantidad de píxeles no coincide.")
+    return out
+
+
+class MaskStoreWriter:
+    """
+    Escribe máscaras 0/255 de tamaño fijo en un archivo compacto y exacto.
+
+    Cada frame se guarda empaquetado a 1 bit por píxel (packbits) o en RLE;
+    con codec="auto" se elige por frame el más chico (RLE gana cuando hay pocos
+    blobs). La tabla de offsets se escribe al cerrar: un archivo que no se
+    cerró queda marcado con 0 frames y no se puede abrir.
+
+    Expone write()/release() como un cv2.VideoWriter.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        width: int,
+        height: int,
+        fps: float = 0.0,
+        codec: Literal["auto", "packbits", "rle"] = "auto",
+    ):
+        if codec != "auto" and codec not in _CODECS:
+            raise ValueError(f"Códec no soportado: {codec}. Use 'auto', 'packbits' o 'rle'.")
+        self.path = path
+        self.width = int(width)
+        self.height = int(height)
+        self.fps = float(fps)
+        self.codec = codec
+        self._offsets = [_HEADER.size]
+        self._codecs: list[int] = []
+        self._fh = open(path, "wb")
+        self._fh.write(self._header(0, 0))
+
+    def _header(self, count: int, table_offset: int) -> bytes:
+        return _HEADER.pack(MAGIC, VERSION, self.width, self.height, count, table_offset, self.fps)
+
+    def __len__(self) -> int:
+        return len(self._codecs)
+
+    def _write_record(self, payload, codec: int) -> None:
+        self._fh.write(payload)
+        self._offsets.append(self._offsets[-1] + memoryview(payload).nbytes)
+        self._codecs.append(codec)
+
+    def write(self, mask: np.ndarray) -> None:
+        if mask.shape[:2] != (self.height, self.width):
+            raise ValueError(
+                f"Tamaño de máscara {mask.shape[1]}x{mask.shape[0]} distinto del store "
+                f"({self.width}x{self.height})."
+            )
+        flat = mask.reshape(-1) > 0
+        if self.codec == "packbits":
+            self._write_record(np.packbits(flat), CODEC_PACKBITS)
+            return
+        runs = _encode_rle(flat)
+        if self.codec == "rle" or runs.nbytes < (flat.size + 7) // 8:
+            self._write_record(runs, CODEC_RLE)
+        else:
+            self._write_record(np.packbits(flat), CODEC_PACKBITS)
+
+    def release(self) -> None:
+        if self._fh is None:
+            return
+        table_offset = self._offsets[-1]
+        self._fh.write(np.asarray(self._offsets, dtype="<u8").tobytes())
+        self._fh.write(np.asarray(self._codecs, dtype=np.uint8).tobytes())
+        self._fh.seek(0)
+        self._fh.write(self._header(len(self._codecs), table_offset))
+        self._fh.close()
+        self._fh = None
+
+    close = release
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class MaskStore:
+    """
+    Lector de un archivo de MaskStoreWriter, mapeado en memoria.
+
+    store[i] devuelve la máscara 0/255 (uint8, alto x ancho) del frame i en
+    O(1): la tabla de offsets ubica el registro y sólo se decodifica ese frame.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        size = os.path.getsize(path)
+        if size < _HEADER.size:
+            raise ValueError(f"No es un archivo de máscaras: {path}")
+        self._mm = np.memmap(path, dtype=np.uint8, mode="r")
+        magic, version, width, height, count, table_offset, fps = _HEADER.unpack(
+            self._mm[:_HEADER.size].tobytes()
+        )
+        if magic != MAGIC:
+            raise ValueError(f"No es un archivo de máscaras: {path}")
+        if version != VERSION:
+            raise ValueError(f"Versión de archivo de máscaras no soportada: {version}")
+        if table_offset == 0:
+            raise ValueError(f"Archivo de máscaras incompleto (no se cerró el writer): {path}")
+        self.width = int(width)
+        self.height = int(height)
+        self.fps = float(fps)
+        self._count = int(count)
+        end = table_offset + 8 * (self._count + 1)
+        self._offsets = self._mm[table_offset:end].view("<u8")
+        self._codecs = self._mm[end:end + self._count]
+
+    def __len__(self) -> int:
+        return self._count
+
+    def record(self, idx: int) -> tuple[int, np.ndarray]:
+        """(códec, bytes) del registro del frame 'idx', sin decodificar (vista del mmap)."""
+        idx = int(idx)
+        if idx < 0:
+            idx += self._count
+        if not 0 <= idx < self._count:
+            raise IndexError(f"Frame fuera de rango: {idx} (el store tiene {self._count})")
+        start, stop = int(self._offsets[idx]), int(self._offsets[idx + 1])
+        return int(self._codecs[idx]), self._mm[start:stop]
+
+    def __getitem__(self, idx: int) -> np.ndarray:
+        codec, payload = self.record(idx)
+        n = self.width * self.height
+        if codec == CODEC_PACKBITS:
+            flat = np.unpackbits(payload, count=n)
+            flat *= 255
+        elif codec == CODEC_RLE:
+            flat = _decode_rle(payload.view("<u4"), n)
+        else:
+            raise ValueError(f"Códec desconocido en el frame {idx}: {codec}")
+        return flat.reshape(self.height, self.width)
+
+    def __iter__(self) -> Iterator[np.ndarray]:
+        for i in range(self._count):
+            yield self[i]
+
+    def close(self) -> None:
+        # np.memmap se libera al soltar la última referencia
+        self._mm = self._offsets = self._codecs = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_mask_store(path: str) -> MaskStore:
+    """Abre un archivo de máscaras para lectura aleatoria."""
+    return MaskStore(path)
+
+
+def concat_mask_stores(part_paths: list[str], output_path: str, fps: Optional[float] = None) -> None:
+    """Une archivos de máscaras del mismo tamaño en 'output_path', en orden, sin decodificar."""
+    writer = None
+    try:
+        for p in part_paths:
+            part = MaskStore(p)
+            if writer is None:
+                writer = MaskStoreWriter(output_path, part.width, part.height,
+                                         fps=part.fps if fps is None else fps)
+            elif (part.width, part.height) != (writer.width, writer.height):
+                raise ValueError(f"El segmento {p} tiene otro tamaño de máscara.")
+            for i in range(len(part)):
+                codec, payload = part.record(i)
+                writer._write_record(payload, codec)
+            part.close()
+    finally:
+        if writer is not None:
+            writer.release()
@@ -0,0 +1,115 @@
+# modules/motion_gate.py
+from typing import Literal
+
+import cv2
+import numpy as np
+
+
+class MotionGate:
+    """
+    Detector barato de actividad para saltear los tiempos muertos.
+
+    Compara cada frame (reducido a 'scale' y en gris) con el anterior: si la
+    fracción de píxeles cuya diferencia supera 'diff_thresh' es menor que
+    'min_fraction', el frame se considera inactivo. Tras un frame activo se
+    mantienen activos 'hangover' frames más, para que la estela se vacíe.
+    La decisión es por frame: el primer frame con movimiento ya es activo.
+
+    TrailSegmenter(gate=...) usa la decisión: en los frames inactivos no hace
+    morfología, estela ni filtros, devuelve una máscara vacía (mask="empty")
+    o la última calculada (mask="hold"), y actualiza el modelo de fondo sólo
+    uno de cada 'update_every' frames inactivos, con la tasa de aprendizaje
+    equivalente.
+
+    'frames' y 'gated' cuentan las decisiones tomadas (gated_fraction).
+    """
+
+    def __init__(
+        self,
+        scale: float = 0.125,
+        diff_thresh: int = 15,
+        min_fraction: float = 0.0005,
+        hangover: int = 3,
+        update_every: int = 4,
+        mask: Literal["empty", "hold"] = "empty",
+    ):
+        if mask not in ("empty", "hold"):
+            raise ValueError(f"Máscara de frames inactivos no soportada: {mask}. Use 'empty' o 'hold'.")
+        self.scale = float(np.clip(scale, 0.01, 1.0))
+        self.diff_thresh = int(diff_thresh)
+        self.min_fraction = float(min_fraction)
+        self.hangover = max(0, int(hangover))
+        self.update_every = max(1, int(update_every))
+        self.mask = mask
+        self.frames = 0
+        self.gated = 0
+        self._prev = None
+        self._cur = None
+        self._diff = None
+        self._small = None
+        self._left = 0  # frames activos restantes por 'hangover'
+
+    @property
+    def gated_fraction(self) -> float:
+        return self.gated / self.frames if self.frames else 0.0
+
+    def reset(self) -> None:
+        """Olvida el frame anterior (el próximo frame es activo). No toca los contadores."""
+        self._prev = None
+        self._left = 0
+
+    def get_state(self) -> dict[str, np.ndarray]:
+        """Frame anterior (reducido) y hangover pendiente, para checkpoints (ver set_state)."""
+        state = dict(left=np.asarray(self._left))
+        if self._prev is not None:
+            state["prev"] = self._prev
+        return state
+
+    def set_state(self, state: dict[str, np.ndarray]) -> None:
+        """Restaura lo guardado con get_state(); sin 'prev' el próximo frame es activo."""
+        self._left = int(state.get("left", 0))
+        prev = state.get("prev")
+        if prev is None:
+            self._prev = None
+            return
+        self._prev = np.array(prev, dtype=np.uint8)
+        self._cur = np.empty_like(self._prev)
+        self._diff = np.empty_like(self._prev)
+        self._small = None
+
+    def active(self, frame: np.ndarray) -> bool:
+        h, w = frame.shape[:2]
+        size = (max(1, int(round(w * self.scale))), max(1, int(round(h * self.scale))))
+        if self._cur is None or self._cur.shape != (size[1], size[0]):
+            self._cur = np.empty((size[1], size[0]), dtype=np.uint8)
+            self._diff = np.empty_like(self._cur)
+            self._prev = None
+            self._small = None
+
+        if frame.ndim == 2:
+            cv2.resize(frame, size, dst=self._cur, interpolation=cv2.INTER_AREA)
+        else:
+            if self._small is None:
+                self._small = np.empty((size[1], size[0], frame.shape[2]), dtype=frame.dtype)
+            cv2.resize(frame, size, dst=self._small, interpolation=cv2.INTER_AREA)
+            cv2.cvtColor(self._small, cv2.COLOR_BGR2GRAY, dst=self._cur)
+
+        if self._prev is None:
+            moving = True
+            self._prev = np.empty_like(self._cur)
+        else:
+            cv2.absdiff(self._cur, self._prev, dst=self._diff)
+            cv2.threshold(self._diff, self.diff_thresh, 255, cv2.THRESH_BINARY, dst=self._diff)
+            moving = cv2.countNonZero(self._diff) >= self.min_fraction * self._diff.size
+        self._prev, self._cur = self._cur, self._prev
+
+        if moving:
+            self._left = self.hangover
+        elif self._left > 0:
+            self._left -= 1
+            moving = True
+
+        self.frames += 1
+        if not moving:
+            self.gated += 1
+        return moving
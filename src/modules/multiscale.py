@@ -0,0 +1,103 @@
+# modules/multiscale.py
+import math
+
+import cv2
+import numpy as np
+from typing import Optional
+
+
+def scaled_size(width: int, height: int, scale: float) -> tuple[int, int]:
+    """Tamaño (w, h) de trabajo para 'scale' (mínimo 1 px por lado)."""
+    return max(1, int(round(width * scale))), max(1, int(round(height * scale)))
+
+
+def scale_ksize(ksize: int, scale: float) -> int:
+    """Reescala un tamaño de kernel impar; 1 (desactivado) se mantiene."""
+    if ksize <= 1:
+        return 1
+    k = max(1, int(round(ksize * scale)))
+    return k if k % 2 == 1 else k + 1
+
+
+def scale_area(area: int, scale: float) -> int:
+    """Reescala un límite de área (px²); 0 (desactivado) se mantiene."""
+    if area <= 0:
+        return 0
+    return max(1, int(round(area * scale * scale)))
+
+
+def upscale_mask(mask: np.ndarray, size: tuple[int, int], out: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Lleva una máscara 0/255 a 'size' (w, h) con bordes bilineales re-binarizados.
+    'out' es un buffer opcional (h, w) uint8 donde escribir el resultado.
+    """
+    up = cv2.resize(mask, size, dst=out, interpolation=cv2.INTER_LINEAR)
+    _, up = cv2.threshold(up, 127, 255, cv2.THRESH_BINARY, dst=up)
+    return up
+
+
+def upsample_region(
+    small: np.ndarray,
+    box: tuple[int, int, int, int],
+    full_size: tuple[int, int],
+    interpolation: int = cv2.INTER_LINEAR,
+) -> np.ndarray:
+    """
+    Remuestrea a resolución completa sólo la caja 'box' = (x0, y0, x1, y1)
+    (coordenadas de tamaño completo) de la imagen reducida 'small'. Usa la misma
+    correspondencia de centros de píxel que cv2.resize sobre la imagen entera.
+    """
+    x0, y0, x1, y1 = box
+    rx = small.shape[1] / float(full_size[0])
+    ry = small.shape[0] / float(full_size[1])
+    m = np.array([[rx, 0.0, (x0 + 0.5) * rx - 0.5],
+                  [0.0, ry, (y0 + 0.5) * ry - 0.5]], dtype=np.float64)
+    return cv2.warpAffine(
+        small, m, (x1 - x0, y1 - y0),
+        flags=interpolation | cv2.WARP_INVERSE_MAP,
+        borderMode=cv2.BORDER_REPLICATE,
+    )
+
+
+def refine_boxes(
+    mask_small: np.ndarray,
+    blobs: Optional[np.ndarray],
+    scale: float,
+    full_size: tuple[int, int],
+) -> list[tuple[int, int, int, int]]:
+    """
+    Cajas (x0, y0, x1, y1) a resolución completa alrededor de cada blob detectado
+    en la máscara reducida, con un margen de un píxel reducido.
+    """
+    if blobs is None:
+        _, _, stats, _ = cv2.connectedComponentsWithStats(mask_small, connectivity=8)
+        rects = stats[1:, :4]
+    else:
+        rects = np.stack([blobs["x"], blobs["y"], blobs["w"], blobs["h"]], axis=1)
+
+    w_full, h_full = full_size
+    pad = int(math.ceil(1.0 / scale)) + 1
+    boxes = []
+    for x, y, w, h in rects:
+        x0 = max(0, int(math.floor(x / scale)) - pad)
+        y0 = max(0, int(math.floor(y / scale)) - pad)
+        x1 = min(w_full, int(math.ceil((x + w) / scale)) + pad)
+        y1 = min(h_full, int(math.ceil((y + h) / scale)) + pad)
+        if x1 > x0 and y1 > y0:
+            boxes.append((x0, y0, x1, y1))
+    return boxes
+
+
+def scale_blobs(blobs: Optional[np.ndarray], scale: float) -> Optional[np.ndarray]:
+    """Pasa una tabla de blobs (BLOB_DTYPE) medida a escala 'scale' a resolución completa."""
+    if blobs is not None and len(blobs):
+        inv = 1.0 / scale
+        blobs["x"] = np.floor(blobs["x"] * inv)
+        blobs["y"] = np.floor(blobs["y"] * inv)
+        blobs["w"] = np.ceil(blobs["w"] * inv)
+        blobs["h"] = np.ceil(blobs["h"] * inv)
+        blobs["area"] = np.round(blobs["area"] * inv * inv)
+        # centroides: centro de píxel a centro de píxel
+        blobs["cx"] = (blobs["cx"] + 0.5) * inv - 0.5
+        blobs["cy"] = (blobs["cy"] + 0.5) * inv - 0.5
+    return blobs
@@ -0,0 +1,290 @@
+# modules/parameter_sweep.py
+import csv
+import itertools
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Optional
+
+import cv2
+import numpy as np
+from tqdm import tqdm
+
+from .build_bg_subtractor import build_bg_subtractor
+from .apply_morph import apply_morph
+from .analyze_blobs import component_circularity
+from .filter_components import keep_components
+from .video_io import open_capture
+from .threaded_io import iter_frames
+from .frame_cache import FrameCache
+from .roi import build_roi
+from .multiscale import scaled_size, scale_ksize, scale_area
+from .process_video import LEARNING_RATE
+
+# Parámetros de TrailSegmenter que se pueden barrer, agrupados por etapa:
+# cada etapa sólo depende de sus parámetros y de los de las etapas previas
+SUBTRACTOR_KEYS = ("algo", "history", "varth", "shadows")
+FOREGROUND_KEYS = ("thresh", "kernel")
+TRAIL_KEYS = ("fade",)
+MASK_KEYS = ("bin_level",)
+FILTER_KEYS = ("min_size", "max_size", "min_circularity", "max_circularity")
+SWEEP_KEYS = SUBTRACTOR_KEYS + FOREGROUND_KEYS + TRAIL_KEYS + MASK_KEYS + FILTER_KEYS
+
+DEFAULTS = dict(
+    algo="mog2", history=500, varth=16.0, shadows=False,
+    thresh=25, kernel=3, fade=0.90, bin_level=32,
+    min_size=0, max_size=0, min_circularity=None, max_circularity=None,
+)
+
+# Métricas por frame de cada combinación (en píxeles de la escala de trabajo)
+METRICS_DTYPE = np.dtype([
+    ("fg_pixels", np.int64),  # suma de áreas de los componentes conservados
+    ("blobs", np.int32),      # componentes conservados
+    ("max_area", np.int32),   # área del mayor componente conservado (0 si no hay)
+])
+
+
+def expand_grid(grid: dict[str, list], base: Optional[dict[str, Any]] = None) -> list[dict[str, Any]]:
+    """
+    Producto cartesiano de 'grid' (parámetro → lista de valores) sobre 'base'
+    y DEFAULTS. Devuelve una lista de dicts con los 12 parámetros de SWEEP_KEYS.
+    """
+    unknown = set(grid) - set(SWEEP_KEYS)
+    if unknown:
+        raise ValueError(f"Parámetros no barribles: {sorted(unknown)}. Use {list(SWEEP_KEYS)}.")
+    fixed = dict(DEFAULTS)
+    fixed.update({k: v for k, v in (base or {}).items() if k in SWEEP_KEYS})
+    keys = [k for k in SWEEP_KEYS if k in grid]
+    combos = []
+    for values in itertools.product(*(list(grid[k]) for k in keys)):
+        combo = dict(fixed)
+        combo.update(zip(keys, values))
+        combos.append(combo)
+    return combos
+
+
+def _key(combo: dict, keys: tuple[str, ...]) -> tuple:
+    return tuple(combo[k] for k in keys)
+
+
+def _odd(k) -> int:
+    k = max(1, int(k))
+    return k if k % 2 == 1 else k + 1
+
+
+def _sweep_group(
+    input_path: str,
+    combos: list[dict],
+    ids: list[int],
+    frame_cache: Optional[FrameCache],
+    max_frames: Optional[int],
+    scale: float,
+    roi_polygon,
+    roi_mask_path: Optional[str],
+) -> list[tuple[int, np.ndarray]]:
+    """
+    Corre en un proceso todas las combinaciones 'ids' que comparten sustractor:
+    una sola pasada sobre el video con un árbol de etapas
+    sustractor → (thresh, kernel) → fade → bin_level → filtros.
+    """
+    first = combos[ids[0]]
+    cap, _, width, height, _ = open_capture(input_path, frame_cache)
+    roi = build_roi(width, height, polygon=roi_polygon, mask_path=roi_mask_path)
+    sub = build_bg_subtractor(
+        algo=first["algo"], history=first["history"],
+        var_threshold=first["varth"], detect_shadows=bool(first["shadows"]),
+    )
+
+    # Árbol de etapas: {(thresh, kernel): {fade: {bin_level: [ids]}}}
+    tree: dict = {}
+    for i in ids:
+        c = combos[i]
+        (tree.setdefault(_key(c, FOREGROUND_KEYS), {})
+             .setdefault(float(np.clip(c["fade"], 0.0, 1.0)), {})
+             .setdefault(int(np.clip(c["bin_level"], 0, 255)), [])
+             .append(i))
+    trails: dict = {}
+    rows: dict[int, list] = {i: [] for i in ids}
+    roi_mask = None
+
+    try:
+        for n, frame in enumerate(iter_frames(cap, reuse=True)):
+            if max_frames is not None and n >= max_frames:
+                break
+            if roi is not None:
+                frame = roi.crop(frame)
+            if scale < 1.0:
+                frame = cv2.resize(frame, scaled_size(frame.shape[1], frame.shape[0], scale),
+                                   interpolation=cv2.INTER_AREA)
+            shape = frame.shape[:2]
+            if n == 0:
+                tmp = np.empty(shape, dtype=np.float32)
+                level = np.empty(shape, dtype=np.float32)
+                mask = np.empty(shape, dtype=np.uint8)
+                if roi is not None and not roi.rectangular:
+                    roi_mask = cv2.resize(roi.mask, (shape[1], shape[0]), interpolation=cv2.INTER_NEAREST)
+
+            raw = sub.apply(frame, learningRate=LEARNING_RATE)
+
+            for (thresh, kernel), fades in tree.items():
+                fg = raw
+                if int(thresh) > 0:
+                    _, fg = cv2.threshold(raw, int(thresh), 255, cv2.THRESH_BINARY)
+                # Morfología opcional: kernel=1 => desactivada (como TrailSegmenter)
+                ksize = scale_ksize(_odd(kernel), scale)
+                if ksize > 1:
+                    fg = apply_morph(fg, ksize)
+                fg_norm = np.divide(fg, np.float32(255.0))
+
+                for fade, levels in fades.items():
+                    # Mismas operaciones (y redondeo) que TrailSegmenter en modo float
+                    trail = trails.get((thresh, kernel, fade))
+                    if trail is None:
+                        trail = trails[(thresh, kernel, fade)] = np.zeros(shape, dtype=np.float32)
+                    np.multiply(fg_norm, 1.0 - fade, out=tmp)
+                    np.multiply(trail, fade, out=trail)
+                    np.add(trail, tmp, out=trail)
+                    np.multiply(trail, 255.0, out=level)
+
+                    for bin_level, leaf in levels.items():
+                        cv2.compare(level, float(bin_level + 1), cv2.CMP_GE, dst=mask)
+                        if roi_mask is not None:
+                            cv2.bitwise_and(mask, roi_mask, dst=mask)
+                        _, labels, stats, centroids = cv2.connectedComponentsWithStats(mask, connectivity=8)
+                        areas = stats[:, cv2.CC_STAT_AREA]
+                        circ = np.full(len(stats), np.nan, dtype=np.float32)
+                        measured = np.zeros(len(stats), dtype=bool)
+
+                        for i in leaf:
+                            c = combos[i]
+                            keep = keep_components(
+                                stats, centroids,
+                                min_size=scale_area(int(c["min_size"] or 0), scale),
+                                max_size=scale_area(int(c["max_size"] or 0), scale),
+                            )
+                            lo, hi = c["min_circularity"], c["max_circularity"]
+                            if lo is not None or hi is not None:
+                                # La circularidad se mide una vez por componente y etapa
+                                for j in np.flatnonzero(keep & ~measured):
+                                    circ[j] = component_circularity(labels, stats, int(j))[0]
+                                    measured[j] = True
+                                with np.errstate(invalid="ignore"):
+                                    ok = ~np.isnan(circ)
+                                    if lo is not None:
+                                        ok &= circ >= lo
+                                    if hi is not None:
+                                        ok &= circ <= hi
+                                keep &= ok
+                            kept = areas[keep]
+                            rows[i].append((int(kept.sum()), len(kept), int(kept.max()) if len(kept) else 0))
+    finally:
+        cap.release()
+
+    return [(i, np.array(rows[i], dtype=METRICS_DTYPE)) for i in ids]
+
+
+def run_sweep(
+    input_path: str,
+    grid: dict[str, list],
+    base: Optional[dict[str, Any]] = None,
+    workers: Optional[int] = None,
+    max_frames: Optional[int] = None,
+    frame_cache: Optional[FrameCache] = None,
+    scale: float = 1.0,
+    roi_polygon: Optional[list[tuple[int, int]]] = None,
+    roi_mask_path: Optional[str] = None,
+) -> list[dict[str, Any]]:
+    """
+    Barrido de parámetros de process_video sin escribir videos.
+
+    - grid: parámetro → lista de valores (claves de SWEEP_KEYS).
+    - base: valores fijos para los parámetros que no se barren.
+    - workers: procesos (por defecto, uno por CPU); cada proceso corre un
+      grupo de combinaciones que comparten (algo, history, varth, shadows).
+    - max_frames: limita el barrido a los primeros frames del video.
+    - frame_cache: cache de frames (modules.frame_cache). Si no se indica y hay
+      más de un grupo, el video se decodifica una vez a un cache temporal.
+    - scale / roi_polygon / roi_mask_path: como en process_video (fijos).
+
+    Cada etapa se calcula una vez para todas las combinaciones que comparten
+    sus parámetros y los de las etapas previas: un sustractor por
+    (algo, history, varth, shadows), un umbral+morfología por (thresh, kernel),
+    una estela por fade, un etiquetado por bin_level y los filtros de área y
+    circularidad sobre la tabla de componentes. La máscara es la misma que la
+    de TrailSegmenter (trail_mode="float").
+
+    Retorna una lista, en el orden de expand_grid, de dicts con
+    'params' (la combinación) y 'metrics' (array METRICS_DTYPE por frame).
+    """
+    combos = expand_grid(grid, base)
+    scale = float(np.clip(scale, 0.01, 1.0))
+
+    groups: dict[tuple, list[int]] = {}
+    for i, c in enumerate(combos):
+        groups.setdefault(_key(c, SUBTRACTOR_KEYS), []).append(i)
+
+    workers = min(len(groups), workers or os.cpu_count() or 1)
+    tmp_dir = None
+    if frame_cache is None and len(groups) > 1:
+        tmp_dir = tempfile.mkdtemp(prefix=".sweep_cache_")
+        frame_cache = FrameCache(tmp_dir, max_bytes=shutil.disk_usage(tmp_dir).free // 2)
+    if frame_cache is not None:
+        frame_cache.open(input_path)  # decodificar una vez antes de repartir
+
+    args = (frame_cache, max_frames, scale, roi_polygon, roi_mask_path)
+    metrics: dict[int, np.ndarray] = {}
+    try:
+        with tqdm(total=len(combos), desc=f"Barrido ({len(groups)} sustractores)", unit="comb") as pbar:
+            if workers <= 1:
+                for ids in groups.values():
+                    for i, m in _sweep_group(input_path, combos, ids, *args):
+                        metrics[i] = m
+                    pbar.update(len(ids))
+            else:
+                with ProcessPoolExecutor(max_workers=workers) as pool:
+                    futures = [pool.submit(_sweep_group, input_path, combos, ids, *args)
+                               for ids in groups.values()]
+                    for fut in as_completed(futures):
+                        res = fut.result()
+                        for i, m in res:
+                            metrics[i] = m
+                        pbar.update(len(res))
+    finally:
+        if tmp_dir is not None:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    return [dict(params=c, metrics=metrics[i]) for i, c in enumerate(combos)]
+
+
+def summarize_sweep(results: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """Una fila por combinación: parámetros + promedios de las métricas por frame."""
+    rows = []
+    for r in results:
+        m = r["metrics"]
+        n = len(m)
+        row = dict(r["params"])
+        row.update(
+            frames=n,
+            mean_fg_pixels=float(m["fg_pixels"].mean()) if n else 0.0,
+            mean_blobs=float(m["blobs"].mean()) if n else 0.0,
+            frames_with_blobs=float(np.count_nonzero(m["blobs"]) / n) if n else 0.0,
+            mean_max_area=float(m["max_area"].mean()) if n else 0.0,
+        )
+        rows.append(row)
+    return rows
+
+
+def save_sweep(results: list[dict[str, Any]], csv_path: str, metrics_path: Optional[str] = None) -> None:
+    """
+    Guarda el resumen en CSV y, opcionalmente, las métricas por frame en un .npz
+    (una entrada 'combo_<i>' por combinación, en el orden del CSV).
+    """
+    rows = summarize_sweep(results)
+    if rows:
+        with open(csv_path, "w", newline="", encoding="utf-8") as fh:
+            writer = csv.DictWriter(fh, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+    if metrics_path:
+        np.savez_compressed(metrics_path, **{f"combo_{i}": r["metrics"] for i, r in enumerate(results)})
@@ -1,8 +1,253 @@
 # modules/process_by_threshold.py
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import islice
+
 import cv2
 import numpy as np
 from tqdm import tqdm
-from .colorize_overlay import overlay_by_mask
+from .video_io import open_capture, seek_frame, split_ranges
+from .video_writers import part_path, concat_outputs
+from .threaded_io import iter_frames
+from .frame_index import open_frame_index
+from .frame_cache import FrameCache, CachedCapture
+from .roi import Roi, build_roi
+from .buffer_pool import BufferPool
+from .stage_timer import StageTimer
+from .mask_store import concat_mask_stores
+from .stage_graph import Graph, Segment, Overlay, VideoSink, MaskStoreSink, run_graph
+from .multiscale import scaled_size, scale_ksize, upscale_mask, upsample_region, refine_boxes
+
+
+class ThresholdSegmenter:
+    """
+    Segmentación por resta de un background estático + Otsu.
+
+    No guarda estado entre frames: `apply(frame)` sólo depende del frame y del
+    fondo, por lo que cada frame puede procesarse de forma independiente.
+
+    Con scale<1 resta, Otsu y morfología corren sobre el frame reducido y la
+    máscara se amplía al tamaño original; con refine=True, dentro de la caja de
+    cada blob se repite la resta a resolución completa con el umbral de Otsu
+    obtenido a escala reducida.
+
+    Los intermedios (gris, diferencia, máscara...) se escriben en buffers
+    reservados en el primer frame y reutilizados en los siguientes.
+
+    Si se asigna 'timer' (modules.stage_timer), apply() marca las etapas
+    prepare, diff, otsu, morph y restore.
+    """
+
+    def __init__(
+        self,
+        background_image_path: str,
+        width: int,
+        height: int,
+        morph_kernel: int = 3,
+        blur_ksize: int = 3,
+        roi: Roi | None = None,  # limita el procesamiento al rectángulo de la ROI
+        scale: float = 1.0,      # escala de trabajo (0.5 = mitad de resolución)
+        refine: bool = False,    # refinar a resolución completa dentro de los blobs
+    ):
+        # Cargar background
+        bg = cv2.imread(background_image_path, cv2.IMREAD_COLOR)
+        if bg is None:
+            raise RuntimeError(f"No se pudo cargar el background: {background_image_path}")
+
+        bg = cv2.resize(bg, (width, height), interpolation=cv2.INTER_AREA)
+        self.bg_gray = cv2.cvtColor(bg, cv2.COLOR_BGR2GRAY)
+
+        self.roi = roi
+        roi_mask = None
+        if roi is not None:
+            self.bg_gray = np.ascontiguousarray(roi.crop(self.bg_gray))
+            if not roi.rectangular:
+                roi_mask = roi.mask
+
+        self.scale = float(np.clip(scale, 0.01, 1.0))
+        self.refine = bool(refine) and self.scale < 1.0
+        self.bg_full = self.bg_gray
+        if self.scale < 1.0:
+            h, w = self.bg_gray.shape[:2]
+            small = scaled_size(w, h, self.scale)
+            self.bg_gray = cv2.resize(self.bg_gray, small, interpolation=cv2.INTER_AREA)
+            if roi_mask is not None:
+                roi_mask = cv2.resize(roi_mask, small, interpolation=cv2.INTER_NEAREST)
+
+        # Otsu sólo con los píxeles del polígono (los ceros de afuera sesgan el umbral)
+        self._roi_pixels = None if roi_mask is None else np.flatnonzero(roi_mask)
+
+        # Normalizar parámetros
+        mk = max(1, int(morph_kernel))
+        if mk % 2 == 0:
+            mk += 1
+        bk = max(1, int(blur_ksize))
+        if bk % 2 == 0:
+            bk += 1
+        self.bk_full = bk
+        self.bk = scale_ksize(bk, self.scale)
+        mk = scale_ksize(mk, self.scale)
+        self.kernel = None if mk <= 1 else cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (mk, mk))
+        self._pool = BufferPool()  # buffers de trabajo, reservados en el primer frame
+        self.timer = None  # StageTimer opcional (medición por etapa)
+
+    def apply(self, frame: np.ndarray) -> np.ndarray:
+        """
+        Segmenta un frame. La máscara devuelta es un buffer interno que se
+        reescribe en la próxima llamada: copiarla si hay que conservarla.
+        """
+        pool = self._pool
+        timer = self.timer
+        if self.roi is not None:
+            crop = None
+            if not self.roi.rectangular:
+                crop = pool.get("crop", (self.roi.h, self.roi.w) + frame.shape[2:], frame.dtype, zero=True)
+            frame = self.roi.crop(frame, out=crop)
+
+        full = frame
+        full_size = (frame.shape[1], frame.shape[0])
+        if self.scale < 1.0:
+            size = scaled_size(*full_size, self.scale)
+            small = pool.get("small", (size[1], size[0]) + frame.shape[2:], frame.dtype)
+            frame = cv2.resize(frame, size, dst=small, interpolation=cv2.INTER_AREA)
+        if timer is not None:
+            timer.lap("prepare")
+
+        shape = frame.shape[:2]
+        if frame.ndim == 2:  # ya viene en gris (cache de frames en modo gris)
+            gray = frame
+        else:
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=pool.get("gray", shape))
+
+        # Resta absoluta con el fondo
+        diff = cv2.absdiff(gray, self.bg_gray, dst=pool.get("diff", shape))
+
+        # Suavizado opcional
+        if self.bk > 1:
+            diff = cv2.GaussianBlur(diff, (self.bk, self.bk), 0, dst=pool.get("blur", shape))
+        if timer is not None:
+            timer.lap("diff")
+
+        # Otsu
+        mask = pool.get("mask", shape)
+        if self._roi_pixels is None:
+            level, mask = cv2.threshold(diff, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU, dst=mask)
+        else:
+            n = len(self._roi_pixels)
+            inside = np.take(diff.reshape(-1), self._roi_pixels, out=pool.get("inside", (n,)))
+            level, _ = cv2.threshold(inside.reshape(-1, 1), 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU,
+                                     dst=pool.get("inside_bin", (n, 1)))
+            _, mask = cv2.threshold(diff, level, 255, cv2.THRESH_BINARY, dst=mask)
+        if timer is not None:
+            timer.lap("otsu")
+
+        # Morfología opcional
+        if self.kernel is not None:
+            tmp = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, self.kernel, dst=pool.get("morph", shape))
+            mask = cv2.morphologyEx(tmp, cv2.MORPH_OPEN, self.kernel, dst=mask)
+        if timer is not None:
+            timer.lap("morph")
+
+        if self.scale < 1.0:
+            if self.refine:
+                mask = self._refine(mask, full, level, full_size)
+            else:
+                mask = upscale_mask(mask, full_size, out=pool.get("up", (full_size[1], full_size[0])))
+
+        if self.roi is not None:
+            mask = self.roi.paste(self.roi.clip_mask(mask, out=pool.get("clip", mask.shape)),
+                                  out=pool.get("full", self.roi.full_shape, zero=True))
+        if timer is not None:
+            timer.lap("restore")
+
+        return mask
+
+    def _refine(self, mask_small: np.ndarray, full: np.ndarray, level: float, full_size: tuple[int, int]) -> np.ndarray:
+        # Resta a resolución completa sólo dentro de las cajas de los blobs, acotada
+        # a la vecindad de la máscara reducida
+        out = self._pool.get("refined", (full_size[1], full_size[0]))
+        out.fill(0)
+        near = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
+        for box in refine_boxes(mask_small, None, self.scale, full_size):
+            x0, y0, x1, y1 = box
+            gray = full[y0:y1, x0:x1]
+            if gray.ndim == 3:
+                gray = cv2.cvtColor(gray, cv2.COLOR_BGR2GRAY)
+            diff = cv2.absdiff(gray, self.bg_full[y0:y1, x0:x1])
+            if self.bk_full > 1:
+                diff = cv2.GaussianBlur(diff, (self.bk_full, self.bk_full), 0)
+            _, fine = cv2.threshold(diff, level, 255, cv2.THRESH_BINARY)
+            coarse = upsample_region(mask_small, box, full_size, cv2.INTER_NEAREST)
+            coarse = cv2.dilate(coarse, near, iterations=max(1, int(round(1.0 / self.scale))))
+            region = out[y0:y1, x0:x1]
+            cv2.bitwise_or(region, cv2.bitwise_and(fine, coarse), dst=region)
+        return out
+
+
+def _threshold_graph(
+    segmenter: ThresholdSegmenter,
+    output_path: str,
+    overlay_kw: dict | None,
+    store_path: str | None = None,
+    store_codec: str = "auto",
+    pipelined: bool = False,
+    queue_size: int = 8,
+    writer_kw: dict | None = None,
+) -> Graph:
+    """Grafo del método (modules.stage_graph): segmentación → [archivo de máscaras] → [overlay] → video."""
+    stages = [Segment(segmenter)]
+    if store_path:
+        stages.append(MaskStoreSink(store_path, codec=store_codec))
+    key = "mask"
+    if overlay_kw is not None:
+        stages.append(Overlay(**overlay_kw))
+        key = "overlay"
+    stages.append(VideoSink(output_path, key, pipelined=pipelined, queue_size=queue_size, writer_kw=writer_kw))
+    return Graph(stages)
+
+
+def _threshold_shard(
+    input_path: str,
+    background_image_path: str,
+    output_part: str,
+    start: int,
+    end: int | None,
+    segmenter_kw: dict,
+    overlay_kw: dict | None,
+    index=None,
+    store_path: str | None = None,
+    store_codec: str = "auto",
+    frame_cache=None,
+    timer_kw: dict | None = None,
+    writer_kw: dict | None = None,
+) -> tuple[int, dict | None]:
+    """
+    Procesa los frames [start, end) en un proceso aparte; devuelve cuántos escribió
+    y, con 'timer_kw', el estado de su StageTimer para combinarlo en el padre.
+    Con 'store_path' guarda además las máscaras en un archivo de modules.mask_store.
+    """
+    cap, fps, width, height, _ = open_capture(input_path, frame_cache)
+    try:
+        seek_frame(cap, start, index)
+        segmenter = ThresholdSegmenter(background_image_path, width, height, **segmenter_kw)
+        timer = StageTimer(**timer_kw) if timer_kw is not None else None
+        graph = _threshold_graph(segmenter, output_part, overlay_kw, store_path, store_codec, writer_kw=writer_kw)
+
+        frames = iter_frames(cap, reuse=graph.reuse_frames)
+        if end is not None:
+            frames = islice(frames, end - start)
+
+        graph.open(fps, width, height, timer)
+        try:
+            count = graph.run(frames, start)
+        finally:
+            graph.close()
+    finally:
+        cap.release()
+    return count, timer.state() if timer is not None else None
+
 
 def process_video_by_threshold(
     input_path: str,
@@ -16,96 +261,129 @@ def process_video_by_threshold(
     overlay_alpha: float = 0.6,
     overlay_soften: int = 3,
     overlay_colormap: int | None = None,  # p.ej., cv2.COLORMAP_TURBO
+    # —— Ejecución en pipeline: hilo lector → procesamiento → hilo escritor ——
+    pipelined: bool = False,
+    queue_size: int = 8,  # frames por cola (acota la memoria)
+    # —— Paralelismo por rangos de frames (procesos) ——
+    workers: int = 1,  # >1 reparte el video en 'workers' rangos contiguos
+    seek_index: bool = True,  # seek exacto con el índice sidecar (modules.frame_index)
+    # —— Región de interés (cancha): polígono [(x, y), ...] o imagen de máscara ——
+    roi_polygon: list[tuple[int, int]] | None = None,
+    roi_mask_path: str | None = None,
+    # —— Multi-resolución: segmentar a escala reducida y ampliar la máscara ——
+    scale: float = 1.0,    # 0.5 / 0.25 para 1080p/4K; kernels reescalados
+    refine: bool = False,  # refinar a resolución completa dentro de los blobs detectados
+    # —— Archivo de máscaras exacto y de acceso aleatorio (modules.mask_store) ——
+    mask_store_path: str | None = None,
+    mask_store_codec: str = "auto",  # "auto" | "packbits" | "rle"
+    # —— Cache de frames decodificados (modules.frame_cache) para pasadas repetidas ——
+    frame_cache: FrameCache | None = None,
+    # —— Medición por etapa (modules.stage_timer): decode, diff, otsu, ..., write ——
+    timer: StageTimer | None = None,
+    # —— Writer del video (modules.video_writers): backend, codec, threads, ... ——
+    writer_kw: dict | None = None,  # p.ej. dict(codec="ffv1", threads=4); por defecto según la extensión
 ):
     """
     Resta un background artificial (imagen) a cada frame del video y aplica Otsu
     para obtener una máscara binaria. Si write_overlay=True, guarda overlay
     coloreado; si no, guarda la máscara B/N como video.
+
+    Como cada frame es independiente, con workers>1 el video se divide en rangos
+    de frames que se procesan en un pool de procesos (cada uno salta directo a
+    su inicio) y los segmentos se unen en orden en 'output_path'.
+
+    Con roi_polygon o roi_mask_path, resta, Otsu y morfología corren sólo sobre
+    el rectángulo de la ROI (fuera del polígono en 0; el umbral de Otsu se
+    calcula con los píxeles de adentro) y la máscara se pega en tamaño completo.
+
+    Con mask_store_path, además del video se guardan las máscaras binarias sin
+    pérdida en un archivo con tabla de offsets por frame (modules.mask_store).
+
+    Con frame_cache los frames se leen del cache en disco en lugar del códec;
+    un cache en gris alcanza para este método (da lo mismo a escala 1).
+
+    El video se escribe con modules.video_writers.open_writer(**writer_kw):
+    mp4v por defecto, o según la extensión de output_path FFV1 (.mkv/.avi),
+    PNG ('salida/%06d.png'), .npy o .y4m sin pérdida, o nada (os.devnull).
+
+    Con 'timer' se mide cada etapa en cada frame y al final se llama a
+    timer.close(). Con workers>1 las estadísticas de los procesos se suman al
+    terminar (sin llamar a los hooks del timer para esos frames).
     """
-    cap = cv2.VideoCapture(input_path)
-    if not cap.isOpened():
-        raise RuntimeError(f"No se pudo abrir el video: {input_path}")
-
-    # Propiedades del video
-    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
-    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH) or 0)
-    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT) or 0)
-    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
-
-    if width <= 0 or height <= 0:
-        ok, tmp = cap.read()
-        if not ok:
-            cap.release()
-            raise RuntimeError("No se pudo leer el primer frame.")
-        height, width = tmp.shape[:2]
-        cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
-
-    # Cargar background
-    bg = cv2.imread(background_image_path, cv2.IMREAD_COLOR)
-    if bg is None:
+    cap, fps, width, height, total_frames = open_capture(input_path, frame_cache)
+
+    segmenter_kw = dict(morph_kernel=morph_kernel, blur_ksize=blur_ksize, scale=scale, refine=refine)
+    try:
+        segmenter_kw["roi"] = build_roi(width, height, polygon=roi_polygon, mask_path=roi_mask_path)
+        segmenter = ThresholdSegmenter(background_image_path, width, height, **segmenter_kw)
+    except (RuntimeError, ValueError):
         cap.release()
-        raise RuntimeError(f"No se pudo cargar el background: {background_image_path}")
-
-    bg = cv2.resize(bg, (width, height), interpolation=cv2.INTER_AREA)
-    bg_gray = cv2.cvtColor(bg, cv2.COLOR_BGR2GRAY)
-
-    # Normalizar parámetros
-    mk = max(1, int(morph_kernel))
-    if mk % 2 == 0:
-        mk += 1
-    bk = max(1, int(blur_ksize))
-    if bk % 2 == 0:
-        bk += 1
-
-    # Writer
-    fourcc = cv2.VideoWriter_fourcc(*"mp4v")
-    writer = cv2.VideoWriter(output_path, fourcc, float(fps), (width, height), True)
-
-    kernel = None if mk <= 1 else cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (mk, mk))
-
-    with tqdm(total=total_frames if total_frames > 0 else None,
-              desc="Procesando (bg-sub + Otsu)",
-              unit="frame") as pbar:
-
-        while True:
-            ok, frame = cap.read()
-            if not ok:
-                break
-
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-
-            # Resta absoluta con el fondo
-            diff = cv2.absdiff(gray, bg_gray)
-
-            # Suavizado opcional
-            if bk > 1:
-                diff = cv2.GaussianBlur(diff, (bk, bk), 0)
-
-            # Otsu
-            _, mask = cv2.threshold(diff, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
-
-            # Morfología opcional
-            if kernel is not None:
-                mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, kernel)
-                mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, kernel)
-
-            if write_overlay:
-                # Guardar overlay coloreado como en process_video
-                colored = overlay_by_mask(
-                    frame_bgr=frame,
-                    mask=mask,
-                    color=overlay_color,
-                    alpha=overlay_alpha,
-                    soften=overlay_soften,
-                    colormap=overlay_colormap,
-                )
-                writer.write(colored)
-            else:
-                # Guardar máscara B/N
-                mask_bgr = cv2.cvtColor(mask, cv2.COLOR_GRAY2BGR)
-                writer.write(mask_bgr)
+        raise
+
+    overlay_kw = None
+    if write_overlay:
+        overlay_kw = dict(
+            color=overlay_color,
+            alpha=overlay_alpha,
+            soften=overlay_soften,
+            colormap=overlay_colormap,
+        )
 
-            pbar.update(1)
+    # Sin total de frames conocido no se puede repartir: se cae al modo serie
+    if workers > 1 and total_frames > 1:
+        cached = isinstance(cap, CachedCapture)
+        cap.release()
+        # El índice se arma (o carga) una vez aquí y viaja a cada proceso;
+        # con el cache de frames no hace falta (el seek ya es exacto)
+        index = open_frame_index(input_path) if seek_index and not cached else None
+        if index is not None:
+            total_frames = len(index)
+        ranges = split_ranges(total_frames, workers)
+        # Junto a la salida; su carpeta (p.ej. la de un patrón PNG) puede no existir aún
+        out_dir = os.path.dirname(os.path.abspath(output_path)) if output_path != os.devnull else None
+        if out_dir:
+            os.makedirs(out_dir, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(prefix=".shards_", dir=out_dir)
+        part_paths = [
+            part_path(output_path, os.path.join(tmp_dir, f"part_{i:04d}"))
+            for i in range(len(ranges))
+        ]
+        store_paths = [
+            os.path.join(tmp_dir, f"part_{i:04d}.masks") if mask_store_path else None
+            for i in range(len(ranges))
+        ]
+        timer_kw = None
+        if timer is not None:
+            timer_kw = dict(buckets_ms=timer.buckets_ms, keep_samples=timer.keep_samples)
+        try:
+            with ProcessPoolExecutor(max_workers=len(ranges)) as pool, \
+                 tqdm(total=total_frames,
+                      desc=f"Procesando (bg-sub + Otsu, {len(ranges)} procesos)",
+                      unit="frame") as pbar:
+                futures = [
+                    pool.submit(_threshold_shard, input_path, background_image_path,
+                                part, start, end, segmenter_kw, overlay_kw, index,
+                                store, mask_store_codec, frame_cache, timer_kw, writer_kw)
+                    for part, store, (start, end) in zip(part_paths, store_paths, ranges)
+                ]
+                for fut in as_completed(futures):
+                    pbar.update(fut.result()[0])
+
+            concat_outputs(part_paths, output_path, fps, width, height, writer_kw)
+            if mask_store_path:
+                concat_mask_stores(store_paths, mask_store_path)
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        if timer is not None:
+            for fut in futures:
+                timer.merge(fut.result()[1])
+            timer.close()
+        return
 
-    cap.release()
-    writer.release()
+    graph = _threshold_graph(segmenter, output_path, overlay_kw, mask_store_path, mask_store_codec,
+                             pipelined, queue_size, writer_kw)
+    try:
+        run_graph(cap, graph, fps, width, height, total_frames, queue_size if pipelined else 0, timer,
+                  desc="Procesando (bg-sub + Otsu)")
+    finally:
+        cap.release()
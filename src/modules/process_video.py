@@ -1,24 +1,499 @@
 # modules/process_video.py
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import islice
+
 import cv2
 import numpy as np
-from pathlib import Path
 from typing import Literal, Optional, Tuple
 from tqdm import tqdm
 
 from .build_bg_subtractor import build_bg_subtractor
 from .apply_morph import apply_morph
-from .filter_components import filter_components
-from .colorize_overlay import overlay_by_mask
-from .filter_roundness import filter_by_roundness  # ya creado por vos
+from .analyze_blobs import analyze_blobs
+from .video_io import open_capture, seek_frame, split_ranges
+from .video_writers import part_path, concat_outputs
+from .threaded_io import iter_frames
+from .frame_index import open_frame_index
+from .frame_cache import FrameCache, CachedCapture
+from .mask_store import concat_mask_stores
+from .blob_table import concat_blob_tables
+from .roi import Roi, build_roi
+from .buffer_pool import BufferPool
+from .stage_timer import StageTimer
+from .temporal_stride import StridedSegmenter, strided_rate
+from .motion_gate import MotionGate
+from .checkpoint import Checkpointer
+from .stage_graph import Graph, Overlay, VideoSink, MaskStoreSink, BlobTableSink
+from .multiscale import scaled_size, scale_ksize, scale_area, upscale_mask, scale_blobs
 
 # Variables globales (las setea main.py)
 MIN_SIZE = 0   # <=1 desactiva mínimo
 MAX_SIZE = 0   # <=0 desactiva máximo
 
+LEARNING_RATE = 0.005  # tasa de aprendizaje del sustractor por frame
+
+
+class TrailSegmenter:
+    """
+    Segmentación por sustracción de fondo (MOG2/KNN) con estela exponencial.
+
+    Mantiene el estado entre frames (modelo de fondo y 'trail'), así que una
+    misma instancia debe recibir los frames en orden. `apply(frame)` devuelve
+    la máscara binaria 0/255 (uint8) ya filtrada por área y circularidad.
+
+    Tras cada apply(), `blobs` tiene la tabla de componentes conservados
+    (modules.analyze_blobs.BLOB_DTYPE), o None si no hubo que etiquetar la
+    máscara (sin filtros y measure_blobs=False).
+
+    Con scale<1 la sustracción, la estela, la morfología y los filtros corren
+    sobre el frame reducido (kernel y límites de área reescalados) y la máscara
+    se lleva de vuelta al tamaño original con bordes bilineales.
+
+    Todos los intermedios viven en buffers reservados en el primer frame y se
+    reescriben en los siguientes (sin reservas de memoria por frame). Con
+    trail_mode="fixed" la estela es uint16 en punto fijo (trail*255*256) y se
+    actualiza con cv2.addWeighted: la máscara coincide con la de float salvo en
+    píxeles cuya estela queda a menos de ~0.5/(1-fade) unidades de 1/256 de
+    nivel de gris del umbral bin_level.
+
+    Con stride=N, apply() recibe sólo uno de cada N frames (ver
+    modules.temporal_stride): la tasa de aprendizaje del sustractor pasa a
+    1-(1-0.005)^N y el fade a fade^N, así el modelo y la estela decaen por
+    frame de video igual que con stride=1.
+
+    Con gate (modules.motion_gate.MotionGate), los frames sin movimiento no
+    pasan por morfología, estela ni filtros: devuelven una máscara vacía o la
+    última (según gate.mask), el modelo de fondo se actualiza uno de cada
+    gate.update_every de esos frames y la estela se desvanece (fade^k) al
+    volver la actividad. 'gated' indica si el último apply() fue salteado.
+
+    Si se asigna 'timer' (modules.stage_timer.StageTimer o una vista scoped),
+    apply() marca las etapas prepare, subtract, morph, trail, filter y restore.
+    """
+
+    def __init__(
+        self,
+        algo: Literal["mog2","knn"] = "mog2",
+        history: int = 500,
+        varth: float = 16.0,
+        shadows: bool = False,
+        thresh: int = 25,
+        kernel: int = 3,
+        fade: float = 0.90,
+        bin_level: int = 32,
+        min_size: int = 0,
+        max_size: int = 0,
+        min_circularity: Optional[float] = None,
+        max_circularity: Optional[float] = None,
+        measure_blobs: bool = False,  # tabla de blobs (con circularidad) en cada frame
+        roi: Optional[Roi] = None,    # limita todo el procesamiento al rectángulo de la ROI
+        scale: float = 1.0,           # escala de trabajo (0.5 = mitad de resolución)
+        trail_mode: Literal["float","fixed"] = "float",  # "fixed": estela uint16 en punto fijo
+        stride: int = 1,              # apply() recibe uno de cada 'stride' frames
+        gate: Optional[MotionGate] = None,  # saltea los frames sin movimiento
+    ):
+        if trail_mode not in ("float", "fixed"):
+            raise ValueError(f"trail_mode no soportado: {trail_mode}. Use 'float' o 'fixed'.")
+        self.trail_mode = trail_mode
+        self.scale = float(np.clip(scale, 0.01, 1.0))
+
+        ksize = max(1, int(kernel))
+        if ksize % 2 == 0:
+            ksize += 1
+        self.ksize = scale_ksize(ksize, self.scale)
+        self.stride = max(1, int(stride))
+        self.fade = float(np.clip(fade, 0.0, 1.0)) ** self.stride
+        self.learning_rate = strided_rate(LEARNING_RATE, self.stride)
+        self.thresh = max(0, int(thresh))
+        self.bin_level = int(np.clip(bin_level, 0, 255))
+        self.min_size = scale_area(int(min_size or 0), self.scale)
+        self.max_size = scale_area(int(max_size or 0), self.scale)
+        self.min_circularity = min_circularity
+        self.max_circularity = max_circularity
+        self.measure_blobs = bool(measure_blobs)
+        self.blobs = None
+        self.roi = roi
+        self._roi_mask = None  # máscara de la ROI a la escala de trabajo
+
+        self.sub = build_bg_subtractor(
+            algo=algo, history=history, var_threshold=varth, detect_shadows=bool(shadows)
+        )
+        self.trail = None  # se crea con el tamaño del primer frame
+        self._pool = BufferPool()  # buffers de trabajo, reservados en el primer frame
+        self.timer = None  # StageTimer opcional (medición por etapa)
+
+        self.gate = gate
+        self.gated = False
+        self._idle = 0       # frames salteados desde el último apply completo
+        self._last = None    # última máscara completa (para gate.mask="hold")
+        if gate is not None:
+            gate.reset()
+
+    def apply(self, frame: np.ndarray) -> np.ndarray:
+        """
+        Segmenta el frame siguiente. La máscara devuelta es un buffer interno
+        que se reescribe en la próxima llamada: copiarla si hay que conservarla.
+        """
+        pool = self._pool
+        timer = self.timer
+        out_shape = frame.shape[:2] if self.roi is None else self.roi.full_shape
+        if self.roi is not None:
+            crop = None
+            if not self.roi.rectangular:
+                crop = pool.get("crop", (self.roi.h, self.roi.w) + frame.shape[2:], frame.dtype, zero=True)
+            frame = self.roi.crop(frame, out=crop)
+
+        full_size = (frame.shape[1], frame.shape[0])
+        if self.scale < 1.0:
+            size = scaled_size(*full_size, self.scale)
+            small = pool.get("small", (size[1], size[0]) + frame.shape[2:], frame.dtype)
+            frame = cv2.resize(frame, size, dst=small, interpolation=cv2.INTER_AREA)
+        if timer is not None:
+            timer.lap("prepare")
+
+        if self.gate is not None and not self.gate.active(frame):
+            return self._apply_gated(frame, out_shape)
+        self.gated = False
+
+        shape = frame.shape[:2]
+        if self.trail is None:
+            self._init_trail(shape)
+
+        fg = self.sub.apply(frame, fgmask=pool.get("fg", shape), learningRate=self.learning_rate)
+        if timer is not None:
+            timer.lap("subtract")
+        if self._idle:
+            # La estela se desvaneció durante los frames salteados (sin foreground)
+            np.multiply(self.trail, self.fade ** self._idle, out=self.trail, casting="unsafe")
+            self._idle = 0
+
+        if self.thresh > 0:
+            cv2.threshold(fg, self.thresh, 255, cv2.THRESH_BINARY, dst=fg)
+
+        # Morfología opcional: kernel=1 => desactivada
+        if self.ksize > 1:
+            fg = apply_morph(fg, self.ksize, dst=fg, tmp=pool.get("morph", shape))
+        if timer is not None:
+            timer.lap("morph")
+
+        # Estela con desvanecimiento + umbral final para binarizar la estela acumulada
+        mask_bin = pool.get("mask", shape)
+        if self.trail_mode == "fixed":
+            self._update_trail_fixed(fg, mask_bin)
+        else:
+            self._update_trail_float(fg, mask_bin)
+
+        if self._roi_mask is not None:
+            cv2.bitwise_and(mask_bin, self._roi_mask, dst=mask_bin)
+        if timer is not None:
+            timer.lap("trail")
+
+        # Filtrado por área y circularidad en una sola pasada de etiquetado
+        filter_area = self.min_size > 1 or self.max_size > 0
+        filter_round = (self.min_circularity is not None) or (self.max_circularity is not None)
+        if filter_area or filter_round or self.measure_blobs:
+            mask_bin, self.blobs = analyze_blobs(
+                mask_bin,
+                min_size=self.min_size,
+                max_size=self.max_size,
+                min_circularity=self.min_circularity,
+                max_circularity=self.max_circularity,
+                measure_circularity=self.measure_blobs,
+                out=mask_bin,
+                labels=pool.get("labels", shape, np.int32),
+            )
+        else:
+            self.blobs = None
+        if timer is not None:
+            timer.lap("filter")
+
+        if self.scale < 1.0:
+            up = pool.get("up", (full_size[1], full_size[0]))
+            mask_bin = upscale_mask(mask_bin, full_size, out=up)
+            scale_blobs(self.blobs, self.scale)
+            if self.roi is not None:
+                mask_bin = self.roi.clip_mask(mask_bin, out=up)
+
+        if self.roi is not None:
+            self.roi.offset_blobs(self.blobs)
+            mask_bin = self.roi.paste(mask_bin, out=pool.get("full", self.roi.full_shape, zero=True))
+        if timer is not None:
+            timer.lap("restore")
+
+        self._last = mask_bin
+        return mask_bin
+
+    def _init_trail(self, shape: tuple[int, int]) -> None:
+        # Estela en cero y máscara de la ROI a la escala de trabajo (siempre juntas)
+        dtype = np.uint16 if self.trail_mode == "fixed" else np.float32
+        self.trail = np.zeros(shape, dtype=dtype)
+        if self.roi is not None and not self.roi.rectangular:
+            self._roi_mask = cv2.resize(
+                self.roi.mask, (shape[1], shape[0]), interpolation=cv2.INTER_NEAREST
+            )
+
+    def restore_trail(self, trail: Optional[np.ndarray], idle: int = 0) -> None:
+        """
+        Restaura una estela guardada (p.ej. de un checkpoint) e inicializa la
+        máscara de la ROI a su escala. 'idle' son los frames salteados por el
+        gate cuyo desvanecimiento todavía no se aplicó. trail=None vuelve al
+        estado inicial (la estela se crea en el próximo frame activo).
+        """
+        self._idle = int(idle)
+        if trail is None:
+            self.trail = None
+            self._roi_mask = None
+            return
+        self._init_trail(trail.shape[:2])
+        np.copyto(self.trail, trail, casting="same_kind")
+
+    def get_state(self) -> dict[str, np.ndarray]:
+        """
+        Estado entre frames salvo el modelo de fondo (que OpenCV no serializa):
+        estela, frames salteados, última máscara (gate.mask="hold") y estado
+        del gate. Arrays con nombre, listos para np.savez; ver set_state().
+        """
+        state = dict(idle=np.asarray(self._idle))
+        if self.trail is not None:
+            state["trail"] = self.trail
+        if self.gate is not None:
+            if self.gate.mask == "hold" and self._last is not None:
+                state["last"] = self._last
+            state.update({f"gate_{k}": v for k, v in self.gate.get_state().items()})
+        return state
+
+    def set_state(self, state: dict[str, np.ndarray]) -> None:
+        """Restaura lo guardado con get_state() (el modelo de fondo queda como está)."""
+        self.restore_trail(state.get("trail"), int(state.get("idle", 0)))
+        if self.gate is not None:
+            self._last = np.array(state["last"]) if "last" in state else None
+            self.gate.set_state({k[5:]: v for k, v in state.items() if k.startswith("gate_")})
+
+    def _apply_gated(self, frame: np.ndarray, out_shape: tuple[int, int]) -> np.ndarray:
+        # Frame sin movimiento: sólo una actualización espaciada del modelo de fondo
+        gate = self.gate
+        self.gated = True
+        self._idle += 1
+        if self._idle % gate.update_every == 0:
+            rate = strided_rate(self.learning_rate, gate.update_every)
+            self.sub.apply(frame, fgmask=self._pool.get("fg", frame.shape[:2]), learningRate=rate)
+        if self.timer is not None:
+            self.timer.lap("gated")
+        if gate.mask == "hold" and self._last is not None:
+            return self._last
+        self.blobs = self.blobs[:0] if self.blobs is not None else None
+        return self._pool.get("gated", out_shape, zero=True)
+
+    def _update_trail_float(self, fg: np.ndarray, mask_bin: np.ndarray) -> None:
+        tmp = self._pool.get("trail_tmp", fg.shape, np.float32)
+        update_trail_float(self.trail, fg, self.fade, self.bin_level, mask_bin, tmp)
+
+    def _update_trail_fixed(self, fg: np.ndarray, mask_bin: np.ndarray) -> None:
+        fg16 = self._pool.get("fg16", fg.shape, np.uint16)
+        update_trail_fixed(self.trail, fg, self.fade, self.bin_level, mask_bin, fg16)
+
+
+def update_trail_float(trail: np.ndarray, fg: np.ndarray, fade: float, bin_level: int,
+                       mask_bin: np.ndarray, tmp: np.ndarray) -> None:
+    """
+    Estela float32 in-place (trail = trail*fade + fg/255*(1-fade)) y su
+    binarización en 'mask_bin'. 'tmp' es un buffer float32 del tamaño de fg.
+    """
+    # Operación por operación en float32 (mismo redondeo que la versión con temporales)
+    np.divide(fg, np.float32(255.0), out=tmp)
+    np.multiply(tmp, 1.0 - fade, out=tmp)
+    np.multiply(trail, fade, out=trail)
+    np.add(trail, tmp, out=trail)
+    # uint8(clip(trail*255)) > bin_level  <=>  trail*255 >= bin_level+1
+    np.multiply(trail, 255.0, out=tmp)
+    cv2.compare(tmp, float(bin_level + 1), cv2.CMP_GE, dst=mask_bin)
+
+
+def update_trail_fixed(trail: np.ndarray, fg: np.ndarray, fade: float, bin_level: int,
+                       mask_bin: np.ndarray, fg16: np.ndarray) -> None:
+    """Estela uint16 en punto fijo (trail*255*256, fg=255 → 65280); 'fg16' es un buffer uint16."""
+    np.multiply(fg, np.uint16(256), out=fg16)
+    cv2.addWeighted(trail, fade, fg16, 1.0 - fade, 0.0, dst=trail)
+    cv2.compare(trail, float((bin_level + 1) * 256), cv2.CMP_GE, dst=mask_bin)
+
+
+def _segment_frames(segmenter, frames, start_index: int = 0, stride: int = 1,
+                    stride_mode: str = "hold", timer=None):
+    """
+    (índice, frame, máscara, es_clave) de cada frame de 'frames', en orden.
+    Con stride>1 sólo los frames clave pasan por el segmentador y el resto
+    recibe una máscara interpolada (modules.temporal_stride.StridedSegmenter).
+    """
+    if stride <= 1:
+        for idx, frame in enumerate(frames, start_index):
+            if timer is not None:
+                timer.lap("decode")
+            yield idx, frame, segmenter.apply(frame), True
+            if timer is not None:
+                timer.end_frame()
+        return
+    strided = StridedSegmenter(segmenter, stride, stride_mode, start_index=start_index)
+    strided.timer = timer
+    for frame in frames:
+        if timer is not None:
+            timer.lap("decode")
+        yield from strided.push(frame)
+        if timer is not None:
+            timer.end_frame()
+    yield from strided.flush()
+
+
+def _trail_shard(
+    input_path: str,
+    part_path: Optional[str],
+    start: int,
+    end: Optional[int],
+    warmup_frames: int,
+    check_frames: int,
+    segmenter_kw: dict,
+    overlay_kw: Optional[dict],
+    index=None,
+    store_path: Optional[str] = None,
+    store_codec: str = "auto",
+    frame_cache=None,
+    timer_kw: Optional[dict] = None,
+    detections_path: Optional[str] = None,
+    detections_format: str = "auto",
+    stride: int = 1,
+    stride_mode: str = "hold",
+    writer_kw: Optional[dict] = None,
+):
+    """
+    Procesa los frames [start, end) en un proceso aparte.
+
+    Arranca 'warmup_frames' antes de 'start' para que el modelo de fondo y la
+    estela converjan (esa salida se descarta). Además devuelve, empaquetadas con
+    np.packbits, las máscaras de los primeros 'check_frames' frames del rango
+    (head) y de los 'check_frames' siguientes a 'end' (tail), para medir la
+    divergencia en cada frontera contra el shard vecino.
+
+    Con 'store_path' las máscaras del rango se guardan además en un archivo de
+    máscaras (modules.mask_store) que luego se une con los de los otros shards.
+    Con 'detections_path' los blobs del rango van a una tabla (modules.blob_table);
+    con part_path=None no se codifica video. Con stride>1 los frames clave son
+    los de índice absoluto múltiplo de 'stride', igual que en modo serie.
+
+    Con 'timer_kw' mide las etapas con un StageTimer propio (incluye los frames
+    de precalentamiento) y devuelve su estado para combinarlo en el proceso padre.
+    """
+    cap, fps, width, height, _ = open_capture(input_path, frame_cache)
+    try:
+        warm_start = max(0, start - int(warmup_frames))
+        seek_frame(cap, warm_start, index)
+        segmenter = TrailSegmenter(**segmenter_kw)
+        timer = segmenter.timer = StageTimer(**timer_kw) if timer_kw is not None else None
+        paths = dict(video=part_path, masks=store_path, detections=detections_path)
+        graph = _output_graph({k: p for k, p in paths.items() if p}, overlay_kw, False, 0,
+                              store_codec, detections_format, writer_kw)
+        graph.open(fps, width, height, timer)
+
+        head, tail = [], []
+        count = 0
+        keys = gated = 0  # frames clave del rango y cuántos salteó el gate
+        stop = None if end is None else end + (check_frames if check_frames > 0 else 0)
+        frames = iter_frames(cap, reuse=True)
+        if stop is not None:
+            # Con stride>1 se lee hasta la clave siguiente para interpolar los últimos
+            read_end = stop if stride <= 1 else -(-stop // stride) * stride + 1
+            frames = islice(frames, read_end - warm_start)
+        if timer is not None:
+            timer.reset_mark()
+        for idx, frame, mask_bin, key in _segment_frames(segmenter, frames, warm_start, stride, stride_mode, timer):
+            if stop is not None and idx >= stop:
+                continue
+            if idx >= start and (end is None or idx < end):
+                graph.process(dict(index=idx, frame=frame, mask=mask_bin, blobs=segmenter.blobs, key=key))
+                count += 1
+                if key:
+                    keys += 1
+                    gated += segmenter.gated
+                if start > 0 and len(head) < check_frames:
+                    head.append(np.packbits(mask_bin > 0))
+            elif end is not None and idx >= end:
+                tail.append(np.packbits(mask_bin > 0))
+        graph.close()
+    finally:
+        cap.release()
+    return count, head, tail, timer.state() if timer is not None else None, (keys, gated)
+
+
+def _report_gate(gated: int, frames: int) -> None:
+    pct = 100.0 * gated / frames if frames else 0.0
+    tqdm.write(f"Gate de movimiento: {gated}/{frames} frames salteados ({pct:.1f} %)")
+
+
+def _segment_paths(final_paths: dict, stem: str) -> dict:
+    """Rutas de un segmento (checkpoint) de cada salida: 'stem' más su extensión."""
+    paths = {}
+    for kind, p in final_paths.items():
+        if kind == "masks":
+            paths[kind] = f"{stem}.masks"
+        elif kind == "video":
+            paths[kind] = part_path(p, stem)
+        else:
+            paths[kind] = stem + os.path.splitext(p)[1]
+    return paths
+
+
+def _output_graph(paths: dict, overlay_kw: Optional[dict], pipelined: bool, queue_size: int,
+                  store_codec: str, table_format: str, writer_kw: Optional[dict] = None) -> Graph:
+    """
+    Grafo de salidas de un segmento (modules.stage_graph) sobre las claves que
+    entrega _segment_frames: archivo de máscaras, tabla de detecciones y video
+    (overlay coloreado si hay 'overlay_kw', máscara B/N si no).
+    """
+    stages = []
+    if "masks" in paths:
+        stages.append(MaskStoreSink(paths["masks"], codec=store_codec))
+    if "detections" in paths:
+        stages.append(BlobTableSink(paths["detections"], fmt=table_format))
+    if "video" in paths:
+        key = "mask"
+        if overlay_kw is not None:
+            stages.append(Overlay(**overlay_kw))
+            key = "overlay"
+        stages.append(VideoSink(paths["video"], key, pipelined=pipelined, queue_size=queue_size,
+                                writer_kw=writer_kw))
+    return Graph(stages, sources=("index", "frame", "mask", "blobs", "key"))
+
+
+def _boundary_divergence(ranges, results) -> dict:
+    """Compara, en cada frontera, la cola del shard previo con la cabeza del siguiente."""
+    boundaries = []
+    for k in range(1, len(results)):
+        tail = results[k - 1][2]
+        head = results[k][1]
+        n = min(len(tail), len(head))
+        if n == 0:
+            continue
+        a = np.unpackbits(np.stack(tail[:n]), axis=1).astype(bool)
+        b = np.unpackbits(np.stack(head[:n]), axis=1).astype(bool)
+        diff = np.count_nonzero(a ^ b)
+        union = np.count_nonzero(a | b)
+        boundaries.append(dict(
+            frame=ranges[k][0],
+            frames=n,
+            pixel_mismatch=float(diff / a.size),
+            iou=float(np.count_nonzero(a & b) / union) if union else 1.0,
+        ))
+    return dict(
+        boundaries=boundaries,
+        max_pixel_mismatch=max((b["pixel_mismatch"] for b in boundaries), default=0.0),
+        min_iou=min((b["iou"] for b in boundaries), default=1.0),
+    )
+
 
 def process_video(
     input_path: str,
-    output_path: str,
+    output_path: Optional[str],
     algo: Literal["mog2","knn"] = "mog2",
     history: int = 500,
     varth: float = 16.0,
@@ -36,104 +511,292 @@ def process_video(
     # —— Filtrado por redondez/circularidad ——
     min_circularity: Optional[float] = None,  # e.g. 0.7
     max_circularity: Optional[float] = None,  # e.g. 1.0
+    # —— Ejecución en pipeline: hilo lector → procesamiento → hilo escritor ——
+    pipelined: bool = False,
+    queue_size: int = 8,  # frames por cola (acota la memoria)
+    # —— Paralelismo por rangos de frames con precalentamiento ——
+    workers: int = 1,            # >1 reparte el video en rangos (procesos)
+    warmup_frames: int = 500,    # frames previos al rango para converger el modelo
+    divergence_frames: int = 30, # frames comparados en cada frontera (0 desactiva)
+    seek_index: bool = True,     # seek exacto con el índice sidecar (modules.frame_index)
+    # —— Región de interés (cancha): polígono [(x, y), ...] o imagen de máscara ——
+    roi_polygon: Optional[list[tuple[int, int]]] = None,
+    roi_mask_path: Optional[str] = None,
+    # —— Multi-resolución: segmentar a escala reducida y ampliar la máscara ——
+    scale: float = 1.0,  # 0.5 / 0.25 para 1080p/4K; MIN_SIZE/MAX_SIZE y kernel se reescalan
+    # —— Estela: "float" (float32) o "fixed" (uint16 en punto fijo, ver TrailSegmenter) ——
+    trail_mode: Literal["float","fixed"] = "float",
+    # —— Archivo de máscaras exacto y de acceso aleatorio (modules.mask_store) ——
+    mask_store_path: Optional[str] = None,
+    mask_store_codec: Literal["auto","packbits","rle"] = "auto",
+    # —— Cache de frames decodificados (modules.frame_cache) para pasadas repetidas ——
+    frame_cache: Optional[FrameCache] = None,
+    # —— Medición por etapa (modules.stage_timer): decode, subtract, morph, ..., write ——
+    timer: Optional[StageTimer] = None,
+    # —— Modo detección: tabla de blobs por frame (modules.blob_table) ——
+    detections_path: Optional[str] = None,  # .csv o .parquet (requiere pyarrow)
+    detections_format: Literal["auto","csv","parquet"] = "auto",
+    # —— Paso temporal: segmentar uno de cada 'stride' frames e interpolar el resto ——
+    stride: int = 1,
+    stride_mode: Literal["hold","or","shift"] = "hold",
+    # —— Gate de movimiento: saltear los tiempos muertos (modules.motion_gate) ——
+    motion_gate: Optional[MotionGate] = None,
+    # —— Writer del video (modules.video_writers): backend, codec, threads, ... ——
+    writer_kw: Optional[dict] = None,  # p.ej. dict(codec="ffv1", threads=4); por defecto según la extensión
+    # —— Checkpoints para reanudar corridas largas (modules.checkpoint) ——
+    checkpoint_dir: Optional[str] = None,
+    checkpoint_every: int = 9000,  # frames por checkpoint (~5 min a 30 fps)
 ):
-    in_path = Path(input_path)
-    if not in_path.exists():
-        raise FileNotFoundError(f"No se encuentra el archivo de entrada: {in_path}")
-
-    cap = cv2.VideoCapture(str(in_path))
-    if not cap.isOpened():
-        raise RuntimeError("No se pudo abrir el video de entrada.")
-
-    fps = cap.get(cv2.CAP_PROP_FPS)
-    fps = float(fps if fps and fps > 0 else 30.0)
-
-    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH) or 0)
-    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT) or 0)
-    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)  # para tqdm
-
-    if width <= 0 or height <= 0:
-        ok, tmp = cap.read()
-        if not ok:
-            cap.release()
-            raise RuntimeError("No se pudo leer el primer frame.")
-        height, width = tmp.shape[:2]
-        cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
-
-    ksize = max(1, int(kernel))
-    if ksize % 2 == 0:
-        ksize += 1
-    fade = float(np.clip(fade, 0.0, 1.0))
-    thresh = max(0, int(thresh))
-    bin_level = int(np.clip(bin_level, 0, 255))
-
-    fourcc = cv2.VideoWriter_fourcc(*"mp4v")
-    writer = cv2.VideoWriter(output_path, fourcc, fps, (width, height), True)
-
-    sub = build_bg_subtractor(
-        algo=algo, history=history, var_threshold=varth, detect_shadows=bool(shadows)
+    """
+    Segmenta el video con MOG2/KNN + estela y escribe la máscara B/N (o el
+    overlay coloreado si write_overlay=True) en 'output_path'.
+
+    Con workers>1 cada proceso arranca 'warmup_frames' antes de su rango, pasa
+    esos frames por el sustractor y la estela y descarta su salida. El resultado
+    difiere del modo serie sólo cerca del inicio de cada rango; para medirlo, se
+    compara la máscara de los primeros 'divergence_frames' de cada rango con la
+    que produce el shard anterior (que ya venía convergido) y se devuelve un dict
+    con la divergencia por frontera (pixel_mismatch, iou). En modo serie devuelve None.
+
+    Con roi_polygon o roi_mask_path, la sustracción de fondo, la morfología y los
+    filtros corren sólo sobre el rectángulo que contiene la ROI (fuera del
+    polígono en 0) y la máscara se vuelve a pegar en un frame de tamaño completo.
+
+    Con mask_store_path, además del video se guardan las máscaras binarias sin
+    pérdida (1 bit por píxel o RLE) en un archivo con tabla de offsets por frame,
+    legible con modules.mask_store.open_mask_store.
+
+    Con frame_cache los frames se leen del cache en disco en lugar del códec
+    (la primera corrida sobre el video lo decodifica y lo guarda).
+
+    Con detections_path, los blobs que pasan los filtros de área y circularidad
+    se escriben por lotes en una tabla (frame, time, cx, cy, x, y, w, h, area,
+    circularity). Con output_path=None no se codifica ningún video (modo sólo
+    detección); hace falta al menos una salida.
+
+    Con stride=N>1 la sustracción, la estela y los filtros corren sólo en los
+    frames de índice múltiplo de N (con tasa de aprendizaje y fade ajustados,
+    ver TrailSegmenter); los frames intermedios se escriben igual, con la
+    máscara clave anterior ("hold"), la unión de las claves vecinas ("or") o
+    los blobs desplazados entre ambas ("shift"), ver modules.temporal_stride.
+    La tabla de detecciones sólo tiene filas de los frames clave.
+
+    Con motion_gate, los frames sin movimiento (absdiff reducido contra el
+    frame anterior) se saltean: máscara vacía o retenida y actualización
+    espaciada del modelo de fondo (ver TrailSegmenter y MotionGate). Al final
+    se informa la fracción de frames salteados; motion_gate.frames/gated
+    quedan con los totales de la corrida (también con workers>1).
+
+    El video se escribe con modules.video_writers.open_writer(**writer_kw),
+    elegido por la extensión de output_path si no se indica 'backend': mp4v
+    (OpenCV) por defecto; .mkv/.avi en FFV1 y 'salida/%06d.png', .npy o .y4m
+    guardan la máscara en 1 canal y sin pérdida; os.devnull no escribe nada
+    (para medir sin el costo de codificar).
+
+    Con checkpoint_dir (sólo modo serie), cada 'checkpoint_every' frames se
+    cierra un segmento de las salidas y se guarda el estado del segmentador
+    (estela, gate) y el próximo frame (modules.checkpoint.Checkpointer). Si la corrida se corta, volver a
+    llamar con los mismos argumentos retoma desde el último checkpoint: el
+    modelo de fondo se reconstruye pasando los 'warmup_frames' previos (salida
+    descartada), se restaura ese estado y sólo se procesan los frames que
+    faltan. Al terminar se unen los segmentos en las salidas y se borra la
+    carpeta. Como en los shards, tras reanudar la máscara difiere levemente
+    de la de una corrida sin cortes; con stride>1 requiere stride_mode="hold".
+
+    Con 'timer' se mide cada etapa en cada frame y al final se llama a
+    timer.close() (que escribe el JSON / textfile de Prometheus configurados).
+    Con workers>1 cada proceso mide por su cuenta y las estadísticas se suman
+    al terminar; los hooks del timer no se llaman para esos frames.
+    """
+    if not output_path and not detections_path and not mask_store_path:
+        raise ValueError("Indique al menos 'output_path', 'detections_path' o 'mask_store_path'.")
+    if checkpoint_dir and workers > 1:
+        raise ValueError("Los checkpoints sólo están soportados en modo serie (workers=1).")
+    if checkpoint_dir and stride > 1 and stride_mode != "hold":
+        # "or"/"shift" retienen frames hasta la clave siguiente: no hay un corte limpio
+        raise ValueError("Con checkpoints y stride>1 use stride_mode='hold'.")
+    cap, fps, width, height, total_frames = open_capture(input_path, frame_cache)
+
+    segmenter_kw = dict(
+        algo=algo, history=history, varth=varth, shadows=shadows,
+        thresh=thresh, kernel=kernel, fade=fade, bin_level=bin_level,
+        min_size=MIN_SIZE, max_size=MAX_SIZE,
+        min_circularity=min_circularity, max_circularity=max_circularity,
+        roi=build_roi(width, height, polygon=roi_polygon, mask_path=roi_mask_path),
+        scale=scale,
+        trail_mode=trail_mode,
+        measure_blobs=bool(detections_path),
+        stride=stride,
+        gate=motion_gate,
     )
-    trail = np.zeros((height, width), dtype=np.float32)
+
+    overlay_kw = None
+    if write_overlay and output_path:
+        overlay_kw = dict(
+            color=overlay_color,
+            alpha=overlay_alpha,
+            soften=overlay_soften,
+            colormap=overlay_colormap,
+        )
+
+    # Sin total de frames conocido no se puede repartir: se cae al modo serie
+    if workers > 1 and total_frames > 1:
+        cached = isinstance(cap, CachedCapture)
+        cap.release()
+        # El índice se arma (o carga) una vez aquí y viaja a cada proceso;
+        # con el cache de frames no hace falta (el seek ya es exacto)
+        index = open_frame_index(input_path) if seek_index and not cached else None
+        if index is not None:
+            total_frames = len(index)
+        ranges = split_ranges(total_frames, workers)
+        # Junto a la primera salida real; su carpeta (p.ej. la de un patrón PNG) puede no existir aún
+        first = next((p for p in (output_path, detections_path, mask_store_path) if p and p != os.devnull), None)
+        out_dir = os.path.dirname(os.path.abspath(first)) if first else None
+        if out_dir:
+            os.makedirs(out_dir, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(prefix=".shards_", dir=out_dir)
+        part_paths = [
+            part_path(output_path, os.path.join(tmp_dir, f"part_{i:04d}")) if output_path else None
+            for i in range(len(ranges))
+        ]
+        store_paths = [
+            os.path.join(tmp_dir, f"part_{i:04d}.masks") if mask_store_path else None
+            for i in range(len(ranges))
+        ]
+        table_paths = [
+            os.path.join(tmp_dir, f"part_{i:04d}{os.path.splitext(detections_path)[1]}") if detections_path else None
+            for i in range(len(ranges))
+        ]
+        timer_kw = None
+        if timer is not None:
+            timer_kw = dict(buckets_ms=timer.buckets_ms, keep_samples=timer.keep_samples)
+        try:
+            with ProcessPoolExecutor(max_workers=len(ranges)) as pool, \
+                 tqdm(total=total_frames,
+                      desc=f"Procesando video ({len(ranges)} procesos)",
+                      unit="frame") as pbar:
+                futures = [
+                    pool.submit(_trail_shard, input_path, part, start, end,
+                                warmup_frames, divergence_frames, segmenter_kw, overlay_kw, index,
+                                store, mask_store_codec, frame_cache, timer_kw, table, detections_format,
+                                stride, stride_mode, writer_kw)
+                    for part, store, table, (start, end) in zip(part_paths, store_paths, table_paths, ranges)
+                ]
+                for fut in as_completed(futures):
+                    pbar.update(fut.result()[0])
+                results = [fut.result() for fut in futures]
+
+            if output_path:
+                concat_outputs(part_paths, output_path, fps, width, height, writer_kw)
+            if mask_store_path:
+                concat_mask_stores(store_paths, mask_store_path)
+            if detections_path:
+                concat_blob_tables(table_paths, detections_path, fps, fmt=detections_format)
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+        if timer is not None:
+            for r in results:
+                timer.merge(r[3])
+            timer.close()
+        report = _boundary_divergence(ranges, results)
+        tqdm.write(
+            f"Divergencia vs. serie en fronteras: "
+            f"max pixel_mismatch={report['max_pixel_mismatch']:.5f}, min IoU={report['min_iou']:.4f}"
+        )
+        if motion_gate is not None:
+            keys = sum(r[4][0] for r in results)
+            gated = sum(r[4][1] for r in results)
+            motion_gate.frames += keys
+            motion_gate.gated += gated
+            report.update(gated_frames=gated, gated_fraction=gated / keys if keys else 0.0)
+            _report_gate(gated, keys)
+        return report
+
+    final_paths = dict(video=output_path, masks=mask_store_path, detections=detections_path)
+    final_paths = {kind: p for kind, p in final_paths.items() if p}
+    ckpt = None
+    start_frame = 0
+    if checkpoint_dir:
+        gate_kw = None
+        if motion_gate is not None:
+            gate_kw = {k: getattr(motion_gate, k)
+                       for k in ("scale", "diff_thresh", "min_fraction", "hangover", "update_every", "mask")}
+        ckpt = Checkpointer(checkpoint_dir, input_path, dict(
+            segmenter={k: v for k, v in segmenter_kw.items() if k not in ("roi", "gate")},
+            roi=(roi_polygon, roi_mask_path), overlay=overlay_kw, gate=gate_kw, stride_mode=stride_mode,
+            writer=writer_kw,
+            outputs=final_paths, mask_store_codec=mask_store_codec, detections_format=detections_format,
+        ))
+        state = ckpt.load()
+        start_frame = ckpt.next_frame
+        # Un checkpoint cada 'every' frames, siempre justo antes de un frame clave
+        every = -(-max(1, int(checkpoint_every)) // stride) * stride
+
+    segmenter = TrailSegmenter(**segmenter_kw)
+    if start_frame > 0:
+        # Warm replay: el modelo de fondo se reconstruye con los frames previos
+        # al checkpoint (salida descartada); la estela, la ROI y el gate se restauran tal cual
+        warm_start = max(0, start_frame - int(warmup_frames)) // stride * stride
+        index = None
+        if seek_index and not isinstance(cap, CachedCapture):
+            index = open_frame_index(input_path)
+        seek_frame(cap, warm_start, index)
+        frames = islice(iter_frames(cap, reuse=True), start_frame - warm_start)
+        for _ in tqdm(_segment_frames(segmenter, frames, warm_start, stride, stride_mode),
+                      total=start_frame - warm_start, desc="Reconstruyendo el modelo de fondo",
+                      unit="frame", leave=False):
+            pass
+        segmenter.set_state(state)
+    segmenter.timer = timer
+    if motion_gate is not None:
+        gate_frames, gate_gated = motion_gate.frames, motion_gate.gated
+
+    paths = _segment_paths(final_paths, ckpt.segment_stem()) if ckpt is not None else final_paths
+    graph = _output_graph(paths, overlay_kw, pipelined, queue_size, mask_store_codec, detections_format, writer_kw)
+    graph.open(fps, width, height, timer)
+    written = 0  # frames escritos en el segmento actual
 
     # Progreso
     with tqdm(total=total_frames if total_frames > 0 else None,
+              initial=start_frame,
               desc="Procesando video",
               unit="frame") as pbar:
 
-        while True:
-            ok, frame = cap.read()
-            if not ok:
-                break
-
-            fg = sub.apply(frame, learningRate=0.005)
-
-            if thresh > 0:
-                _, fg = cv2.threshold(fg, thresh, 255, cv2.THRESH_BINARY)
-
-            # Morfología opcional: kernel=1 => desactivada
-            if ksize > 1:
-                fg = apply_morph(fg, ksize)
-
-            fg_norm = fg.astype(np.float32) / 255.0
-
-            # Estela con desvanecimiento
-            trail = trail * fade + fg_norm * (1.0 - fade)
-
-            # Umbral final para binarizar la estela acumulada
-            trail_8u = np.uint8(np.clip(trail * 255.0, 0, 255))
-            _, mask_bin = cv2.threshold(trail_8u, bin_level, 255, cv2.THRESH_BINARY)
-
-            # Filtrado por área mínima y/o máxima (si está activado)
-            if (MIN_SIZE and MIN_SIZE > 1) or (MAX_SIZE and MAX_SIZE > 0):
-                mask_bin = filter_components(
-                    mask_bin, min_size=int(MIN_SIZE), max_size=int(MAX_SIZE)
-                )
-
-            # Filtrado por circularidad (roundness)
-            if (min_circularity is not None) or (max_circularity is not None):
-                mask_bin = filter_by_roundness(
-                    mask=mask_bin,
-                    min_circularity=min_circularity,
-                    max_circularity=max_circularity,
-                )
-
-            if write_overlay:
-                # Escribir frame original coloreado según máscara
-                colored = overlay_by_mask(
-                    frame_bgr=frame,
-                    mask=mask_bin,
-                    color=overlay_color,
-                    alpha=overlay_alpha,
-                    soften=overlay_soften,
-                    colormap=overlay_colormap,
-                )
-                writer.write(colored)
-            else:
-                # Escribir máscara en B/N
-                mask_bgr = cv2.cvtColor(mask_bin, cv2.COLOR_GRAY2BGR)
-                writer.write(mask_bgr)
-
+        if timer is not None:
+            timer.reset_mark()
+        # Un ThreadedWriter retiene cada frame hasta codificarlo: ahí no se reutilizan
+        frames = iter_frames(cap, queue_size if pipelined else 0, reuse=graph.reuse_frames)
+        for idx, frame, mask_bin, key in _segment_frames(segmenter, frames, start_frame, stride, stride_mode, timer):
+            graph.process(dict(index=idx, frame=frame, mask=mask_bin, blobs=segmenter.blobs, key=key))
             pbar.update(1)
+            written += 1
+            if ckpt is not None and (idx + 1) % every == 0:
+                # Cierra el segmento y registra el checkpoint antes de abrir el siguiente
+                graph.close()
+                ckpt.save(idx + 1, segmenter.get_state(), paths)
+                paths = _segment_paths(final_paths, ckpt.segment_stem())
+                graph = _output_graph(paths, overlay_kw, pipelined, queue_size, mask_store_codec,
+                                      detections_format, writer_kw)
+                graph.open(fps, width, height, timer)
+                written = 0
+                if timer is not None:
+                    timer.lap("checkpoint")
 
     cap.release()
-    writer.release()
+    graph.close()
+    if ckpt is not None:
+        # Une los segmentos terminados (más el último, si tiene frames) en las salidas finales
+        for kind, final in final_paths.items():
+            parts = ckpt.parts(kind) + ([paths[kind]] if written else [])
+            if kind == "video":
+                concat_outputs(parts, final, fps, width, height, writer_kw)
+            elif kind == "masks":
+                concat_mask_stores(parts, final)
+            else:
+                concat_blob_tables(parts, final, fps, fmt=detections_format)
+        ckpt.finish()
+    if timer is not None:
+        timer.close()
+    if motion_gate is not None:
+        _report_gate(motion_gate.gated - gate_gated, motion_gate.frames - gate_frames)
@@ -0,0 +1,98 @@
+# modules/roi.py
+import cv2
+import numpy as np
+from typing import Optional, Sequence
+
+
+class Roi:
+    """
+    Región de interés (p.ej. la cancha) dentro de un frame de tamaño fijo.
+
+    El procesamiento se limita al rectángulo que contiene la región: crop()
+    recorta el frame y pone en cero lo que queda fuera del polígono, y paste()
+    devuelve una máscara del tamaño completo con el resultado en su lugar.
+    """
+
+    def __init__(self, mask_full: np.ndarray):
+        mask_full = np.where(mask_full > 0, 255, 0).astype(np.uint8)
+        if not mask_full.any():
+            raise ValueError("La ROI está vacía.")
+        self.full_shape = mask_full.shape[:2]
+        self.x, self.y, self.w, self.h = cv2.boundingRect(mask_full)
+        self.mask = np.ascontiguousarray(mask_full[self.y:self.y + self.h, self.x:self.x + self.w])
+        # Si la ROI es un rectángulo no hace falta enmascarar dentro del recorte
+        self.rectangular = bool(self.mask.all())
+
+    @property
+    def coverage(self) -> float:
+        """Fracción del frame que ocupa el rectángulo procesado."""
+        return (self.w * self.h) / float(self.full_shape[0] * self.full_shape[1])
+
+    def crop(self, image: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Recorta al rectángulo de la ROI; fuera del polígono queda en 0.
+        'out' (opcional, reutilizable entre frames) debe haberse creado en cero:
+        sólo se escriben los píxeles de adentro del polígono.
+        """
+        sub = image[self.y:self.y + self.h, self.x:self.x + self.w]
+        if self.rectangular:
+            return sub
+        return cv2.bitwise_and(sub, sub, mask=self.mask, dst=out)
+
+    def clip_mask(self, mask_crop: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """Anula lo que la morfología/estela haya derramado fuera del polígono."""
+        if self.rectangular:
+            return mask_crop
+        return cv2.bitwise_and(mask_crop, self.mask, dst=out)
+
+    def paste(self, mask_crop: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Máscara de tamaño completo con 'mask_crop' en el rectángulo de la ROI.
+        'out' (opcional, reutilizable entre frames) debe haberse creado en cero:
+        sólo se escribe el rectángulo.
+        """
+        if out is None:
+            out = np.zeros(self.full_shape, dtype=mask_crop.dtype)
+        out[self.y:self.y + self.h, self.x:self.x + self.w] = mask_crop
+        return out
+
+    def offset_blobs(self, blobs: Optional[np.ndarray]) -> Optional[np.ndarray]:
+        """Pasa una tabla de blobs (BLOB_DTYPE) a coordenadas del frame completo."""
+        if blobs is not None:
+            blobs["x"] += self.x
+            blobs["y"] += self.y
+            blobs["cx"] += self.x
+            blobs["cy"] += self.y
+        return blobs
+
+
+def build_roi(
+    width: int,
+    height: int,
+    polygon: Optional[Sequence[tuple[int, int]]] = None,
+    mask_path: Optional[str] = None,
+) -> Optional[Roi]:
+    """
+    Construye la ROI a partir de un polígono (puntos (x, y) en píxeles del frame)
+    o de una imagen de máscara (blanco = dentro; se reescala al tamaño del video).
+    Devuelve None si no se indicó ninguna.
+    """
+    if polygon is None and mask_path is None:
+        return None
+    if polygon is not None and mask_path is not None:
+        raise ValueError("Indique la ROI como polígono o como imagen de máscara, no ambas.")
+
+    if polygon is not None:
+        pts = np.asarray(polygon, dtype=np.int32).reshape(-1, 1, 2)
+        if len(pts) < 3:
+            raise ValueError("El polígono de la ROI necesita al menos 3 puntos.")
+        mask = np.zeros((height, width), dtype=np.uint8)
+        cv2.fillPoly(mask, [pts], 255)
+    else:
+        mask = cv2.imread(mask_path, cv2.IMREAD_GRAYSCALE)
+        if mask is None:
+            raise RuntimeError(f"No se pudo cargar la máscara de ROI: {mask_path}")
+        if mask.shape[:2] != (height, width):
+            mask = cv2.resize(mask, (width, height), interpolation=cv2.INTER_NEAREST)
+
+    return Roi(mask)
@@ -0,0 +1,121 @@
+# modules/run_pipeline.py
+from typing import Any
+
+from . import process_video as pv
+from .process_by_threshold import ThresholdSegmenter
+from .video_io import open_capture
+from .roi import build_roi
+from .frame_cache import FrameCache
+from .stage_timer import StageTimer
+from .stage_graph import Graph, Segment, Overlay, VideoSink, MaskStoreSink, run_graph
+
+
+def _build_segmenter(branch: dict[str, Any], width: int, height: int):
+    kind = str(branch.get("kind", "")).strip().lower()
+    params = dict(branch.get("params", {}))
+    params["roi"] = build_roi(
+        width, height,
+        polygon=params.pop("roi_polygon", None),
+        mask_path=params.pop("roi_mask_path", None),
+    )
+
+    if kind == "trail":
+        # Mismos parámetros que process_video; el área cae a los globales de pv
+        params.setdefault("min_size", pv.MIN_SIZE)
+        params.setdefault("max_size", pv.MAX_SIZE)
+        return pv.TrailSegmenter(**params)
+    elif kind == "threshold":
+        # Mismos parámetros que process_video_by_threshold
+        return ThresholdSegmenter(width=width, height=height, **params)
+    else:
+        raise ValueError(f"Tipo de rama no soportado: {kind}. Use 'trail' o 'threshold'.")
+
+
+def run_pipeline(
+    input_path: str,
+    branches: list[dict[str, Any]],
+    pipelined: bool = False,
+    queue_size: int = 8,
+    frame_cache: FrameCache | None = None,
+    timer: StageTimer | None = None,
+    progress: bool = True,
+    concurrent: bool = False,
+) -> int:
+    """
+    Decodifica el video una sola vez y reparte cada frame entre varias ramas.
+
+    Cada rama es un dict con:
+      - kind: "trail" (MOG2/KNN + estela, como process_video) o
+              "threshold" (fondo artificial + Otsu, como process_video_by_threshold).
+      - params: parámetros de segmentación de la rama (sin input/output);
+                admite roi_polygon / roi_mask_path como las funciones de proceso.
+      - mask_path: video de máscara B/N (opcional).
+      - overlay_path: video con overlay coloreado (opcional).
+      - overlay: kwargs de OverlayCompositor (color, alpha, soften, colormap).
+      - mask_writer / overlay_writer: kwargs de modules.video_writers.open_writer
+        (backend, codec, threads, ...) para cada video; p.ej. la máscara en
+        FFV1 de 1 canal con mask_path="..._mask.mkv".
+      - mask_store_path: archivo de máscaras exacto (modules.mask_store, opcional).
+      - mask_store_codec: "auto" | "packbits" | "rle" (por defecto "auto").
+      - name: nombre de la rama en las métricas de 'timer' (por defecto su posición).
+
+    La máscara de cada rama se calcula una vez por frame y se comparte entre
+    sus salidas de máscara y de overlay.
+
+    Con pipelined=True la decodificación y cada writer corren en su propio hilo,
+    conectados por colas de 'queue_size' frames.
+
+    Las ramas son ramas independientes de un grafo de etapas (modules.stage_graph):
+    con concurrent=True cada frame se procesa en todas las ramas a la vez, en
+    un pool de hilos (el timer mide entonces "branches" en lugar de las etapas).
+
+    Con frame_cache (modules.frame_cache) los frames salen del cache en disco.
+
+    Con 'timer' (modules.stage_timer) se mide "decode" una vez por frame y las
+    etapas de cada rama con el prefijo "<name>." (p.ej. "0.subtract", "0.write");
+    al final se llama a timer.close().
+
+    Con progress=False no se muestra la barra de tqdm (p.ej. en un lote).
+
+    Devuelve la cantidad de frames procesados.
+    """
+    cap, fps, width, height, total_frames = open_capture(input_path, frame_cache)
+
+    stages = []
+    try:
+        for i, branch in enumerate(branches):
+            mask_path = branch.get("mask_path")
+            overlay_path = branch.get("overlay_path")
+            store_path = branch.get("mask_store_path")
+            if not mask_path and not overlay_path and not store_path:
+                raise ValueError("Cada rama necesita al menos 'mask_path', 'overlay_path' o 'mask_store_path'.")
+            # Claves propias de la rama: la máscara se calcula una vez y la comparten sus salidas
+            name = branch.get("name", i)
+            mask_key = f"{name}.mask"
+            branch_stages = [Segment(_build_segmenter(branch, width, height), mask=mask_key, blobs=f"{name}.blobs")]
+            if store_path:
+                branch_stages.append(MaskStoreSink(store_path, codec=branch.get("mask_store_codec", "auto"),
+                                                   key=mask_key))
+            if mask_path:
+                branch_stages.append(VideoSink(mask_path, mask_key, pipelined=pipelined, queue_size=queue_size,
+                                               writer_kw=branch.get("mask_writer")))
+            if overlay_path:
+                branch_stages.append(Overlay(mask=mask_key, dst=f"{name}.overlay", **branch.get("overlay", {})))
+                branch_stages.append(VideoSink(overlay_path, f"{name}.overlay",
+                                               pipelined=pipelined, queue_size=queue_size,
+                                               writer_kw=branch.get("overlay_writer")))
+            if timer is not None:
+                branch_timer = timer.scoped(f"{name}.")
+                for stage in branch_stages:
+                    stage.timer = branch_timer
+            stages.extend(branch_stages)
+        graph = Graph(stages, concurrent=concurrent)
+    except Exception:
+        cap.release()
+        raise
+
+    try:
+        return run_graph(cap, graph, fps, width, height, total_frames, queue_size if pipelined else 0, timer,
+                         progress=progress, desc="Procesando pipeline")
+    finally:
+        cap.release()
@@ -0,0 +1,215 @@
+# modules/segment_stages.py
+from typing import Literal, Optional
+
+import cv2
+import numpy as np
+
+from .stage_graph import Stage
+from .build_bg_subtractor import build_bg_subtractor
+from .apply_morph import apply_morph
+from .analyze_blobs import analyze_blobs
+from .process_video import LEARNING_RATE, update_trail_float, update_trail_fixed
+
+# Etapas elementales de segmentación para armar grafos propios (modules.stage_graph).
+# Encadenadas como BackgroundSubtract → Threshold → Morph → Trail → AreaFilter →
+# RoundnessFilter dan la misma máscara que TrailSegmenter a escala 1 y sin ROI;
+# TrailSegmenter (vía Segment) es su forma fusionada, con ROI, escala y gate.
+
+
+class BackgroundSubtract(Stage):
+    """Sustracción de fondo MOG2/KNN: frame → máscara de foreground (0/255, o 127 en sombras)."""
+
+    name = "subtract"
+
+    def __init__(
+        self,
+        algo: Literal["mog2","knn"] = "mog2",
+        history: int = 500,
+        varth: float = 16.0,
+        shadows: bool = False,
+        learning_rate: float = LEARNING_RATE,
+        frame: str = "frame",
+        dst: str = "fg",
+    ):
+        super().__init__()
+        self.sub = build_bg_subtractor(algo=algo, history=history, var_threshold=varth, detect_shadows=bool(shadows))
+        self.learning_rate = float(learning_rate)
+        self.inputs = (frame,)
+        self.outputs = (dst,)
+
+    def process(self, data):
+        frame = data[self.inputs[0]]
+        fg = self.pool.get(f"{self.outputs[0]}", frame.shape[:2])
+        data[self.outputs[0]] = self.sub.apply(frame, fgmask=fg, learningRate=self.learning_rate)
+
+
+class Threshold(Stage):
+    """
+    Binariza 'src' en 'dst' (in-place si son la misma clave): pixel > level → 255.
+    Con level=None el umbral se elige con Otsu (como ThresholdSegmenter);
+    con level<=0 la etapa no hace nada.
+    """
+
+    name = "threshold"
+
+    def __init__(self, level: Optional[int] = 25, src: str = "fg", dst: Optional[str] = None):
+        super().__init__()
+        self.level = level
+        self.inputs = (src,)
+        self.outputs = (dst or src,)
+
+    def process(self, data):
+        img = data[self.inputs[0]]
+        key = self.outputs[0]
+        out = img if key == self.inputs[0] else self.pool.get(key, img.shape[:2])
+        if self.level is None:
+            _, out = cv2.threshold(img, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU, dst=out)
+        elif self.level > 0:
+            _, out = cv2.threshold(img, int(self.level), 255, cv2.THRESH_BINARY, dst=out)
+        elif out is not img:
+            np.copyto(out, img)
+        data[key] = out
+
+
+class Morph(Stage):
+    """Apertura + cierre con kernel elíptico de 'ksize' (modules.apply_morph); ksize<=1 desactiva."""
+
+    name = "morph"
+
+    def __init__(self, ksize: int = 3, src: str = "fg", dst: Optional[str] = None):
+        super().__init__()
+        k = max(1, int(ksize))
+        self.ksize = k + 1 if k % 2 == 0 else k
+        self.inputs = (src,)
+        self.outputs = (dst or src,)
+
+    def process(self, data):
+        img = data[self.inputs[0]]
+        key = self.outputs[0]
+        if self.ksize <= 1:
+            data[key] = img
+            return
+        dst = img if key == self.inputs[0] else self.pool.get(key, img.shape[:2])
+        data[key] = apply_morph(img, self.ksize, dst=dst, tmp=self.pool.get(f"{key}.morph", img.shape[:2]))
+
+
+class Trail(Stage):
+    """
+    Estela exponencial del foreground (trail = trail*fade + fg*(1-fade)) y su
+    binarización en 'dst' (trail*255 > bin_level). mode="fixed" usa uint16 en
+    punto fijo, como TrailSegmenter(trail_mode="fixed").
+    """
+
+    name = "trail"
+
+    def __init__(
+        self,
+        fade: float = 0.90,
+        bin_level: int = 32,
+        mode: Literal["float","fixed"] = "float",
+        src: str = "fg",
+        dst: str = "mask",
+    ):
+        super().__init__()
+        if mode not in ("float", "fixed"):
+            raise ValueError(f"trail_mode no soportado: {mode}. Use 'float' o 'fixed'.")
+        self.fade = float(np.clip(fade, 0.0, 1.0))
+        self.bin_level = int(np.clip(bin_level, 0, 255))
+        self.mode = mode
+        self.trail = None
+        self.inputs = (src,)
+        self.outputs = (dst,)
+
+    def process(self, data):
+        fg = data[self.inputs[0]]
+        key = self.outputs[0]
+        if self.trail is None:
+            self.trail = np.zeros(fg.shape[:2], dtype=np.uint16 if self.mode == "fixed" else np.float32)
+        mask = self.pool.get(key, fg.shape[:2])
+        if self.mode == "fixed":
+            update_trail_fixed(self.trail, fg, self.fade, self.bin_level, mask,
+                               self.pool.get(f"{key}.fg16", fg.shape[:2], np.uint16))
+        else:
+            update_trail_float(self.trail, fg, self.fade, self.bin_level, mask,
+                               self.pool.get(f"{key}.tmp", fg.shape[:2], np.float32))
+        data[key] = mask
+
+
+class BlobFilter(Stage):
+    """
+    Filtro de componentes por área y/o circularidad con un solo etiquetado
+    (modules.analyze_blobs). Escribe la máscara filtrada (in-place si src == dst)
+    y la tabla de blobs conservados. AreaFilter y RoundnessFilter consecutivos
+    sobre la misma máscara se fusionan en un solo BlobFilter.
+    """
+
+    name = "filter"
+
+    def __init__(
+        self,
+        min_size: int = 0,
+        max_size: int = 0,
+        min_circularity: Optional[float] = None,
+        max_circularity: Optional[float] = None,
+        measure_circularity: bool = False,
+        src: str = "mask",
+        dst: Optional[str] = None,
+        blobs: str = "blobs",
+    ):
+        super().__init__()
+        self.min_size = int(min_size or 0)
+        self.max_size = int(max_size or 0)
+        self.min_circularity = min_circularity
+        self.max_circularity = max_circularity
+        self.measure_circularity = bool(measure_circularity)
+        self.inputs = (src,)
+        self.outputs = (dst or src, blobs)
+
+    def process(self, data):
+        img = data[self.inputs[0]]
+        key, blobs = self.outputs
+        out = img if key == self.inputs[0] else self.pool.get(key, img.shape[:2])
+        data[key], data[blobs] = analyze_blobs(
+            img,
+            min_size=self.min_size,
+            max_size=self.max_size,
+            min_circularity=self.min_circularity,
+            max_circularity=self.max_circularity,
+            measure_circularity=self.measure_circularity,
+            out=out,
+            labels=self.pool.get(f"{key}.labels", img.shape[:2], np.int32),
+        )
+
+    def fuse(self, other):
+        if not isinstance(other, BlobFilter) or other.inputs[0] != self.outputs[0]:
+            return None
+        if other.outputs[0] != other.inputs[0] or self.outputs[0] != self.inputs[0]:
+            return None  # sólo se fusionan filtros in-place sobre la misma máscara
+        merged = BlobFilter(
+            min_size=max(self.min_size, other.min_size),
+            max_size=min((s for s in (self.max_size, other.max_size) if s > 0), default=0),
+            min_circularity=self.min_circularity if other.min_circularity is None else other.min_circularity,
+            max_circularity=self.max_circularity if other.max_circularity is None else other.max_circularity,
+            measure_circularity=self.measure_circularity or other.measure_circularity,
+            src=self.inputs[0],
+            blobs=other.outputs[1],
+        )
+        merged.timer = self.timer or other.timer
+        return merged
+
+
+class AreaFilter(BlobFilter):
+    """Conserva los componentes con min_size <= área <= max_size (<=1 / <=0 desactivan)."""
+
+    def __init__(self, min_size: int = 0, max_size: int = 0, src: str = "mask", dst: Optional[str] = None,
+                 blobs: str = "blobs"):
+        super().__init__(min_size=min_size, max_size=max_size, src=src, dst=dst, blobs=blobs)
+
+
+class RoundnessFilter(BlobFilter):
+    """Conserva los componentes con circularidad (4*pi*A/P^2) dentro de [min, max]."""
+
+    def __init__(self, min_circularity: Optional[float] = None, max_circularity: Optional[float] = None,
+                 src: str = "mask", dst: Optional[str] = None, blobs: str = "blobs"):
+        super().__init__(min_circularity=min_circularity, max_circularity=max_circularity,
+                         measure_circularity=True, src=src, dst=dst, blobs=blobs)
@@ -0,0 +1,379 @@
+# modules/stage_graph.py
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Iterable, Optional
+
+import cv2
+import numpy as np
+from tqdm import tqdm
+
+from .buffer_pool import BufferPool
+from .colorize_overlay import OverlayCompositor
+from .video_writers import open_writer
+from .threaded_io import iter_frames
+from .mask_store import MaskStoreWriter
+from .blob_table import BlobTableWriter
+
+# Claves que provee el bucle de frames (no las produce ninguna etapa)
+SOURCE_KEYS = ("index", "frame", "key")
+
+
+class Stage:
+    """
+    Etapa de un grafo de procesamiento por frame (ver Graph).
+
+    Declara las claves que lee ('inputs') y las que escribe ('outputs') en el
+    dict del frame; una salida con el mismo nombre que una entrada se procesa
+    in-place sobre ese buffer. open() recibe el tamaño del video y el
+    BufferPool compartido del grafo (los buffers se piden con el nombre de la
+    etapa como prefijo); process() se llama una vez por frame; close() libera
+    lo que haya abierto.
+
+    Con 'name' el grafo marca esa etapa en el StageTimer al terminar process();
+    las etapas con name=None marcan sus propias etapas con 'self.timer'.
+    'retains_frames' indica que la etapa guarda arrays del frame después de
+    process() (p.ej. un writer en otro hilo): el lector no puede reutilizarlos.
+    """
+
+    name: Optional[str] = None
+    inputs: tuple[str, ...] = ()
+    outputs: tuple[str, ...] = ()
+    retains_frames = False
+
+    def __init__(self):
+        self.timer = None
+        self.pool: Optional[BufferPool] = None
+
+    def open(self, fps: float, width: int, height: int) -> None:
+        pass
+
+    def process(self, data: dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+    def fuse(self, other: "Stage") -> Optional["Stage"]:
+        """Etapa que hace el trabajo de self seguida de 'other' en una sola pasada, o None."""
+        return None
+
+
+class Segment(Stage):
+    """
+    Envuelve un segmentador con apply(frame) (TrailSegmenter, ThresholdSegmenter):
+    es la forma fusionada de la cadena sustracción → umbral → morfología →
+    estela → filtros, con ROI, escala y gate. Escribe la máscara y, si el
+    segmentador la tiene, la tabla de blobs; las etapas las marca el segmentador.
+    """
+
+    def __init__(self, segmenter, frame: str = "frame", mask: str = "mask", blobs: str = "blobs"):
+        super().__init__()
+        self.segmenter = segmenter
+        self.inputs = (frame,)
+        self.outputs = (mask, blobs)
+
+    def open(self, fps, width, height):
+        self.segmenter.timer = self.timer
+
+    def process(self, data):
+        mask, blobs = self.outputs
+        data[mask] = self.segmenter.apply(data[self.inputs[0]])
+        data[blobs] = getattr(self.segmenter, "blobs", None)
+
+
+class Overlay(Stage):
+    """
+    Overlay coloreado de la máscara sobre el frame (modules.colorize_overlay).
+    El grafo lo pinta sobre el propio frame (in-place) cuando ninguna otra
+    etapa lee ese frame después; si no, sobre una copia.
+    """
+
+    name = "overlay"
+
+    def __init__(self, frame: str = "frame", mask: str = "mask", dst: str = "overlay", **overlay_kw):
+        super().__init__()
+        self.compositor = OverlayCompositor(**overlay_kw)
+        self.inputs = (frame, mask)
+        self.outputs = (dst,)
+        self.inplace = False
+
+    def process(self, data):
+        frame, mask = (data[k] for k in self.inputs)
+        inplace = self.inplace
+        if frame.ndim == 2:  # frames en gris (cache de frames en modo gris)
+            frame, inplace = cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR), True
+        data[self.outputs[0]] = self.compositor.apply(frame, mask, out=frame if inplace else None)
+
+
+class VideoSink(Stage):
+    """
+    Escribe la imagen 'key' (overlay BGR o máscara de 1 canal) con un writer
+    de modules.video_writers: por defecto mp4v con OpenCV (la máscara se
+    expande a B/N); según 'path' y 'writer_kw' (backend, codec, threads...)
+    FFV1 / PNG / npy / y4m en 1 canal y sin pérdida, o nada (null). Con
+    pipelined=True el writer codifica en su propio hilo con una cola de
+    'queue_size' frames.
+    """
+
+    name = "write"
+
+    def __init__(self, path: str, key: str = "mask", pipelined: bool = False, queue_size: int = 8,
+                 writer_kw: Optional[dict] = None):
+        super().__init__()
+        self.path = path
+        self.inputs = (key,)
+        self.pipelined = bool(pipelined)
+        self.retains_frames = self.pipelined
+        self.queue_size = queue_size
+        self.writer_kw = dict(writer_kw or {})
+        self.writer = None
+
+    def open(self, fps, width, height):
+        self.writer = open_writer(self.path, fps, width, height, threaded=self.pipelined,
+                                  queue_size=self.queue_size, **self.writer_kw)
+
+    def process(self, data):
+        img = data[self.inputs[0]]
+        if self.pipelined and img.ndim == 2:
+            # La máscara es un buffer del segmentador: el hilo del writer recibe una copia
+            img = img.copy()
+        self.writer.write(img)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.release()
+            self.writer = None
+
+
+class MaskStoreSink(Stage):
+    """Guarda la máscara 'key' en un archivo de máscaras exacto (modules.mask_store)."""
+
+    name = "store"
+
+    def __init__(self, path: str, codec: str = "auto", key: str = "mask"):
+        super().__init__()
+        self.path = path
+        self.codec = codec
+        self.inputs = (key,)
+        self.store = None
+
+    def open(self, fps, width, height):
+        self.store = MaskStoreWriter(self.path, width, height, fps, codec=self.codec)
+
+    def process(self, data):
+        self.store.write(data[self.inputs[0]])
+
+    def close(self):
+        if self.store is not None:
+            self.store.release()
+            self.store = None
+
+
+class BlobTableSink(Stage):
+    """
+    Escribe la tabla de blobs 'key' del frame en una tabla de detecciones
+    (modules.blob_table). Los frames con data["key"] falso (interpolados con
+    stride>1) no tienen medición propia y no se escriben.
+    """
+
+    name = "detections"
+
+    def __init__(self, path: str, fmt: str = "auto", key: str = "blobs"):
+        super().__init__()
+        self.path = path
+        self.fmt = fmt
+        self.inputs = ("index", key)
+        self.table = None
+
+    def open(self, fps, width, height):
+        self.table = BlobTableWriter(self.path, fps, fmt=self.fmt)
+
+    def process(self, data):
+        if data.get("key", True):
+            self.table.write(data["index"], data[self.inputs[1]])
+
+    def close(self):
+        if self.table is not None:
+            self.table.release()
+            self.table = None
+
+
+def _fuse(stages: list[Stage]) -> list[Stage]:
+    fused: list[Stage] = []
+    for stage in stages:
+        merged = fused[-1].fuse(stage) if fused else None
+        if merged is not None:
+            fused[-1] = merged
+        else:
+            fused.append(stage)
+    return fused
+
+
+class Graph:
+    """
+    Ejecuta un conjunto de etapas (Stage) sobre cada frame.
+
+    Al construirlo:
+      - fusiona las etapas consecutivas que lo admiten (Stage.fuse; p.ej. los
+        filtros de área y de circularidad en un solo etiquetado);
+      - verifica que cada entrada la provea el bucle ('sources') o una etapa
+        anterior, y que cada clave la produzca una sola etapa (salvo in-place);
+      - separa las ramas independientes: etapas que no comparten ninguna
+        clave fuera de 'sources' (p.ej. la rama MOG2 y la rama Otsu);
+      - decide si cada Overlay puede pintar sobre el frame y si el lector
+        puede reutilizar los buffers de frame ('reuse_frames').
+
+    Todas las etapas piden sus buffers a un único BufferPool. Con
+    concurrent=True y más de una rama, las ramas corren en paralelo en un
+    pool de hilos (OpenCV y NumPy liberan el GIL); en ese caso el timer sólo
+    mide "branches" (el tiempo de todas las ramas), no las etapas internas.
+    """
+
+    def __init__(self, stages: Iterable[Stage], sources: tuple[str, ...] = SOURCE_KEYS, concurrent: bool = False):
+        self.stages = _fuse(list(stages))
+        self.sources = tuple(sources)
+        produced = set(self.sources)
+        for stage in self.stages:
+            missing = [k for k in stage.inputs if k not in produced]
+            if missing:
+                raise ValueError(f"La etapa {type(stage).__name__} necesita {missing}, que no produce ninguna etapa anterior.")
+            for k in stage.outputs:
+                if k in produced and k not in stage.inputs:
+                    raise ValueError(f"La clave '{k}' la produce más de una etapa.")
+                produced.add(k)
+
+        # Ramas: componentes conexas por claves compartidas (sin contar las de 'sources')
+        owner: dict[str, int] = {}
+        parent = list(range(len(self.stages)))
+
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        for i, stage in enumerate(self.stages):
+            for k in stage.inputs + stage.outputs:
+                if k in self.sources:
+                    continue
+                if k in owner:
+                    parent[find(i)] = find(owner[k])
+                else:
+                    owner[k] = i
+        groups: dict[int, list[Stage]] = {}
+        for i, stage in enumerate(self.stages):
+            groups.setdefault(find(i), []).append(stage)
+        self.branches = list(groups.values())
+
+        # Overlay in-place: nadie más lee el frame después (ni en otra rama)
+        for i, stage in enumerate(self.stages):
+            if isinstance(stage, Overlay):
+                frame_key = stage.inputs[0]
+                branch = next(b for b in self.branches if stage in b)
+                readers = [s for s in self.stages if s is not stage and frame_key in s.inputs]
+                stage.inplace = all(s in branch and self.stages.index(s) < i for s in readers)
+
+        self.reuse_frames = not any(s.retains_frames for s in self.stages)
+        self.concurrent = bool(concurrent) and len(self.branches) > 1
+        self.pool = BufferPool()
+        self.timer = None
+        self._executor = None
+
+    def open(self, fps: float, width: int, height: int, timer=None) -> None:
+        """Abre todas las etapas. Las etapas sin timer propio usan 'timer'."""
+        self.timer = timer
+        opened = []
+        try:
+            for stage in self.stages:
+                stage.pool = self.pool
+                if self.concurrent:
+                    stage.timer = None
+                elif stage.timer is None:
+                    stage.timer = timer
+                stage.open(fps, width, height)
+                opened.append(stage)
+        except Exception:
+            for stage in opened:
+                stage.close()
+            raise
+        if self.concurrent:
+            self._executor = ThreadPoolExecutor(max_workers=len(self.branches), thread_name_prefix="graph-branch")
+
+    @staticmethod
+    def _run_branch(stages: list[Stage], data: dict) -> None:
+        for stage in stages:
+            stage.process(data)
+            if stage.name is not None and stage.timer is not None:
+                stage.timer.lap(stage.name)
+
+    def process(self, data: dict[str, Any]) -> dict[str, Any]:
+        """Procesa un frame: 'data' trae las claves de 'sources' y recibe las salidas."""
+        if self._executor is None:
+            self._run_branch(self.stages, data)
+        else:
+            futures = [self._executor.submit(self._run_branch, b, data) for b in self.branches]
+            for fut in futures:
+                fut.result()
+            if self.timer is not None:
+                self.timer.lap("branches")
+        return data
+
+    def run(self, frames: Iterable[np.ndarray], start_index: int = 0, pbar=None) -> int:
+        """Procesa cada frame de 'frames' (marca "decode" y cierra el frame en el timer)."""
+        timer = self.timer
+        count = 0
+        if timer is not None:
+            timer.reset_mark()
+        for idx, frame in enumerate(frames, start_index):
+            if timer is not None:
+                timer.lap("decode")
+            self.process({"index": idx, "frame": frame, "key": True})
+            if timer is not None:
+                timer.end_frame()
+            count += 1
+            if pbar is not None:
+                pbar.update(1)
+        return count
+
+    def close(self) -> None:
+        """Cierra todas las etapas (writers, tablas...) aunque alguna falle."""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        error = None
+        for stage in self.stages:
+            try:
+                stage.close()
+            except Exception as exc:
+                error = error or exc
+        if error is not None:
+            raise error
+
+
+def run_graph(
+    cap,
+    graph: Graph,
+    fps: float,
+    width: int,
+    height: int,
+    total_frames: int = 0,
+    queue_size: int = 0,
+    timer=None,
+    progress: bool = True,
+    desc: str = "Procesando video",
+) -> int:
+    """
+    Bucle completo sobre una captura abierta: abre el grafo, lee los frames
+    (con un hilo lector si queue_size>0; reutilizando buffers si el grafo lo
+    permite), muestra el progreso, cierra el grafo y, con 'timer', llama a
+    timer.close(). No libera 'cap'. Devuelve la cantidad de frames procesados.
+    """
+    graph.open(fps, width, height, timer)
+    try:
+        with tqdm(total=total_frames if total_frames > 0 else None,
+                  desc=desc, unit="frame", disable=not progress) as pbar:
+            frames = graph.run(iter_frames(cap, queue_size, reuse=graph.reuse_frames), pbar=pbar)
+    finally:
+        graph.close()
+    if timer is not None:
+        timer.close()
+    return frames
@@ -0,0 +1,239 @@
+# modules/stage_timer.py
+import json
+import os
+import time
+from array import array
+from bisect import bisect_left
+from typing import Callable, Optional
+
+import numpy as np
+
+# Límites superiores (ms) de los buckets del histograma de latencia
+DEFAULT_BUCKETS_MS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 25.0, 50.0, 100.0, 250.0, 500.0, 1000.0)
+
+FrameHook = Callable[[int, dict[str, float]], None]
+
+
+class _Stage:
+    __slots__ = ("count", "total", "min", "max", "buckets", "samples")
+
+    def __init__(self, n_buckets: int, keep_samples: bool):
+        self.count = 0
+        self.total = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+        self.buckets = [0] * (n_buckets + 1)  # el último es +Inf
+        self.samples = array("d") if keep_samples else None
+
+
+class _Scoped:
+    """Vista de un StageTimer que antepone un prefijo a los nombres de etapa."""
+
+    __slots__ = ("timer", "prefix")
+
+    def __init__(self, timer: "StageTimer", prefix: str):
+        self.timer = timer
+        self.prefix = prefix
+
+    def lap(self, stage: str) -> None:
+        self.timer.lap(self.prefix + stage)
+
+
+class StageTimer:
+    """
+    Mide cuánto tarda cada etapa del procesamiento en cada frame.
+
+    Uso: el bucle llama a lap("etapa") al terminar cada etapa (se mide el
+    tiempo desde el lap anterior) y a end_frame() al terminar el frame. Las
+    funciones de proceso reciben un 'timer' opcional; con timer=None cada
+    punto de medición es un solo 'if', sin costo medible.
+
+    Por etapa acumula: cantidad, total, mínimo, máximo, histograma de latencia
+    (buckets en ms) y, con keep_samples=True, las muestras para percentiles
+    exactos (8 bytes por frame y etapa). Los 'hooks' se llaman al final de
+    cada frame con (índice de frame, {etapa: segundos}).
+
+    Al cerrar (close) se escriben el resumen JSON y/o el textfile de Prometheus
+    si se indicaron 'json_path' / 'prometheus_path'.
+    """
+
+    def __init__(
+        self,
+        hooks: Optional[list[FrameHook]] = None,
+        buckets_ms: tuple[float, ...] = DEFAULT_BUCKETS_MS,
+        keep_samples: bool = True,
+        json_path: Optional[str] = None,
+        prometheus_path: Optional[str] = None,
+        prometheus_prefix: str = "padel_segmentation",
+        labels: Optional[dict[str, str]] = None,
+    ):
+        self.hooks = list(hooks or [])
+        self.buckets_ms = tuple(sorted(float(b) for b in buckets_ms))
+        self.buckets_s = tuple(b / 1000.0 for b in self.buckets_ms)
+        self.keep_samples = bool(keep_samples)
+        self.json_path = json_path
+        self.prometheus_path = prometheus_path
+        self.prometheus_prefix = prometheus_prefix
+        self.labels = dict(labels or {})
+        self.stages: dict[str, _Stage] = {}
+        self.frames = 0
+        self._frame: dict[str, float] = {}
+        self._started = time.perf_counter()
+        self._wall = 0.0
+        self._mark = self._started
+
+    def add_hook(self, hook: FrameHook) -> None:
+        self.hooks.append(hook)
+
+    def scoped(self, prefix: str) -> _Scoped:
+        """Vista con lap() que antepone 'prefix' (p.ej. una rama de run_pipeline)."""
+        return _Scoped(self, prefix)
+
+    def reset_mark(self) -> None:
+        """Reinicia la marca de tiempo (lo que pasó desde el último lap no se cuenta)."""
+        self._mark = time.perf_counter()
+
+    def lap(self, stage: str) -> None:
+        now = time.perf_counter()
+        dt = now - self._mark
+        self._mark = now
+        self._frame[stage] = self._frame.get(stage, 0.0) + dt
+
+    def record(self, stage: str, seconds: float) -> None:
+        """Suma al frame actual una duración medida por fuera (p.ej. la latencia de punta a punta)."""
+        self._frame[stage] = self._frame.get(stage, 0.0) + seconds
+
+    def end_frame(self) -> None:
+        """Cierra el frame: vuelca las etapas medidas a las estadísticas y llama a los hooks."""
+        frame = self._frame
+        for stage, dt in frame.items():
+            self._record(stage, dt)
+        if self.hooks:
+            for hook in self.hooks:
+                hook(self.frames, frame)
+        self.frames += 1
+        self._frame = {}
+
+    def _record(self, stage: str, dt: float) -> None:
+        st = self.stages.get(stage)
+        if st is None:
+            st = self.stages[stage] = _Stage(len(self.buckets_s), self.keep_samples)
+        st.count += 1
+        st.total += dt
+        if dt < st.min:
+            st.min = dt
+        if dt > st.max:
+            st.max = dt
+        st.buckets[bisect_left(self.buckets_s, dt)] += 1
+        if st.samples is not None:
+            st.samples.append(dt)
+
+    # —— Combinar (procesos paralelos) ——
+
+    def state(self) -> dict:
+        """Estado serializable (pickle) para combinar con merge() en otro proceso."""
+        return dict(
+            frames=self.frames,
+            wall=time.perf_counter() - self._started,
+            stages={k: (s.count, s.total, s.min, s.max, list(s.buckets),
+                        s.samples.tobytes() if s.samples is not None else None)
+                    for k, s in self.stages.items()},
+        )
+
+    def merge(self, state: dict) -> None:
+        """Suma las estadísticas de otro timer (p.ej. de un shard de process_video)."""
+        self.frames += int(state["frames"])
+        for name, (count, total, mn, mx, buckets, samples) in state["stages"].items():
+            st = self.stages.get(name)
+            if st is None:
+                st = self.stages[name] = _Stage(len(self.buckets_s), self.keep_samples)
+            st.count += count
+            st.total += total
+            st.min = min(st.min, mn)
+            st.max = max(st.max, mx)
+            st.buckets = [a + b for a, b in zip(st.buckets, buckets)]
+            if st.samples is not None and samples is not None:
+                st.samples.frombytes(samples)
+
+    # —— Exportar ——
+
+    def close(self) -> dict:
+        """Fin de la corrida: escribe los archivos configurados y devuelve el resumen."""
+        self._wall = time.perf_counter() - self._started
+        summary = self.summary()
+        if self.json_path:
+            self.write_json(self.json_path, summary)
+        if self.prometheus_path:
+            self.write_prometheus(self.prometheus_path)
+        return summary
+
+    def summary(self) -> dict:
+        wall = self._wall or (time.perf_counter() - self._started)
+        stages = {}
+        for name, st in self.stages.items():
+            d = dict(
+                count=st.count,
+                total_s=st.total,
+                share=st.total / wall if wall > 0 else None,
+                mean_ms=st.total / st.count * 1000.0 if st.count else None,
+                min_ms=st.min * 1000.0 if st.count else None,
+                max_ms=st.max * 1000.0,
+                histogram_ms={**{f"{b:g}": c for b, c in zip(self.buckets_ms, st.buckets)},
+                              "+Inf": st.buckets[-1]},
+            )
+            if st.samples is not None and len(st.samples):
+                ms = np.frombuffer(st.samples, dtype=np.float64) * 1000.0
+                d.update(p50_ms=float(np.percentile(ms, 50)),
+                         p90_ms=float(np.percentile(ms, 90)),
+                         p99_ms=float(np.percentile(ms, 99)))
+            stages[name] = d
+        return dict(
+            frames=self.frames,
+            wall_s=wall,
+            fps=self.frames / wall if wall > 0 else None,
+            labels=self.labels,
+            stages=stages,
+        )
+
+    def write_json(self, path: str, summary: Optional[dict] = None) -> None:
+        _write_atomic(path, json.dumps(summary or self.summary(), indent=2))
+
+    def write_prometheus(self, path: str) -> None:
+        """Textfile para el textfile collector de node_exporter (escritura atómica)."""
+        p = self.prometheus_prefix
+        base = ",".join(f'{k}="{_escape(v)}"' for k, v in sorted(self.labels.items()))
+
+        def lbl(extra: str = "") -> str:
+            parts = [x for x in (base, extra) if x]
+            return "{" + ",".join(parts) + "}" if parts else ""
+
+        lines = [
+            f"# HELP {p}_frames_total Frames procesados.",
+            f"# TYPE {p}_frames_total counter",
+            f"{p}_frames_total{lbl()} {self.frames}",
+            f"# HELP {p}_stage_seconds Latencia por frame de cada etapa.",
+            f"# TYPE {p}_stage_seconds histogram",
+        ]
+        for name, st in sorted(self.stages.items()):
+            stage = f'stage="{_escape(name)}"'
+            acc = 0
+            for b, c in zip(self.buckets_s, st.buckets):
+                acc += c
+                le = 'le="%g"' % b
+                lines.append(f"{p}_stage_seconds_bucket{lbl(stage + ',' + le)} {acc}")
+            le = 'le="+Inf"'
+            lines.append(f"{p}_stage_seconds_bucket{lbl(stage + ',' + le)} {st.count}")
+            lines.append(f"{p}_stage_seconds_sum{lbl(stage)} {st.total:.9f}")
+            lines.append(f"{p}_stage_seconds_count{lbl(stage)} {st.count}")
+        _write_atomic(path, "\n".join(lines) + "\n")
+
+
+def _escape(v) -> str:
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _write_atomic(path: str, text: str) -> None:
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        fh.write(text)
+    os.replace(tmp, path)
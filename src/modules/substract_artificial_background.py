@@ -1,9 +1,87 @@
-# modules/substract_artificial_background.py
 import cv2
 import numpy as np
 import random
 
-def compute_median_background(input_path: str, sample_size: int = 100, seed: int = 42) -> np.ndarray:
+from .frame_index import open_frame_index
+from .frame_cache import FrameCache
+
+
+def _read_samples(cap, indices: list[int], rows: tuple[int, int], out: np.ndarray, index=None) -> int:
+    """
+    Recorre el video en orden desde el frame 0 y copia en 'out' las filas
+    [r0, r1) de cada frame de 'indices'. Los frames intermedios se saltan con
+    grab(), que no hace la conversión de color ni copia el frame a numpy.
+    Si hay un índice sidecar y entre dos muestras hay un keyframe/anchor, se
+    salta con un seek exacto en lugar de recorrer el hueco.
+    Devuelve cuántos frames pudieron leerse.
+    """
+    r0, r1 = rows
+    cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+    pos = 0
+    n = 0
+    for idx in indices:
+        if index is not None and index.skips_ahead(pos, idx):
+            index.seek(cap, idx)
+            pos = idx
+        ok = True
+        while pos < idx and ok:
+            ok = cap.grab()
+            pos += 1
+        if not ok:
+            break
+        ok, frame = cap.read()
+        pos += 1
+        if not ok:
+            break
+        out[n] = frame[r0:r1]
+        n += 1
+    return n
+
+
+def _band_rows(k: int, frame_shape: tuple[int, ...], max_memory_mb: float | None) -> int:
+    # Filas por banda: stack uint8 + copia que hace np.median al particionar
+    height = frame_shape[0]
+    row_bytes = k * int(np.prod(frame_shape[1:])) * 2
+    if max_memory_mb is None or max_memory_mb <= 0:
+        return height
+    return max(1, min(height, int(max_memory_mb * 1024 * 1024 // row_bytes)))
+
+
+def compute_median_background(
+    input_path: str,
+    sample_size: int = 100,
+    seed: int = 42,
+    max_memory_mb: float | None = None,
+    frame_cache: FrameCache | None = None,
+) -> np.ndarray:
+    """
+    Fondo artificial como mediana por píxel y canal de 'sample_size' frames al azar.
+
+    Los frames muestreados se toman en una pasada secuencial (sin seeks). Para
+    acotar la memoria, las muestras se guardan en uint8 y por bandas de filas:
+    si el stack completo (k, H, W, 3) no entra en 'max_memory_mb', se hace una
+    pasada por banda. La mediana es exacta y, para la misma semilla, idéntica a
+    la de np.median sobre todos los frames apilados.
+
+    Si el video ya tiene un índice sidecar válido (modules.frame_index), los
+    huecos largos entre muestras se saltan con seeks exactos.
+
+    Con 'frame_cache' (modules.frame_cache) las muestras se toman directo del
+    cache en disco; si el cache es en gris, el fondo también lo es (H, W).
+    """
+    cached = frame_cache.open(input_path) if frame_cache is not None else None
+    if cached is not None:
+        k = min(sample_size, len(cached))
+        indices = sorted(random.Random(seed).sample(range(len(cached)), k))
+        frame_shape = cached.frames.shape[1:]
+        bg = np.empty(frame_shape, dtype=np.uint8)
+        band_rows = _band_rows(k, frame_shape, max_memory_mb)
+        for r0 in range(0, frame_shape[0], band_rows):
+            r1 = min(frame_shape[0], r0 + band_rows)
+            median = np.median(cached.frames[indices, r0:r1], axis=0)
+            bg[r0:r1] = np.clip(median, 0, 255).astype(np.uint8)
+        return bg
+
     cap = cv2.VideoCapture(input_path)
     if not cap.isOpened():
         raise RuntimeError(f"No se pudo abrir el video: {input_path}")
@@ -18,27 +96,51 @@ def compute_median_background(input_path: str, sample_size: int = 100, seed: int
     # Muestras al azar sin reemplazo
     indices = sorted(rng.sample(range(total_frames), k))
 
-    frames = []
-    for idx in indices:
-        cap.set(cv2.CAP_PROP_POS_FRAMES, idx)
-        ok, frame = cap.read()
-        if not ok:
-            continue
-        frames.append(frame)
-
-    cap.release()
+    # Sólo se reutiliza un índice existente: construirlo cuesta una pasada completa
+    index = open_frame_index(input_path, build=False)
+    if index is not None:
+        indices = [i for i in indices if i < len(index)]
 
-    if not frames:
+    ok, first = cap.read()
+    if not ok:
+        cap.release()
         raise RuntimeError("No se pudieron leer frames para calcular la mediana.")
+    frame_shape = first.shape  # (H, W, 3)
+    height = frame_shape[0]
+    del first
+
+    band_rows = _band_rows(k, frame_shape, max_memory_mb)
+
+    bg = np.empty(frame_shape, dtype=np.uint8)
+    stack = np.empty((k, band_rows) + frame_shape[1:], dtype=np.uint8)
+
+    try:
+        for r0 in range(0, height, band_rows):
+            r1 = min(height, r0 + band_rows)
+            n = _read_samples(cap, indices, (r0, r1), stack[:, : r1 - r0], index)
+            if n == 0:
+                raise RuntimeError("No se pudieron leer frames para calcular la mediana.")
+
+            # Mediana por píxel y canal
+            median = np.median(stack[:n, : r1 - r0], axis=0)
+            bg[r0:r1] = np.clip(median, 0, 255).astype(np.uint8)
+    finally:
+        cap.release()
 
-    # Mediana por píxel y canal
-    stack = np.stack(frames, axis=0).astype(np.float32)
-    median = np.median(stack, axis=0)
-    bg = np.clip(median, 0, 255).astype(np.uint8)
     return bg
 
-def save_median_background(input_path: str, output_png_path: str, sample_size: int = 100, seed: int = 42) -> None:
-    bg = compute_median_background(input_path=input_path, sample_size=sample_size, seed=seed)
+def save_median_background(
+    input_path: str,
+    output_png_path: str,
+    sample_size: int = 100,
+    seed: int = 42,
+    max_memory_mb: float | None = None,
+    frame_cache: FrameCache | None = None,
+) -> None:
+    bg = compute_median_background(
+        input_path=input_path, sample_size=sample_size, seed=seed, max_memory_mb=max_memory_mb,
+        frame_cache=frame_cache,
+    )
     # Guardar en BGR (cv2.imwrite espera BGR)
     ok = cv2.imwrite(output_png_path, bg)
     if not ok:
@@ -0,0 +1,107 @@
+# modules/synthetic_video.py
+import math
+import os
+
+import cv2
+import numpy as np
+
+from .video_io import create_writer
+
+RESOLUTIONS = {
+    "720p": (1280, 720),
+    "1080p": (1920, 1080),
+    "4k": (3840, 2160),
+}
+
+
+def _court_background(width: int, height: int, rng: np.random.Generator) -> np.ndarray:
+    """Cancha de pádel vista desde el fondo: pista azul, paredes, líneas y red."""
+    bg = np.empty((height, width, 3), dtype=np.uint8)
+    bg[:] = (60, 55, 50)  # paredes / gradas
+    # Trapecio de la pista (perspectiva)
+    top, bottom = int(height * 0.22), int(height * 0.97)
+    court = np.array([
+        (int(width * 0.28), top), (int(width * 0.72), top),
+        (int(width * 0.95), bottom), (int(width * 0.05), bottom),
+    ], dtype=np.int32)
+    cv2.fillPoly(bg, [court], (150, 90, 30))
+    lw = max(2, width // 400)
+    cv2.polylines(bg, [court], True, (235, 235, 235), lw)
+    # Líneas de saque y central
+    for f in (0.3, 0.7):
+        y = int(top + (bottom - top) * f)
+        half = int((width * 0.22) + (width * 0.23) * f)
+        cv2.line(bg, (width // 2 - half, y), (width // 2 + half, y), (235, 235, 235), lw)
+    cv2.line(bg, (width // 2, int(top + (bottom - top) * 0.3)),
+             (width // 2, int(top + (bottom - top) * 0.7)), (235, 235, 235), lw)
+    # Red
+    y_net = int(top + (bottom - top) * 0.5)
+    cv2.rectangle(bg, (int(width * 0.16), y_net - height // 30), (int(width * 0.84), y_net), (40, 40, 40), lw)
+    # Textura fija (superficie y paredes no son lisas)
+    texture = rng.normal(0.0, 4.0, size=(height // 8 + 1, width // 8 + 1, 1)).astype(np.float32)
+    texture = cv2.resize(texture, (width, height), interpolation=cv2.INTER_LINEAR)[..., None]
+    return np.clip(bg.astype(np.float32) + texture, 0, 255).astype(np.uint8)
+
+
+def make_court_video(
+    path: str,
+    width: int = 1280,
+    height: int = 720,
+    frames: int = 300,
+    fps: float = 30.0,
+    seed: int = 0,
+    players: int = 4,
+    noise_sigma: float = 3.0,  # ruido gaussiano por frame (niveles de gris)
+    drift: float = 0.08,       # amplitud de la variación de iluminación (0.08 = ±8 %)
+    overwrite: bool = False,
+) -> str:
+    """
+    Genera un video sintético y determinista (misma semilla → mismo video) de
+    una cancha: fondo estático, jugadores que se desplazan, una pelota con
+    rebotes, ruido de sensor y una deriva lenta de iluminación.
+
+    Si 'path' ya existe y overwrite=False, no se vuelve a generar.
+    """
+    if os.path.exists(path) and not overwrite:
+        return path
+    rng = np.random.default_rng(seed)
+    bg = _court_background(width, height, rng).astype(np.float32)
+
+    # Jugadores: elipses con trayectoria suave (suma de senos con fase aleatoria)
+    pr = [dict(
+        cx=rng.uniform(0.25, 0.75), cy=rng.uniform(0.35, 0.9),
+        ax=rng.uniform(0.05, 0.15), ay=rng.uniform(0.03, 0.08),
+        wx=rng.uniform(0.2, 0.6), wy=rng.uniform(0.2, 0.6),
+        ph=rng.uniform(0, 2 * math.pi),
+        color=tuple(int(c) for c in rng.integers(30, 220, size=3)),
+    ) for _ in range(int(players))]
+    pw, ph = max(4, width // 40), max(8, height // 9)
+    ball_r = max(2, width // 320)
+
+    writer = create_writer(path, fps, width, height)
+    frame = np.empty((height, width, 3), dtype=np.uint8)
+    noise = np.empty((height, width, 3), dtype=np.float32)
+    try:
+        for i in range(int(frames)):
+            t = i / float(fps)
+            gain = 1.0 + drift * math.sin(2 * math.pi * t / 20.0)
+            img = bg * gain
+            for p in pr:
+                x = int(width * (p["cx"] + p["ax"] * math.sin(p["wx"] * t * 2 * math.pi + p["ph"])))
+                y = int(height * (p["cy"] + p["ay"] * math.sin(p["wy"] * t * 2 * math.pi + 2 * p["ph"])))
+                cv2.ellipse(img, (x, y - ph // 2), (pw, ph // 2), 0, 0, 360, p["color"], -1)
+                cv2.circle(img, (x, y - ph - pw // 2), max(2, pw // 2), (150, 170, 200), -1)
+            # Pelota: ida y vuelta en x, parábolas con rebote en el piso en y
+            u = (t % 1.5) / 1.5
+            bx = int(width * (0.2 + 0.6 * abs(((t / 3.0) % 2.0) - 1.0)))
+            by = int(height * (0.85 - 0.55 * (1.0 - (2.0 * u - 1.0) ** 2)))
+            cv2.circle(img, (bx, by), ball_r, (60, 255, 230), -1)
+
+            rng.standard_normal(dtype=np.float32, out=noise)
+            img += noise * noise_sigma
+            np.clip(img, 0, 255, out=img)
+            np.copyto(frame, img, casting="unsafe")
+            writer.write(frame)
+    finally:
+        writer.release()
+    return path
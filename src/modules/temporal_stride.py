@@ -0,0 +1,168 @@
+# modules/temporal_stride.py
+from typing import Iterator, Literal, Optional
+
+import cv2
+import numpy as np
+
+
+def strided_rate(rate: float, stride: int) -> float:
+    """
+    Tasa equivalente a aplicar 'rate' en cada uno de 'stride' frames:
+    1 - (1 - rate)^stride. Con stride=1 devuelve 'rate' sin tocarla.
+    """
+    if stride <= 1:
+        return rate
+    return 1.0 - (1.0 - rate) ** stride
+
+
+class StridedSegmenter:
+    """
+    Corre un segmentador (p.ej. TrailSegmenter con el mismo 'stride') sólo en
+    los frames clave (índice múltiplo de 'stride') y completa los intermedios
+    con una máscara interpolada:
+
+      - "hold":  repite la última máscara clave (sin demora).
+      - "or":    unión de las máscaras clave anterior y siguiente.
+      - "shift": cada blob de la clave anterior se desplaza hacia el blob más
+                 cercano de la siguiente, en proporción a la distancia temporal
+                 (blobs sin pareja: se mantienen hasta la mitad del intervalo;
+                 los nuevos aparecen desde la mitad).
+
+    "or" y "shift" necesitan la clave siguiente: los frames intermedios se
+    copian y salen recién al procesarla (demora de hasta 'stride' frames).
+
+    push(frame) devuelve un iterador de (índice, frame, máscara, es_clave) con
+    los frames que ya pueden emitirse, en orden; flush() emite los pendientes
+    al final del video (con la última máscara clave). Las máscaras son buffers
+    internos: consumir cada una antes de pedir la siguiente.
+    """
+
+    def __init__(
+        self,
+        segmenter,
+        stride: int,
+        mode: Literal["hold", "or", "shift"] = "hold",
+        start_index: int = 0,
+        max_shift: Optional[float] = None,  # desplazamiento máximo (px) entre claves; None: 10% de la diagonal
+    ):
+        if mode not in ("hold", "or", "shift"):
+            raise ValueError(f"Modo de interpolación no soportado: {mode}. Use 'hold', 'or' o 'shift'.")
+        self.segmenter = segmenter
+        self.stride = max(1, int(stride))
+        self.mode = mode
+        self.index = int(start_index)  # índice absoluto del próximo frame
+        self.max_shift = max_shift
+        self.key_frames = 0
+        self.frames = 0
+        self.timer = None  # StageTimer opcional: etapa "interpolate"
+        self._prev = None       # copia de la última máscara clave
+        self._prev_idx = None
+        self._pending = []      # (índice, copia del frame) entre dos claves
+        self._out = None        # máscara interpolada
+
+    def push(self, frame: np.ndarray) -> Iterator[tuple[int, np.ndarray, np.ndarray, bool]]:
+        idx = self.index
+        self.index += 1
+        self.frames += 1
+        if idx % self.stride == 0:
+            mask = self.segmenter.apply(frame)
+            self.key_frames += 1
+            if self._pending:
+                yield from self._emit_pending(mask, idx)
+            if self._prev is None:
+                self._prev = np.empty_like(mask)
+            np.copyto(self._prev, mask)
+            self._prev_idx = idx
+            yield idx, frame, mask, True
+        elif self.mode == "hold" or self._prev_idx is None:
+            # Sin clave previa (inicio de un rango) la máscara es vacía
+            yield idx, frame, self._held(frame), False
+        else:
+            self._pending.append((idx, frame.copy()))
+
+    def flush(self) -> Iterator[tuple[int, np.ndarray, np.ndarray, bool]]:
+        pending, self._pending = self._pending, []
+        for idx, frame in pending:
+            yield idx, frame, self._held(frame), False
+
+    def _held(self, frame: np.ndarray) -> np.ndarray:
+        if self._prev is None:
+            self._prev = np.zeros(frame.shape[:2], dtype=np.uint8)
+        return self._prev
+
+    def _emit_pending(self, mask: np.ndarray, next_idx: int):
+        pending, self._pending = self._pending, []
+        if self._out is None:
+            self._out = np.empty_like(mask)
+        out = self._out
+        if self.mode == "or":
+            cv2.bitwise_or(self._prev, mask, dst=out)
+            if self.timer is not None:
+                self.timer.lap("interpolate")
+            for idx, frame in pending:
+                yield idx, frame, out, False
+            return
+
+        moves = self._match(self._prev, mask)
+        span = float(next_idx - self._prev_idx)
+        for idx, frame in pending:
+            self._render(moves, (idx - self._prev_idx) / span, out)
+            if self.timer is not None:
+                self.timer.lap("interpolate")
+            yield idx, frame, out, False
+
+    def _match(self, prev: np.ndarray, nxt: np.ndarray) -> list:
+        """
+        Empareja cada blob de 'prev' con el blob más cercano de 'nxt' (por
+        centroide, de menor a mayor distancia, sin repetir). Devuelve una lista
+        de (máscara del blob, x, y, dx, dy, aparece, desaparece).
+        """
+        h, w = prev.shape[:2]
+        limit = self.max_shift if self.max_shift is not None else 0.1 * float(np.hypot(w, h))
+        n0, lab0, st0, c0 = cv2.connectedComponentsWithStats(prev, connectivity=8)
+        n1, lab1, st1, c1 = cv2.connectedComponentsWithStats(nxt, connectivity=8)
+
+        pairs, used = {}, set()
+        if n0 > 1 and n1 > 1:
+            d = np.hypot(c0[1:, None, 0] - c1[None, 1:, 0], c0[1:, None, 1] - c1[None, 1:, 1])
+            for flat in np.argsort(d, axis=None):
+                i, j = divmod(int(flat), n1 - 1)
+                if d[i, j] > limit:
+                    break
+                if i + 1 in pairs or j + 1 in used:
+                    continue
+                pairs[i + 1] = j + 1
+                used.add(j + 1)
+
+        moves = []
+        for i in range(1, n0):
+            x, y, bw, bh = (int(v) for v in st0[i, :4])
+            blob = lab0[y:y + bh, x:x + bw] == i
+            j = pairs.get(i)
+            if j is None:
+                moves.append((blob, x, y, 0.0, 0.0, False, True))
+            else:
+                moves.append((blob, x, y, c1[j, 0] - c0[i, 0], c1[j, 1] - c0[i, 1], False, False))
+        for j in range(1, n1):
+            if j not in used:
+                x, y, bw, bh = (int(v) for v in st1[j, :4])
+                moves.append((lab1[y:y + bh, x:x + bw] == j, x, y, 0.0, 0.0, True, False))
+        return moves
+
+    @staticmethod
+    def _render(moves: list, t: float, out: np.ndarray) -> None:
+        out.fill(0)
+        h, w = out.shape[:2]
+        for blob, x, y, dx, dy, appears, vanishes in moves:
+            if (appears and t < 0.5) or (vanishes and t >= 0.5):
+                continue
+            x0 = x + int(round(dx * t))
+            y0 = y + int(round(dy * t))
+            bh, bw = blob.shape
+            # Recorte contra los bordes del frame
+            sx0, sy0 = max(0, -x0), max(0, -y0)
+            sx1, sy1 = min(bw, w - x0), min(bh, h - y0)
+            if sx1 <= sx0 or sy1 <= sy0:
+                continue
+            region = out[y0 + sy0:y0 + sy1, x0 + sx0:x0 + sx1]
+            region[blob[sy0:sy1, sx0:sx1]] = 255
@@ -0,0 +1,122 @@
+# modules/threaded_io.py
+import queue
+import threading
+from typing import Iterator
+
+import numpy as np
+
+_END = object()  # marca de fin de stream
+
+
+class _Failure:
+    """Envuelve una excepción lanzada en un hilo para re-lanzarla en el principal."""
+
+    def __init__(self, exc: BaseException):
+        self.exc = exc
+
+
+def _put(q: queue.Queue, item, stop: threading.Event) -> bool:
+    # put bloqueante pero interrumpible: si el consumidor se fue, no colgarse
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def iter_frames(cap, queue_size: int = 0, reuse: bool = False) -> Iterator[np.ndarray]:
+    """
+    Itera los frames de un cv2.VideoCapture en orden.
+
+    - queue_size <= 0: lectura síncrona (cap.read() en el hilo actual).
+      Con reuse=True cada frame se decodifica sobre el buffer del anterior:
+      el llamador no debe retener un frame más allá de su iteración.
+    - queue_size > 0: un hilo lector decodifica por adelantado en una cola
+      acotada de 'queue_size' frames; la memoria queda limitada a esa cola
+      (aquí cada frame es un array nuevo y 'reuse' se ignora).
+
+    No libera 'cap': eso sigue siendo responsabilidad del llamador.
+    """
+    if queue_size <= 0:
+        frame = None
+        while True:
+            ok, frame = cap.read(frame if reuse else None)
+            if not ok:
+                return
+            yield frame
+
+    q: queue.Queue = queue.Queue(maxsize=int(queue_size))
+    stop = threading.Event()
+
+    def _reader():
+        try:
+            while not stop.is_set():
+                ok, frame = cap.read()
+                if not ok:
+                    break
+                if not _put(q, frame, stop):
+                    return
+        except BaseException as exc:  # se re-lanza en el hilo principal
+            _put(q, _Failure(exc), stop)
+        _put(q, _END, stop)
+
+    thread = threading.Thread(target=_reader, name="frame-reader", daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = q.get()
+            if item is _END:
+                break
+            if isinstance(item, _Failure):
+                raise item.exc
+            yield item
+    finally:
+        stop.set()
+        thread.join()
+
+
+class ThreadedWriter:
+    """
+    Envuelve un writer (cv2.VideoWriter o compatible) y codifica en otro hilo.
+
+    Expone la misma interfaz write()/release(). Los frames se encolan sin copiar:
+    quien llama no debe modificar un frame después de pasarlo a write().
+    El orden de escritura es el de llegada.
+    """
+
+    def __init__(self, writer, queue_size: int = 8):
+        self.writer = writer
+        self._queue: queue.Queue = queue.Queue(maxsize=max(1, int(queue_size)))
+        self._stop = threading.Event()
+        self._error: BaseException | None = None
+        self._thread = threading.Thread(target=self._run, name="frame-writer", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _END:
+                return
+            if self._error is not None:
+                continue  # drenar la cola sin escribir
+            try:
+                self.writer.write(item)
+            except BaseException as exc:
+                self._error = exc
+
+    def _raise_if_failed(self):
+        if self._error is not None:
+            raise RuntimeError("Falló la escritura del video en segundo plano.") from self._error
+
+    def write(self, frame: np.ndarray) -> None:
+        self._raise_if_failed()
+        _put(self._queue, frame, self._stop)
+
+    def release(self) -> None:
+        if self._thread.is_alive():
+            _put(self._queue, _END, self._stop)
+            self._thread.join()
+        self.writer.release()
+        self._raise_if_failed()
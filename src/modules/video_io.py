@@ -0,0 +1,152 @@
+# modules/video_io.py
+import os
+import shutil
+import subprocess
+import cv2
+from pathlib import Path
+
+from .frame_cache import FrameCache, CachedCapture
+
+
+def open_capture(input_path: str, frame_cache: FrameCache | None = None):
+    """
+    Abre un video y devuelve (cap, fps, width, height, total_frames).
+
+    - fps: 30.0 si el contenedor no lo informa.
+    - width/height: si el contenedor no los informa, se leen del primer frame
+      y se rebobina al inicio.
+    - total_frames: 0 si es desconocido (sirve para tqdm).
+
+    Con 'frame_cache' (modules.frame_cache) los frames salen del cache en disco
+    (se decodifica el video la primera vez) y 'cap' es un CachedCapture con
+    total_frames exacto.
+    """
+    in_path = Path(input_path)
+    if not in_path.exists():
+        raise FileNotFoundError(f"No se encuentra el archivo de entrada: {in_path}")
+
+    if frame_cache is not None:
+        cap = frame_cache.capture(str(in_path))
+        if cap is not None:
+            c = cap.cached
+            return cap, c.fps, c.width, c.height, len(c)
+
+    cap = cv2.VideoCapture(str(in_path))
+    if not cap.isOpened():
+        raise RuntimeError(f"No se pudo abrir el video: {input_path}")
+
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    fps = float(fps if fps and fps > 0 else 30.0)
+
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH) or 0)
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT) or 0)
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+
+    if width <= 0 or height <= 0:
+        ok, tmp = cap.read()
+        if not ok:
+            cap.release()
+            raise RuntimeError("No se pudo leer el primer frame.")
+        height, width = tmp.shape[:2]
+        cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+
+    return cap, fps, width, height, total_frames
+
+
+def create_writer(output_path: str, fps: float, width: int, height: int):
+    """Crea un VideoWriter mp4v en color (las máscaras se escriben como BGR)."""
+    fourcc = cv2.VideoWriter_fourcc(*"mp4v")
+    return cv2.VideoWriter(output_path, fourcc, float(fps), (width, height), True)
+
+
+def seek_frame(cap, frame_idx: int, index=None) -> None:
+    """
+    Posiciona 'cap' para que el próximo read() devuelva el frame 'frame_idx'.
+    Con un FrameIndex (modules.frame_index) el seek es exacto; sin él se usa
+    CAP_PROP_POS_FRAMES, que puede ser lento e impreciso en mp4v/H.264.
+    Sobre un CachedCapture el seek siempre es exacto y no usa el índice.
+    """
+    if isinstance(cap, CachedCapture):
+        cap.set(cv2.CAP_PROP_POS_FRAMES, int(frame_idx))
+    elif index is not None:
+        index.seek(cap, frame_idx)
+    elif frame_idx > 0:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, int(frame_idx))
+
+
+def split_ranges(total_frames: int, parts: int) -> list[tuple[int, int | None]]:
+    """
+    Divide [0, total_frames) en 'parts' rangos contiguos (start, end).
+    El último rango tiene end=None: se lee hasta EOF, porque CAP_PROP_FRAME_COUNT
+    puede ser aproximado.
+    """
+    parts = max(1, min(int(parts), int(total_frames)))
+    bounds = [round(i * total_frames / parts) for i in range(parts + 1)]
+    ranges = [(bounds[i], bounds[i + 1]) for i in range(parts)]
+    ranges[-1] = (ranges[-1][0], None)
+    return ranges
+
+
+def find_ffmpeg() -> str | None:
+    """Ejecutable de ffmpeg: el del PATH o, si está instalado, el de imageio-ffmpeg."""
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg:
+        return ffmpeg
+    try:
+        import imageio_ffmpeg
+    except ImportError:
+        return None
+    try:
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except RuntimeError:
+        return None
+
+
+def concat_videos(part_paths: list[str], output_path: str, fps: float, width: int, height: int,
+                  reencode: bool = True) -> None:
+    """
+    Une segmentos de video (mismo códec y tamaño) en 'output_path', en orden.
+
+    Si hay ffmpeg (find_ffmpeg) se usa el demuxer concat sin recodificar;
+    si no (o si falla), se decodifican los segmentos y se re-escriben con
+    OpenCV (mp4v). Con reencode=False no se recodifica nunca: sin ffmpeg, o
+    si la copia falla, se lanza RuntimeError con el error de ffmpeg.
+    """
+    ffmpeg = find_ffmpeg()
+    if not ffmpeg and not reencode:
+        raise RuntimeError(f"Se necesita ffmpeg para unir los segmentos de {output_path} sin recodificar.")
+    if ffmpeg:
+        list_path = f"{output_path}.concat.txt"
+        with open(list_path, "w", encoding="utf-8") as fh:
+            for p in part_paths:
+                escaped = os.path.abspath(p).replace("'", "'\\''")
+                fh.write(f"file '{escaped}'\n")
+        try:
+            proc = subprocess.run(
+                [ffmpeg, "-y", "-loglevel", "error", "-f", "concat", "-safe", "0",
+                 "-i", list_path, "-c", "copy", output_path],
+                capture_output=True, text=True,
+            )
+        finally:
+            os.remove(list_path)
+        # Con -loglevel error cualquier salida es un error: un segmento ilegible
+        # se saltea con código 0 y el video quedaría truncado
+        if proc.returncode == 0 and not proc.stderr.strip():
+            return
+        if not reencode:
+            raise RuntimeError(f"ffmpeg no pudo unir los segmentos de {output_path}: {proc.stderr.strip()}")
+
+    writer = create_writer(output_path, fps, width, height)
+    try:
+        for p in part_paths:
+            cap = cv2.VideoCapture(p)
+            if not cap.isOpened():
+                raise RuntimeError(f"No se pudo abrir el segmento: {p}")
+            while True:
+                ok, frame = cap.read()
+                if not ok:
+                    break
+                writer.write(frame)
+            cap.release()
+    finally:
+        writer.release()
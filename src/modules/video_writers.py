@@ -0,0 +1,387 @@
+# modules/video_writers.py
+import glob
+import os
+import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, Literal, Optional
+
+import cv2
+import numpy as np
+
+from .video_io import create_writer, concat_videos, find_ffmpeg
+from .threaded_io import ThreadedWriter
+
+Backend = Literal["auto", "cv2", "ffmpeg", "png", "npy", "y4m", "null"]
+
+# Contenedores que admiten FFV1 (sin pérdida); en ellos el códec por defecto es ffv1
+LOSSLESS_CONTAINERS = (".mkv", ".avi", ".nut")
+
+_NPY_HEADER = 128  # bytes reservados para el header del .npy (se reescribe al cerrar)
+
+
+class CvWriter:
+    """
+    cv2.VideoWriter en color con el fourcc 'codec' (por defecto mp4v, como
+    create_writer). Las imágenes de 1 canal se pasan a BGR en un buffer propio.
+    """
+
+    def __init__(self, path: str, fps: float, width: int, height: int, codec: Optional[str] = None):
+        if codec is None:
+            self.writer = create_writer(path, fps, width, height)
+        else:
+            fourcc = cv2.VideoWriter_fourcc(*codec.ljust(4)[:4])
+            self.writer = cv2.VideoWriter(path, fourcc, float(fps), (width, height), True)
+        if not self.writer.isOpened():
+            raise RuntimeError(f"No se pudo abrir el video de salida: {path} (códec {codec or 'mp4v'})")
+        self._bgr = np.empty((height, width, 3), dtype=np.uint8)
+
+    def write(self, img: np.ndarray) -> None:
+        if img.ndim == 2:
+            img = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR, dst=self._bgr)
+        self.writer.write(img)
+
+    def release(self) -> None:
+        self.writer.release()
+
+
+class FfmpegWriter:
+    """
+    Codifica con un ffmpeg local vía pipe (rawvideo por stdin). El formato de
+    entrada se fija con el primer frame: 'gray' para máscaras (1 canal, sin
+    expandir a BGR) o 'bgr24'. Por defecto FFV1, sin pérdida; 'threads' y
+    'output_args' (p.ej. ("-preset", "veryfast")) pasan tal cual a ffmpeg.
+    """
+
+    def __init__(self, path: str, fps: float, width: int, height: int, codec: Optional[str] = None,
+                 threads: Optional[int] = None, output_args: tuple[str, ...] = (), ffmpeg: Optional[str] = None):
+        self.ffmpeg = ffmpeg or find_ffmpeg()
+        if self.ffmpeg is None:
+            raise RuntimeError("No se encontró ffmpeg (instalarlo en el PATH o pip install imageio-ffmpeg).")
+        self.path = path
+        self.fps = float(fps)
+        self.size = (int(width), int(height))
+        self.codec = codec or "ffv1"
+        self.threads = threads
+        self.output_args = tuple(output_args)
+        self.proc = None
+        self._log = None
+        self._shape = None
+
+    def _start(self, img: np.ndarray) -> None:
+        pix_fmt = "gray" if img.ndim == 2 else "bgr24"
+        cmd = [self.ffmpeg, "-y", "-loglevel", "error",
+               "-f", "rawvideo", "-pix_fmt", pix_fmt, "-s", f"{self.size[0]}x{self.size[1]}",
+               "-r", f"{self.fps:g}", "-i", "-", "-c:v", self.codec]
+        if self.threads:
+            cmd += ["-threads", str(int(self.threads))]
+        cmd += list(self.output_args) + [self.path]
+        # stderr a un archivo: un pipe sin leer podría bloquear a ffmpeg
+        self._log = tempfile.TemporaryFile()
+        self.proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=self._log)
+        self._shape = img.shape
+
+    def write(self, img: np.ndarray) -> None:
+        if self.proc is None:
+            self._start(img)
+        elif img.shape != self._shape:
+            raise ValueError(f"Frame de forma {img.shape}; el video se abrió con {self._shape}.")
+        try:
+            self.proc.stdin.write(np.ascontiguousarray(img).data)
+        except BrokenPipeError:
+            self.release()  # lanza el error de ffmpeg
+
+    def release(self) -> None:
+        if self.proc is None:
+            return
+        proc, self.proc = self.proc, None
+        try:
+            proc.stdin.close()
+        except BrokenPipeError:
+            pass
+        code = proc.wait()
+        self._log.seek(0)
+        msg = self._log.read().decode("utf-8", "replace").strip()
+        self._log.close()
+        if code != 0:
+            raise RuntimeError(f"ffmpeg terminó con código {code} al escribir {self.path}: {msg}")
+
+
+class PngSequenceWriter:
+    """
+    Secuencia de PNG (sin pérdida, 1 canal para máscaras) con un patrón como
+    'salida/%06d.png'. Con threads>1 los PNG se comprimen en paralelo
+    (cv2.imwrite libera el GIL); cada frame se copia antes de encolarlo.
+    """
+
+    def __init__(self, pattern: str, threads: Optional[int] = None, compression: int = 1):
+        self.pattern = pattern
+        self.params = [cv2.IMWRITE_PNG_COMPRESSION, int(np.clip(compression, 0, 9))]
+        self.frames = 0
+        os.makedirs(os.path.dirname(os.path.abspath(pattern)), exist_ok=True)
+        self.threads = int(threads or 1)
+        self._pool = ThreadPoolExecutor(max_workers=self.threads) if self.threads > 1 else None
+        self._pending = []
+
+    def _imwrite(self, path: str, img: np.ndarray) -> None:
+        if not cv2.imwrite(path, img, self.params):
+            raise RuntimeError(f"No se pudo escribir {path}")
+
+    def write(self, img: np.ndarray) -> None:
+        path = self.pattern % self.frames
+        self.frames += 1
+        if self._pool is None:
+            self._imwrite(path, img)
+            return
+        self._pending.append(self._pool.submit(self._imwrite, path, img.copy()))
+        # Acota la memoria: a lo sumo dos frames por hilo en vuelo
+        while len(self._pending) > 2 * self.threads:
+            self._pending.pop(0).result()
+
+    def release(self) -> None:
+        if self._pool is not None:
+            for fut in self._pending:
+                fut.result()
+            self._pending = []
+            self._pool.shutdown()
+
+
+class NpyWriter:
+    """
+    Frames crudos en un único .npy (N, H, W) o (N, H, W, 3), legible con
+    np.load(path, mmap_mode="r"). El header se reserva al abrir y se
+    reescribe con la cantidad de frames al cerrar.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.fh = open(path, "wb")
+        self.fh.write(b"\0" * _NPY_HEADER)
+        self.frames = 0
+        self._shape = None
+        self._dtype = None
+
+    def write(self, img: np.ndarray) -> None:
+        if self._shape is None:
+            self._shape, self._dtype = img.shape, img.dtype
+        elif img.shape != self._shape:
+            raise ValueError(f"Frame de forma {img.shape}; el archivo se abrió con {self._shape}.")
+        self.fh.write(np.ascontiguousarray(img, dtype=self._dtype).data)
+        self.frames += 1
+
+    def release(self) -> None:
+        if self.fh.closed:
+            return
+        shape = (self.frames,) + tuple(self._shape or (0, 0))
+        dtype = np.lib.format.dtype_to_descr(np.dtype(self._dtype or np.uint8))
+        header = f"{{'descr': '{dtype}', 'fortran_order': False, 'shape': {shape}, }}"
+        # magic (6) + versión (2) + largo (2) + dict con relleno de espacios y '\n'
+        body = header.encode("latin1").ljust(_NPY_HEADER - 10 - 1) + b"\n"
+        self.fh.seek(0)
+        self.fh.write(b"\x93NUMPY\x01\x00" + len(body).to_bytes(2, "little") + body)
+        self.fh.close()
+
+
+class Y4mWriter:
+    """
+    YUV4MPEG2 sin comprimir: máscaras como 'C mono' (1 byte por píxel) y
+    frames BGR como YUV 4:4:4 (cv2.COLOR_BGR2YUV). Lo leen ffmpeg y la mayoría
+    de los reproductores.
+    """
+
+    def __init__(self, path: str, fps: float, width: int, height: int):
+        self.fh = open(path, "wb")
+        self.size = (int(width), int(height))
+        num, den = (int(round(fps * 1000)), 1000) if fps else (30, 1)
+        g = np.gcd(num, den)
+        self.rate = f"{num // g}:{den // g}"
+        self._mono = None
+        self._yuv = None
+
+    def write(self, img: np.ndarray) -> None:
+        if self._mono is None:
+            self._mono = img.ndim == 2
+            fmt = "mono" if self._mono else "444"
+            w, h = self.size
+            self.fh.write(f"YUV4MPEG2 W{w} H{h} F{self.rate} Ip A1:1 C{fmt}\n".encode("ascii"))
+        elif self._mono != (img.ndim == 2):
+            raise ValueError("No se pueden mezclar frames de 1 y 3 canales en un mismo .y4m")
+        self.fh.write(b"FRAME\n")
+        if self._mono:
+            self.fh.write(np.ascontiguousarray(img).data)
+        else:
+            self._yuv = cv2.cvtColor(img, cv2.COLOR_BGR2YUV, dst=self._yuv)
+            for c in range(3):
+                self.fh.write(np.ascontiguousarray(self._yuv[:, :, c]).data)
+
+    def release(self) -> None:
+        self.fh.close()
+
+
+class NullWriter:
+    """Descarta los frames (sólo los cuenta): mide el procesamiento sin el costo de codificar."""
+
+    def __init__(self):
+        self.frames = 0
+
+    def write(self, img: np.ndarray) -> None:
+        self.frames += 1
+
+    def release(self) -> None:
+        pass
+
+
+def resolve_backend(path: Optional[str], backend: Backend = "auto", codec: Optional[str] = None) -> str:
+    """
+    Backend para 'path' con backend="auto": null para None u os.devnull; png
+    para patrones con '%' y extensión .png; npy / y4m por extensión; ffmpeg
+    (FFV1) para .mkv/.avi/.nut o con un códec que no sea un fourcc de OpenCV
+    si hay ffmpeg; cv2 para el resto.
+    """
+    if backend != "auto":
+        return backend
+    if not path or path == os.devnull:
+        return "null"
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".png" and "%" in os.path.basename(path):
+        return "png"
+    if ext in (".npy", ".y4m"):
+        return ext[1:]
+    wants_ffmpeg = ext in LOSSLESS_CONTAINERS or (codec is not None and len(codec) > 4)
+    if wants_ffmpeg and find_ffmpeg() is not None:
+        return "ffmpeg"
+    return "cv2"
+
+
+def open_writer(
+    path: Optional[str],
+    fps: float,
+    width: int,
+    height: int,
+    backend: Backend = "auto",
+    codec: Optional[str] = None,     # fourcc (cv2) o códec de ffmpeg (ffv1, libx264, ...)
+    threads: Optional[int] = None,   # hilos del encoder (ffmpeg -threads; PNG en paralelo)
+    output_args: tuple[str, ...] = (),  # argumentos extra de salida para ffmpeg
+    threaded: bool = False,          # codificar en un hilo aparte (ThreadedWriter)
+    queue_size: int = 8,
+    png_compression: int = 1,
+):
+    """
+    Abre un writer con interfaz write(img) / release() para 'path'.
+
+    Todos aceptan imágenes BGR o máscaras de 1 canal. cv2 las expande a BGR;
+    ffmpeg, png, npy e y4m las guardan en un canal y sin pérdida (FFV1, PNG,
+    crudo), así la máscara que se lee después es exactamente la escrita.
+    Sin ffmpeg, un .mkv/.avi se escribe con el FFV1 de OpenCV (en BGR).
+    Ver resolve_backend para la elección automática.
+
+    Con threaded=True el writer corre en un hilo aparte: no modificar una
+    imagen después de pasarla a write().
+    """
+    kind = resolve_backend(path, backend, codec)
+    if kind == "cv2":
+        ext = os.path.splitext(path)[1].lower()
+        if codec is None and ext in LOSSLESS_CONTAINERS:
+            codec = "FFV1"
+        writer = CvWriter(path, fps, width, height, codec)
+    elif kind == "ffmpeg":
+        writer = FfmpegWriter(path, fps, width, height, codec, threads, output_args)
+    elif kind == "png":
+        writer = PngSequenceWriter(path, threads, png_compression)
+    elif kind == "npy":
+        writer = NpyWriter(path)
+    elif kind == "y4m":
+        writer = Y4mWriter(path, fps, width, height)
+    elif kind == "null":
+        writer = NullWriter()
+    else:
+        raise ValueError(f"Backend de escritura no soportado: {backend}. "
+                         "Use 'auto', 'cv2', 'ffmpeg', 'png', 'npy', 'y4m' o 'null'.")
+    return ThreadedWriter(writer, queue_size) if threaded else writer
+
+
+def part_path(path: str, stem: str) -> str:
+    """
+    Ruta de un segmento de la salida 'path' (shards, checkpoints): 'stem' con la
+    misma extensión, 'stem/<patrón>' para una secuencia de PNG y os.devnull si
+    la salida es nula.
+    """
+    kind = resolve_backend(path)
+    if kind == "null":
+        return os.devnull
+    if kind == "png":
+        return os.path.join(stem, os.path.basename(path))
+    return stem + os.path.splitext(path)[1]
+
+
+def iter_output_frames(path: str, backend: Backend = "auto") -> Iterator[np.ndarray]:
+    """Lee los frames de una salida de open_writer, en orden (máscaras en 1 canal donde se guardaron así)."""
+    kind = resolve_backend(path, backend)
+    if kind == "npy":
+        yield from np.load(path, mmap_mode="r")
+    elif kind == "png":
+        n = len(glob.glob(os.path.join(os.path.dirname(path), "*.png")))
+        for i in range(n):
+            yield cv2.imread(path % i, cv2.IMREAD_UNCHANGED)
+    elif kind == "y4m":
+        with open(path, "rb") as fh:
+            header = fh.readline().decode("ascii").split()
+            tags = {t[0]: t[1:] for t in header[1:]}
+            w, h = int(tags["W"]), int(tags["H"])
+            mono = tags.get("C", "420").startswith("mono")
+            planes = 1 if mono else 3
+            while fh.readline():
+                data = np.frombuffer(fh.read(w * h * planes), dtype=np.uint8)
+                if mono:
+                    yield data.reshape(h, w)
+                else:
+                    yield cv2.cvtColor(np.ascontiguousarray(data.reshape(3, h, w).transpose(1, 2, 0)),
+                                       cv2.COLOR_YUV2BGR)
+    elif kind != "null":
+        cap = cv2.VideoCapture(path)
+        if not cap.isOpened():
+            raise RuntimeError(f"No se pudo abrir el video: {path}")
+        try:
+            while True:
+                ok, frame = cap.read()
+                if not ok:
+                    return
+                yield frame
+        finally:
+            cap.release()
+
+
+def concat_outputs(part_paths: list[str], output_path: str, fps: float, width: int, height: int,
+                   writer_kw: Optional[dict] = None) -> None:
+    """
+    Une segmentos escritos con open_writer(**writer_kw) en 'output_path', en orden.
+    Los videos se unen con concat_videos copiando los streams con ffmpeg.
+    Sin ffmpeg sólo se recodifica cuando no se pierde nada más: el mp4v por
+    defecto (como siempre) o el FFV1 de OpenCV en .mkv/.avi/.nut; con otro
+    códec, o con backend ffmpeg, se lanza RuntimeError antes que degradar la
+    salida. npy, y4m y secuencias de PNG se leen y se reescriben tal cual.
+    """
+    writer_kw = dict(writer_kw or {})
+    writer_kw.pop("threaded", None)
+    kind = resolve_backend(output_path, writer_kw.get("backend", "auto"), writer_kw.get("codec"))
+    if kind == "null":
+        return
+    if kind in ("cv2", "ffmpeg"):
+        # Con ffmpeg se copian los streams; recodificar (mp4v de 3 canales) sólo
+        # es equivalente para la salida mp4v por defecto
+        codec = writer_kw.get("codec")
+        lossless = os.path.splitext(output_path)[1].lower() in LOSSLESS_CONTAINERS
+        mp4v = kind == "cv2" and codec is None and not lossless
+        if mp4v or find_ffmpeg() is not None:
+            concat_videos(part_paths, output_path, fps, width, height, reencode=mp4v)
+            return
+        if not (kind == "cv2" and lossless and (codec or "FFV1") == "FFV1"):
+            raise RuntimeError(f"Se necesita ffmpeg para unir los segmentos de {output_path} "
+                               f"(códec {codec or kind}) sin recodificarlos.")
+    writer = open_writer(output_path, fps, width, height, **writer_kw)
+    try:
+        for p in part_paths:
+            for frame in iter_output_frames(p, kind if kind in ("png", "npy", "y4m") else "cv2"):
+                writer.write(frame)
+    finally:
+        writer.release()
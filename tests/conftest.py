@@ -0,0 +1,15 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from modules.synthetic_video import make_court_video  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def court_video(tmp_path_factory):
+    """Video sintético chico (mp4v, 320x180, 90 frames) compartido por los tests."""
+    path = tmp_path_factory.mktemp("video") / "court.mp4"
+    return make_court_video(str(path), width=320, height=180, frames=90, seed=3)
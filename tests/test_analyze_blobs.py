@@ -0,0 +1,32 @@
+import cv2
+import numpy as np
+
+from modules.analyze_blobs import analyze_blobs
+from modules.filter_components import filter_components
+from modules.filter_roundness import filter_by_roundness
+
+
+def _nested_mask():
+    # Anillo con un disco (otro componente) dentro de su hueco
+    mask = np.zeros((120, 120), np.uint8)
+    cv2.circle(mask, (60, 60), 45, 255, -1)
+    cv2.circle(mask, (60, 60), 25, 0, -1)
+    cv2.circle(mask, (60, 60), 6, 255, -1)
+    return mask
+
+
+def test_componente_en_el_hueco_de_otro():
+    mask = _nested_mask()
+    expected = filter_by_roundness(filter_components(mask, min_size=20, max_size=50000), min_circularity=0.3)
+    out, blobs = analyze_blobs(mask, min_size=20, max_size=50000, min_circularity=0.3)
+    assert len(blobs) == 2
+    assert out[60, 60] == 255
+    assert np.array_equal(out, expected)
+
+
+def test_buffer_de_salida_in_place():
+    mask = _nested_mask()
+    expected, _ = analyze_blobs(mask.copy(), min_size=20, min_circularity=0.3)
+    out, _ = analyze_blobs(mask, min_size=20, min_circularity=0.3, out=mask)
+    assert out is mask
+    assert np.array_equal(out, expected)
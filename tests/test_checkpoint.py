@@ -0,0 +1,65 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+import modules.process_video as pv
+from modules.checkpoint import Checkpointer
+from modules.mask_store import MaskStoreWriter, open_mask_store
+
+PARAMS = dict(history=60, varth=30.0, thresh=200, kernel=3, fade=0.5)
+
+
+class _Crash(Exception):
+    pass
+
+
+def _masks(path):
+    with open_mask_store(path) as store:
+        return np.stack([m.copy() for m in store])
+
+
+def test_reanudar_da_lo_mismo_que_sin_cortes(court_video, tmp_path, monkeypatch):
+    ref = str(tmp_path / "ref.masks")
+    pv.process_video(court_video, os.devnull, mask_store_path=ref, **PARAMS)
+
+    out = str(tmp_path / "res.masks")
+    ckpt = str(tmp_path / "ckpt")
+    write = MaskStoreWriter.write
+    calls = []
+
+    def crash(self, mask):
+        calls.append(1)
+        if len(calls) == 50:
+            raise _Crash()
+        write(self, mask)
+
+    monkeypatch.setattr(MaskStoreWriter, "write", crash)
+    with pytest.raises(_Crash):
+        pv.process_video(court_video, os.devnull, mask_store_path=out, checkpoint_dir=ckpt,
+                         checkpoint_every=20, **PARAMS)
+    monkeypatch.setattr(MaskStoreWriter, "write", write)
+    with open(os.path.join(ckpt, "state.json"), encoding="utf-8") as fh:
+        assert json.load(fh)["next_frame"] == 40  # se reanuda desde el último checkpoint
+
+    # Warm replay desde el frame 0: el modelo de fondo queda igual que sin cortes
+    pv.process_video(court_video, os.devnull, mask_store_path=out, checkpoint_dir=ckpt,
+                     checkpoint_every=20, warmup_frames=10_000, **PARAMS)
+    assert np.array_equal(_masks(out), _masks(ref))
+    assert not os.path.exists(ckpt)
+
+
+def test_carpeta_compartida_conserva_otros_archivos(court_video, tmp_path):
+    results = tmp_path / "results"
+    results.mkdir()
+    (results / "notas.txt").write_text("no borrar")
+    # Checkpoint de otros parámetros: al descartarlo sólo se borran sus archivos
+    Checkpointer(str(results), court_video, {"otros": 1}).save(20, {"idle": np.asarray(0)}, {})
+    out = str(results / "mask.masks")
+    with pytest.warns(UserWarning, match="otros parámetros"):
+        pv.process_video(court_video, os.devnull, mask_store_path=out, checkpoint_dir=str(results),
+                         checkpoint_every=20, **PARAMS)
+    assert (results / "notas.txt").read_text() == "no borrar"
+    assert sorted(os.listdir(results)) == ["mask.masks", "notas.txt"]
+    assert len(_masks(out)) == 90
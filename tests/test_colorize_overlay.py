@@ -0,0 +1,35 @@
+import cv2
+import numpy as np
+
+import modules.colorize_overlay as co
+
+
+def _case(shape, seed):
+    rng = np.random.default_rng(seed)
+    frame = rng.integers(0, 256, size=shape + (3,), dtype=np.uint8)
+    mask = np.zeros(shape, np.uint8)
+    for _ in range(3):
+        x, y = int(rng.integers(0, shape[1])), int(rng.integers(0, shape[0]))
+        cv2.circle(mask, (x, y), int(rng.integers(2, 12)), 255, -1)
+    return frame, mask
+
+
+def test_reutiliza_el_compositor_y_da_lo_mismo():
+    params = [dict(color=(0, 0, 255), alpha=0.6, soften=3), dict(colormap=cv2.COLORMAP_TURBO, alpha=0.4)]
+    for seed in range(6):
+        # Formas y parámetros alternados: cada combinación usa su propio compositor
+        for shape in ((90, 160), (73, 101)):
+            for kw in params:
+                frame, mask = _case(shape, seed)
+                expected = co.OverlayCompositor(**kw).apply(frame, mask)
+                got = co.overlay_by_mask(frame, mask, **kw)
+                assert np.array_equal(got, expected)
+                assert got is not frame
+    assert len(co._local.compositors) == 4
+
+
+def test_compositor_con_frames_de_otro_tamano():
+    comp = co.OverlayCompositor(color=(255, 0, 0))
+    for shape in ((40, 60), (64, 96), (40, 60)):
+        frame, mask = _case(shape, 7)
+        assert np.array_equal(comp.apply(frame, mask), co.OverlayCompositor(color=(255, 0, 0)).apply(frame, mask))
@@ -0,0 +1,46 @@
+import cv2
+import numpy as np
+
+from modules.frame_index import build_frame_index, open_frame_index
+from modules.video_io import seek_frame
+
+
+def _sequential(path):
+    cap = cv2.VideoCapture(path)
+    frames = []
+    while True:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+
+def test_seek_con_indice_es_exacto(court_video):
+    frames = _sequential(court_video)
+    index = open_frame_index(court_video)
+    assert len(index) == len(frames)
+    # El índice queda guardado al lado del video y se vuelve a usar
+    reloaded = open_frame_index(court_video, build=False)
+    assert reloaded is not None and len(reloaded) == len(frames)
+
+    cap = cv2.VideoCapture(court_video)
+    # Hacia adelante, hacia atrás y al mismo frame
+    for idx in (57, 3, 3, 89, 0, 41, 40, 88):
+        seek_frame(cap, idx, reloaded)
+        ok, frame = cap.read()
+        assert ok and np.array_equal(frame, frames[idx]), idx
+    cap.release()
+
+
+def test_seek_con_anclas_propias(court_video):
+    # Anclas cada pocos frames (sin ffprobe o con GOP largos): salto al ancla + grab()
+    frames = _sequential(court_video)
+    index = build_frame_index(court_video, anchor_step=16)
+    cap = cv2.VideoCapture(court_video)
+    for idx in np.random.default_rng(0).integers(0, len(frames), size=20):
+        seek_frame(cap, int(idx), index)
+        ok, frame = cap.read()
+        assert ok and np.array_equal(frame, frames[int(idx)]), idx
+    cap.release()
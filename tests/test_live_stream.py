@@ -0,0 +1,77 @@
+import asyncio
+import contextlib
+import threading
+import time
+
+import pytest
+
+from modules.live_stream import StreamStats, aiter_masks, iter_masks
+from modules.stage_timer import StageTimer
+from modules.synthetic_video import make_court_video
+
+FPS = 60.0
+FRAMES = 60
+BUFFER = 2
+
+
+@pytest.fixture(scope="module")
+def camera(tmp_path_factory):
+    # Archivo reproducido a ritmo real (realtime=True) como si fuera una cámara
+    path = tmp_path_factory.mktemp("live") / "camera.mp4"
+    return make_court_video(str(path), width=160, height=96, frames=FRAMES, fps=FPS, seed=5)
+
+
+def _reader_alive() -> bool:
+    return any(t.name == "live-reader" and t.is_alive() for t in threading.enumerate())
+
+
+def _wait_reader_exit(timeout: float = 5.0) -> bool:
+    end = time.perf_counter() + timeout
+    while _reader_alive() and time.perf_counter() < end:
+        time.sleep(0.01)
+    return not _reader_alive()
+
+
+def test_consumidor_lento_descarta_los_frames_viejos(camera):
+    stats, timer = StreamStats(), StageTimer()
+    delivered = []
+    for idx, frame, mask, blobs in iter_masks(camera, history=30, buffer_size=BUFFER, realtime=True,
+                                              timer=timer, stats=stats):
+        # Lo entregado es de lo más nuevo leído: a lo sumo el buffer (y el frame en curso) detrás
+        assert idx >= stats.read - 1 - BUFFER - 1
+        assert mask.shape == frame.shape[:2]
+        delivered.append(idx)
+        time.sleep(3.0 / FPS)  # consume a un tercio del ritmo de la fuente
+
+    assert stats.read == FRAMES
+    assert stats.dropped > 0
+    assert stats.processed == len(delivered) == FRAMES - stats.dropped
+    assert delivered == sorted(delivered) and delivered[-1] == FRAMES - 1
+    assert len(set(delivered)) == len(delivered) < FRAMES
+
+    latency = timer.summary()["stages"]["latency"]
+    assert latency["count"] == stats.processed
+    assert 0.0 < stats.latency < 1.0
+    assert not _reader_alive()
+
+
+def test_cortar_el_generador_detiene_el_lector(camera):
+    it = iter_masks(camera, history=30, realtime=True)
+    next(it)
+    assert _reader_alive()
+    it.close()
+    assert not _reader_alive()
+
+
+def test_cortar_aiter_masks_detiene_el_lector(camera):
+    async def main():
+        n = 0
+        async with contextlib.aclosing(aiter_masks(camera, history=30, realtime=True)) as frames:
+            async for _ in frames:
+                n += 1
+                if n == 5:
+                    break
+        return n
+
+    assert asyncio.run(main()) == 5
+    assert _wait_reader_exit()
@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+from modules.mask_store import MaskStoreWriter, concat_mask_stores, open_mask_store
+
+
+def _masks(n=12, shape=(45, 70), seed=0):
+    rng = np.random.default_rng(seed)
+    out = [np.zeros(shape, np.uint8), np.full(shape, 255, np.uint8)]  # casos borde: vacía y llena
+    for i in range(n - 2):
+        # De pocos blobs (gana RLE) a ruido denso (gana packbits)
+        out.append(np.where(rng.random(shape) > 1.0 - 0.1 * (i + 1), 255, 0).astype(np.uint8))
+    return out
+
+
+def _write(path, masks, codec):
+    with MaskStoreWriter(str(path), masks[0].shape[1], masks[0].shape[0], fps=30.0, codec=codec) as w:
+        for m in masks:
+            w.write(m)
+    return str(path)
+
+
+@pytest.mark.parametrize("codec", ["packbits", "rle", "auto"])
+def test_ida_y_vuelta_exacta(tmp_path, codec):
+    masks = _masks()
+    path = _write(tmp_path / f"{codec}.masks", masks, codec)
+    with open_mask_store(path) as store:
+        assert len(store) == len(masks)
+        assert all(np.array_equal(a, b) for a, b in zip(store, masks))
+        # Acceso aleatorio, en cualquier orden
+        for i in np.random.default_rng(1).permutation(len(masks)):
+            assert np.array_equal(store[int(i)], masks[int(i)])
+
+
+def test_concatenar_stores(tmp_path):
+    a, b = _masks(seed=2), _masks(seed=3)
+    parts = [_write(tmp_path / "a.masks", a, "rle"), _write(tmp_path / "b.masks", b, "packbits")]
+    out = str(tmp_path / "ab.masks")
+    concat_mask_stores(parts, out)
+    with open_mask_store(out) as store:
+        assert all(np.array_equal(x, y) for x, y in zip(store, a + b))
+        assert len(store) == len(a) + len(b)
@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+import modules.video_writers as vw
+
+
+def _masks(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return [np.where(rng.random((48, 64)) > 0.7, 255, 0).astype(np.uint8) for _ in range(n)]
+
+
+def _write(path, frames, **writer_kw):
+    writer = vw.open_writer(path, 30.0, 64, 48, **writer_kw)
+    for f in frames:
+        writer.write(f)
+    writer.release()
+    return path
+
+
+@pytest.mark.parametrize("ext, writer_kw", [
+    (".avi", dict(backend="cv2", codec="XVID")),
+    (".mkv", dict(backend="ffmpeg")),
+])
+def test_unir_sin_ffmpeg_no_recodifica_con_perdida(tmp_path, monkeypatch, ext, writer_kw):
+    parts = [str(tmp_path / f"part_{i}{ext}") for i in range(2)]
+    if writer_kw["backend"] == "cv2":
+        for i, p in enumerate(parts):
+            _write(p, _masks(3, i), **writer_kw)
+    monkeypatch.setattr(vw, "find_ffmpeg", lambda: None)
+    with pytest.raises(RuntimeError, match="ffmpeg"):
+        vw.concat_outputs(parts, str(tmp_path / f"out{ext}"), 30.0, 64, 48, writer_kw)
+
+
+def test_unir_ffv1_de_opencv_sin_ffmpeg_es_exacto(tmp_path, monkeypatch):
+    monkeypatch.setattr(vw, "find_ffmpeg", lambda: None)
+    frames = [_masks(3, 0), _masks(4, 1)]
+    parts = [_write(str(tmp_path / f"part_{i}.mkv"), f) for i, f in enumerate(frames)]
+    out = str(tmp_path / "out.mkv")
+    vw.concat_outputs(parts, out, 30.0, 64, 48)
+    got = [f[..., 0] for f in vw.iter_output_frames(out, "cv2")]
+    assert np.array_equal(np.array(got), np.array(frames[0] + frames[1]))
+
+
+@pytest.mark.parametrize("name", ["out.npy", "out.y4m", "png/%04d.png"])
+def test_backends_sin_perdida(tmp_path, name):
+    frames = _masks(5)
+    path = _write(str(tmp_path / name), frames)
+    got = [f if f.ndim == 2 else f[..., 0] for f in vw.iter_output_frames(path)]
+    assert np.array_equal(np.array(got), np.array(frames))